@@ -7,13 +7,172 @@ of the BSD license. See the LICENSE file for details.
 """
 from requests.auth import AuthBase, HTTPBasicAuth
 from requests.cookies import extract_cookies_to_jar
+from requests.exceptions import HTTPError
 from requests.utils import parse_dict_header
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
 from urllib.parse import urlparse
+import contextlib
+import hashlib
+import json
+import logging
+import os
 import requests
 import re
+import tempfile
+import threading
+import time
 
+from atomic_reactor.constants import (BEARER_TOKEN_DEFAULT_EXPIRY, BEARER_TOKEN_EXPIRY_MARGIN,
+                                      BEARER_TOKEN_MAX_SCOPES)
+from atomic_reactor.utils.registry_metrics import instrumented_request
 from atomic_reactor.utils.retries import get_retrying_requests_session
 
+logger = logging.getLogger(__name__)
+
+
+class BearerTokenCache(object):
+    """Bearer tokens shared by all HTTPBearerAuth instances of the process.
+
+    Tokens are kept per realm, service, scope and credentials (by their hash)
+    until shortly before they expire. The realm and service of each registry
+    are remembered as well, so that new sessions can send a cached token with
+    their first request instead of waiting for a 401 response.
+
+    If a file is set, tokens are also saved there, readable by the owner only,
+    so that later tasks of the same pipeline run can reuse them.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self._lock = threading.Lock()
+        # json.dumps([realm, service, scope, credentials]) -> (token, expires_at)
+        self._tokens: Dict[str, Tuple[str, float]] = {}
+        # scheme://host of the registry -> (realm, service)
+        self._challenges: Dict[str, Tuple[str, str]] = {}
+        # realms which failed to issue a token for several scopes at once
+        self._single_scope_realms: Set[str] = set()
+        self._path = path
+        self._loaded_mtime: Optional[int] = None
+
+    @staticmethod
+    def _key(realm: str, service: str, scope: str, credentials: str) -> str:
+        return json.dumps([realm, service, scope, credentials])
+
+    def set_path(self, path: Optional[Path]) -> None:
+        with self._lock:
+            self._path = path
+            self._loaded_mtime = None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tokens.clear()
+            self._challenges.clear()
+            self._single_scope_realms.clear()
+            self._loaded_mtime = None
+
+    def _load(self) -> None:
+        """Merge tokens saved by other processes, call with the lock held"""
+        if self._path is None:
+            return
+        try:
+            mtime = self._path.stat().st_mtime_ns
+            if mtime == self._loaded_mtime:
+                return
+            data = json.loads(self._path.read_text())
+            tokens = {key: (token, expires_at)
+                      for key, (token, expires_at) in data['tokens'].items()}
+            challenges = {base: (realm, service)
+                          for base, (realm, service) in data['challenges'].items()}
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, KeyError, TypeError) as exc:
+            logger.debug("ignoring unreadable token cache %s: %s", self._path, exc)
+            return
+        for key, (token, expires_at) in tokens.items():
+            if key not in self._tokens or self._tokens[key][1] < expires_at:
+                self._tokens[key] = (token, expires_at)
+        for base, challenge in challenges.items():
+            self._challenges.setdefault(base, challenge)
+        self._loaded_mtime = mtime
+
+    def _save(self) -> None:
+        """Write all valid tokens to the file, call with the lock held"""
+        if self._path is None:
+            return
+        self._load()
+        now = time.time()
+        data = {
+            'tokens': {key: [token, expires_at]
+                       for key, (token, expires_at) in self._tokens.items() if expires_at > now},
+            'challenges': {base: list(challenge) for base, challenge in self._challenges.items()},
+        }
+        # mkstemp creates the file readable by the owner only
+        fd, tmp_path = tempfile.mkstemp(dir=self._path.parent, prefix='.tokens-')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self._path)
+        except OSError as exc:
+            logger.warning("failed to save registry tokens to %s: %s", self._path, exc)
+            with contextlib.suppress(OSError):
+                os.unlink(tmp_path)
+            return
+        self._loaded_mtime = self._path.stat().st_mtime_ns
+
+    def get_token(self, realm: str, service: str, scope: str, credentials: str) -> Optional[str]:
+        with self._lock:
+            self._load()
+            token, expires_at = self._tokens.get(
+                self._key(realm, service, scope, credentials), (None, 0.0)
+            )
+        if time.time() > expires_at - BEARER_TOKEN_EXPIRY_MARGIN:
+            return None
+        return token
+
+    def put_token(self, realm: str, service: str, scopes: List[str], credentials: str,
+                  token: str, expires_in: float) -> None:
+        expires_at = time.time() + expires_in
+        with self._lock:
+            for scope in scopes:
+                self._tokens[self._key(realm, service, scope, credentials)] = (token, expires_at)
+            self._save()
+
+    def invalidate_token(self, realm: str, service: str, scope: str, credentials: str) -> None:
+        with self._lock:
+            self._tokens.pop(self._key(realm, service, scope, credentials), None)
+
+    def get_challenge(self, base_url: str) -> Optional[Tuple[str, str]]:
+        with self._lock:
+            self._load()
+            return self._challenges.get(base_url)
+
+    def put_challenge(self, base_url: str, realm: str, service: str) -> None:
+        with self._lock:
+            self._challenges[base_url] = (realm, service)
+
+    def supports_multiple_scopes(self, realm: str) -> bool:
+        with self._lock:
+            return realm not in self._single_scope_realms
+
+    def set_single_scope(self, realm: str) -> None:
+        with self._lock:
+            self._single_scope_realms.add(realm)
+
+
+bearer_token_cache = BearerTokenCache()
+
+
+def set_token_cache_file(path: Optional[str]) -> None:
+    """Save the shared bearer tokens to a file, or stop saving them if path is None"""
+    bearer_token_cache.set_path(Path(path) if path else None)
+
+
+def _credentials_id(username, password, auth_b64) -> str:
+    """Identify credentials in token cache keys without keeping them in plain text"""
+    if not (auth_b64 or (username and password)):
+        return 'anonymous'
+    return hashlib.sha256('{}:{}:{}'.format(auth_b64, username, password).encode()).hexdigest()
+
 
 class HTTPBearerAuth(AuthBase):
     """Performs Bearer authentication for the given Request object.
@@ -26,15 +185,20 @@ class HTTPBearerAuth(AuthBase):
     password).
 
     Once Bearer token is retrieved, it will be cached and used in subsequent
-    requests. Since tokens are specific to repositories, the token cache may
-    store multiple tokens.
+    requests until it expires. Since tokens are specific to repositories, the
+    token cache may store multiple tokens. By default, the cache is shared by
+    all instances, see BearerTokenCache.
+
+    When tokens for several repositories expired, a new one is requested for
+    all of them at once, unless the realm does not support that.
 
     Supports registry v2 API only.
     """
     BEARER_PATTERN = re.compile(r'bearer ', flags=re.IGNORECASE)
     V2_REPO_PATTERN = re.compile(r'^/v2/(.*)/(manifests|tags|blobs)/')
 
-    def __init__(self, username=None, password=None, verify=True, access=None, auth_b64=None):
+    def __init__(self, username=None, password=None, verify=True, access=None, auth_b64=None,
+                 token_cache=None):
         """Initialize HTTPBearerAuth object.
 
         :param username: str, username to be used for authentication
@@ -45,6 +209,7 @@ class HTTPBearerAuth(AuthBase):
             requested; possible values to be included are 'pull' and/or 'push';
             defaults to ('pull',)
         :param auth_b64: str, base64 credendials as described in RFC 7617
+        :param token_cache: BearerTokenCache, defaults to the one shared by all instances
         """
         self.username = username
         self.password = password
@@ -52,19 +217,27 @@ class HTTPBearerAuth(AuthBase):
         self.verify = verify
         self.access = access or ('pull',)
 
-        self._token_cache = {}
+        self._token_cache = token_cache or bearer_token_cache
+        self._credentials = _credentials_id(username, password, auth_b64)
+        # scopes this instance needed tokens for, per (realm, service)
+        self._scopes: Dict[Tuple[str, str], Set[str]] = {}
         self._retry_session = get_retrying_requests_session()   # Used when querying for token
 
     def __call__(self, response):
         repo = self._get_repo_from_url(response.url)
 
-        if repo in self._token_cache:
-            self._set_header(response, repo)
-            return response
+        challenge = self._token_cache.get_challenge(self._get_base_url(response.url))
+        if challenge:
+            realm, service = challenge
+            token = self._token_cache.get_token(realm, service, self._get_scope(repo),
+                                                self._credentials)
+            if token:
+                self._set_header(response, token)
 
         def handle_401_with_repo(response, **kwargs):
             return self.handle_401(response, repo, **kwargs)
 
+        # also registered with a cached token, in case it was revoked
         response.register_hook('response', handle_401_with_repo)
         return response
 
@@ -78,7 +251,19 @@ class HTTPBearerAuth(AuthBase):
         if 'bearer' not in auth_info.lower():
             return response
 
-        self._token_cache[repo] = self._get_token(auth_info, repo)
+        bearer_info = parse_dict_header(self.BEARER_PATTERN.sub('', auth_info, count=1))
+        realm = bearer_info.pop('realm')
+        service = bearer_info.get('service', '')
+        self._token_cache.put_challenge(self._get_base_url(response.url), realm, service)
+
+        scope = self._get_scope(repo)
+        sent_token = self.BEARER_PATTERN.match(response.request.headers.get('Authorization', ''))
+        if sent_token:
+            # the cached token was revoked, or it was issued for several
+            # repositories and the realm did not grant access to this one
+            self._token_cache.invalidate_token(realm, service, scope, self._credentials)
+
+        token = self._get_token(realm, bearer_info, repo, multiple_scopes=not sent_token)
 
         # Consume content and release the original connection
         # to allow our new request to reuse the same one.
@@ -89,7 +274,7 @@ class HTTPBearerAuth(AuthBase):
         extract_cookies_to_jar(retry_request._cookies, response.request, response.raw)
         retry_request.prepare_cookies(retry_request._cookies)
 
-        self._set_header(retry_request, repo)
+        self._set_header(retry_request, token)
         retry_response = response.connection.send(retry_request, **kwargs)
         retry_response.history.append(response)
         retry_response.request = retry_request
@@ -100,12 +285,27 @@ class HTTPBearerAuth(AuthBase):
 
         return retry_response
 
-    def _get_token(self, auth_info, repo):
-        bearer_info = parse_dict_header(self.BEARER_PATTERN.sub('', auth_info, count=1))
+    def _get_scope(self, repo):
         # If repo could not be determined, do not set scope - implies global access
-        if repo:
-            bearer_info['scope'] = 'repository:{}:{}'.format(repo, ','.join(self.access))
-        realm = bearer_info.pop('realm')
+        if not repo:
+            return ''
+        return 'repository:{}:{}'.format(repo, ','.join(self.access))
+
+    def _get_token(self, realm, bearer_info, repo, multiple_scopes=True):
+        """Get a token for repo from the realm, and for other repos with expired tokens"""
+        service = bearer_info.get('service', '')
+        scope = self._get_scope(repo)
+        scopes = [scope]
+        if scope:
+            bearer_info['scope'] = scope
+            known_scopes = self._scopes.setdefault((realm, service), set())
+            known_scopes.add(scope)
+            if multiple_scopes and self._token_cache.supports_multiple_scopes(realm):
+                expired = sorted(
+                    other for other in known_scopes if other != scope and
+                    not self._token_cache.get_token(realm, service, other, self._credentials)
+                )
+                scopes.extend(expired[:BEARER_TOKEN_MAX_SCOPES - 1])
 
         realm_auth = None
         if self.auth_b64:
@@ -113,13 +313,40 @@ class HTTPBearerAuth(AuthBase):
         elif self.username and self.password:
             realm_auth = HTTPBasicAuth(self.username, self.password)
 
-        realm_response = self._retry_session.get(realm, params=bearer_info, verify=self.verify,
-                                                 auth=realm_auth)
-        realm_response.raise_for_status()
-        return realm_response.json()['token']
-
-    def _set_header(self, response, repo):
-        response.headers['Authorization'] = 'Bearer {}'.format(self._token_cache[repo])
+        def request_token(scopes):
+            params = list(bearer_info.items())
+            if len(scopes) > 1:
+                params = [(k, v) for k, v in params if k != 'scope']
+                params.extend(('scope', s) for s in scopes)
+            realm_response = instrumented_request(
+                lambda: self._retry_session.get(realm, params=params, verify=self.verify,
+                                                auth=realm_auth),
+                'GET', realm, endpoint='token',
+            )
+            realm_response.raise_for_status()
+            return realm_response.json()
+
+        try:
+            token_info = request_token(scopes)
+        except HTTPError:
+            if len(scopes) == 1:
+                raise
+            logger.debug("%s failed to issue a token for several repositories", realm)
+            self._token_cache.set_single_scope(realm)
+            scopes = [scope]
+            token_info = request_token(scopes)
+
+        token = token_info['token']
+        expires_in = token_info.get('expires_in') or BEARER_TOKEN_DEFAULT_EXPIRY
+        self._token_cache.put_token(realm, service, scopes, self._credentials, token, expires_in)
+        return token
+
+    def _set_header(self, response, token):
+        response.headers['Authorization'] = 'Bearer {}'.format(token)
+
+    def _get_base_url(self, url):
+        url_parts = urlparse(url)
+        return '{}://{}'.format(url_parts.scheme, url_parts.netloc)
 
     def _get_repo_from_url(self, url):
         url_parts = urlparse(url)
@@ -0,0 +1,96 @@
+"""
+Copyright (c) 2023 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+
+
+Checkpoints of plugin runs, allowing a retried task to skip plugins which
+already finished successfully
+"""
+import hashlib
+import json
+import logging
+import os
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def compute_fingerprint(inputs: Any) -> str:
+    """Compute a stable hash of JSON-like plugin inputs
+
+    Values which are not JSON serializable are represented by their str().
+    """
+    serialized = json.dumps(inputs, sort_keys=True, default=str)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+def _stat_file(path: str) -> Dict[str, int]:
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+@dataclass
+class PluginCheckpoint:
+    """Record of a successful plugin run
+
+    Produced files are identified by their size and modification time, checksums
+    would be too expensive for the gigabytes of downloaded sources and images.
+    """
+
+    fingerprint: str
+    result: Any
+    # absolute path -> {"size": ..., "mtime_ns": ...}
+    files: Dict[str, Dict[str, int]] = field(default_factory=dict)
+
+    @classmethod
+    def create(cls, fingerprint: str, result: Any, files: Iterable[Path]) -> "PluginCheckpoint":
+        return cls(
+            fingerprint=fingerprint,
+            result=result,
+            files={str(path): _stat_file(str(path)) for path in files},
+        )
+
+    def files_intact(self) -> bool:
+        """Check that all produced files still exist unchanged"""
+        for path, expected in self.files.items():
+            try:
+                current = _stat_file(path)
+            except OSError:
+                logger.debug("checkpointed file %s does not exist anymore", path)
+                return False
+            if current != expected:
+                logger.debug("checkpointed file %s has changed", path)
+                return False
+        return True
+
+    def is_valid(self, fingerprint: str) -> bool:
+        return self.fingerprint == fingerprint and self.files_intact()
+
+    def save(self, path: Path) -> None:
+        """Write the checkpoint atomically
+
+        :raises TypeError: if the result is not JSON serializable
+        """
+        serialized = json.dumps(asdict(self))
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            f.write(serialized)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["PluginCheckpoint"]:
+        """Read a checkpoint, return None if there is no usable one"""
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            return cls(**data)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning("ignoring unreadable checkpoint %s: %s", path, e)
+            return None
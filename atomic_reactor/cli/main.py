@@ -13,8 +13,9 @@ import sys
 import osbs
 
 import atomic_reactor
+from atomic_reactor.auth import set_token_cache_file
 from atomic_reactor.cli import parser
-from atomic_reactor.util import setup_introspection_signal_handler
+from atomic_reactor.util import precompile_schemas, setup_introspection_signal_handler
 
 
 def _process_global_args(args: dict) -> dict:
@@ -23,6 +24,8 @@ def _process_global_args(args: dict) -> dict:
 
     verbose = task_args.pop("verbose")
     quiet = task_args.pop("quiet")
+    precompile = task_args.pop("precompile_schemas", False)
+    token_cache_file = task_args.pop("registry_token_cache", None)
     # Note: the version argument is not stored by argparse (because it has the 'version' action)
 
     if verbose:
@@ -35,6 +38,11 @@ def _process_global_args(args: dict) -> dict:
         atomic_reactor.set_logging(level=logging.INFO)
         osbs.set_logging(level=logging.INFO)
 
+    if precompile:
+        precompile_schemas()
+    if token_cache_file:
+        set_token_cache_file(token_cache_file)
+
     return task_args
 
 
@@ -145,6 +145,17 @@ def _add_global_args(parser: argparse.ArgumentParser) -> None:
         action="store_true",
         help="be more verbose, include debug messages in output",
     )
+    parser.add_argument(
+        "--precompile-schemas",
+        action="store_true",
+        help="load and check all JSON schemas before running, instead of on first use",
+    )
+    parser.add_argument(
+        "--registry-token-cache",
+        metavar="FILE",
+        help="save registry bearer tokens to FILE (readable by the owner only), "
+             "to reuse them in later tasks",
+    )
 
 
 def _add_common_task_args(task_parser: argparse.ArgumentParser) -> None:
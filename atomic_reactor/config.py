@@ -10,7 +10,7 @@ from copy import deepcopy
 from typing import Optional
 
 from atomic_reactor.utils.cachito import CachitoAPI
-from atomic_reactor.constants import REACTOR_CONFIG_ENV_NAME
+from atomic_reactor.constants import ARTIFACT_CACHE_MAX_SIZE, REACTOR_CONFIG_ENV_NAME
 from atomic_reactor.util import (
     read_yaml,
     read_yaml_from_file_path,
@@ -186,6 +186,8 @@ class ReactorConfigKeys(object):
     SOURCE_CONTAINER_KEY = 'source_container'
     OPERATOR_MANIFESTS_KEY = 'operator_manifests'
     IMAGE_SIZE_LIMIT_KEY = 'image_size_limit'
+    PLUGIN_PROFILING_KEY = 'plugin_profiling'
+    ARTIFACT_CACHE_KEY = 'artifact_cache'
     BUILDER_CA_BUNDLE_KEY = 'builder_ca_bundle'
 
 
@@ -508,6 +510,22 @@ class Configuration(object):
             'binary_image': config.get('binary_image', 0),
         }
 
+    @property
+    def plugin_profiling(self):
+        config = self._get_value(ReactorConfigKeys.PLUGIN_PROFILING_KEY, fallback={})
+        return {
+            'enabled': config.get('enabled', False),
+            'cprofile': config.get('cprofile', False),
+        }
+
+    @property
+    def artifact_cache(self):
+        config = self._get_value(ReactorConfigKeys.ARTIFACT_CACHE_KEY, fallback={})
+        return {
+            'path': config.get('path'),
+            'max_size': config.get('max_size', ARTIFACT_CACHE_MAX_SIZE),
+        }
+
     @property
     def builder_ca_bundle(self):
         return self._get_value(ReactorConfigKeys.BUILDER_CA_BUNDLE_KEY, fallback=None)
@@ -71,12 +71,45 @@ TOOLS_USED = (
 )
 
 DEFAULT_DOWNLOAD_BLOCK_SIZE = 10 * 1024 * 1024  # 10Mb
+# maximum number of files DownloadManager downloads at once, in total and from one host
+DOWNLOAD_MAX_WORKERS = 8
+DOWNLOAD_MAX_WORKERS_PER_HOST = 4
+# large files are downloaded in this many byte ranges in parallel, if the server supports it,
+# each range being at least DOWNLOAD_SEGMENT_MIN_SIZE
+DOWNLOAD_SEGMENTS = 4
+DOWNLOAD_SEGMENT_MIN_SIZE = 32 * 1024 * 1024  # 32Mb
+# block size of reading files to compute their checksums, and how many blocks are read
+# ahead of the hashing threads, see util.ParallelHasher
+HASH_BLOCK_SIZE = 1024 * 1024  # 1Mb
+HASH_PIPELINE_DEPTH = 4
+# default size limit of the artifact cache shared between builds, see artifact_cache
+# in reactor config
+ARTIFACT_CACHE_MAX_SIZE = 10 * 1024 * 1024 * 1024  # 10Gb
+# compact the workflow data journal into workflow.json once it grows over this size
+WORKFLOW_JOURNAL_COMPACT_SIZE = 8 * 1024 * 1024  # 8Mb
+# plugin results larger than this are stored in separate files in the context dir
+PLUGIN_RESULT_SPILL_SIZE = 256 * 1024  # 256Kb
+# files of at least this size are hard linked into platform build dirs, when reflinks
+# are not supported, smaller ones are copied
+BUILD_DIR_HARDLINK_MIN_SIZE = 1024 * 1024  # 1Mb
+# maximum number of platforms handled at once by plugins doing per-platform network work
+MAX_PARALLEL_PLATFORM_ACTIONS = 5
+# maximum number of concurrent requests for manifests and blobs of a single image
+MAX_PARALLEL_REGISTRY_REQUESTS = 5
+# registry manifests and config blobs cached in the context dir, by digest
+REGISTRY_CACHE_MAX_SIZE = 256 * 1024 * 1024  # 256Mb
+# how long tags of parent images are resolved to digests from the registry cache
+REGISTRY_CACHE_TAG_TTL = 5 * 60  # seconds
+# how long tags of parent images missing in the registry are not looked up again
+REGISTRY_CACHE_NOT_FOUND_TTL = 15  # seconds
 
 IMAGE_TYPE_DOCKER_ARCHIVE = 'docker-archive'
 IMAGE_TYPE_OCI = 'oci'
 IMAGE_TYPE_OCI_TAR = 'oci-tar'
 
 OTEL_SERVICE_NAME = 'osbs'
+# upper bounds of the latency histogram buckets of registry requests
+REGISTRY_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)  # seconds
 
 PLUGIN_KOJI_PROMOTE_PLUGIN_KEY = 'koji_promote'
 PLUGIN_KOJI_IMPORT_PLUGIN_KEY = 'koji_import'
@@ -141,6 +174,16 @@ HTTP_BACKOFF_FACTOR = 5
 HTTP_CLIENT_STATUS_RETRY = (408, 429, 500, 502, 503, 504)
 # requests timeout in seconds
 HTTP_REQUEST_TIMEOUT = 600
+# number of hosts whose connections are kept open by each shared http adapter
+HTTP_POOL_CONNECTIONS = 20
+# number of open connections kept per host, at least as many as parallel platform actions
+HTTP_POOL_MAXSIZE = 10
+# registry bearer tokens are not used anymore this many seconds before they expire
+BEARER_TOKEN_EXPIRY_MARGIN = 10
+# lifetime of registry bearer tokens which do not specify it, as in the token spec
+BEARER_TOKEN_DEFAULT_EXPIRY = 60
+# max number of repositories requested at once in a registry bearer token
+BEARER_TOKEN_MAX_SCOPES = 10
 # max retries for git clone
 GIT_MAX_RETRIES = 3
 # how many seconds should wait before another try of git clone
@@ -5,9 +5,12 @@ All rights reserved.
 This software may be modified and distributed under the terms
 of the BSD license. See the LICENSE file for details.
 """
+import contextvars
 import logging
+import os
 import reflink
 
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import shutil
 from shutil import copytree
@@ -16,6 +19,7 @@ from typing import Dict, List, Callable, Iterable, Optional, TypeVar
 from dockerfile_parse import DockerfileParser
 
 from atomic_reactor.constants import (
+    BUILD_DIR_HARDLINK_MIN_SIZE,
     DOCKERFILE_FILENAME,
     EXPORTED_COMPRESSED_IMAGE_NAME_TEMPLATE,
     EXPORTED_SQUASHED_IMAGE_NAME,
@@ -23,6 +27,7 @@ from atomic_reactor.constants import (
 )
 from atomic_reactor.source import Source
 from atomic_reactor.types import ImageInspectionData
+from atomic_reactor.utils.dockerfile import CachedDockerfileParser
 
 logger = logging.getLogger(__name__)
 
@@ -34,6 +39,32 @@ def reflink_copy(src, dst, *, follow_symlinks=True):
         reflink.reflink(str(src), str(dst))
 
 
+def hardlink_or_copy(src, dst, *, follow_symlinks=True):
+    """Hard link large files, copy the others
+
+    Platform build dirs then share the content of large files, e.g. lookaside
+    artifacts, with the source and with each other. Such files must not be
+    modified in place, which plugins only do with small files like Dockerfile.
+    Falls back to copying when linking fails, e.g. across file systems.
+    """
+    if not follow_symlinks and os.path.islink(src):
+        return shutil.copy2(src, dst, follow_symlinks=False)
+    if os.stat(src).st_size >= BUILD_DIR_HARDLINK_MIN_SIZE:
+        try:
+            os.link(src, dst)
+            return dst
+        except OSError as e:
+            logger.debug("cannot hard link %s, copying it: %s", src, e)
+    return shutil.copy2(src, dst, follow_symlinks=follow_symlinks)
+
+
+def get_copy_method(path: Path) -> Callable:
+    """Get the cheapest method of copying files into the build dirs under path"""
+    if reflink.supported_at(path):
+        return reflink_copy
+    return hardlink_or_copy
+
+
 class DockerfileNotExist(Exception):
     """Dockerfile does not exist."""
 
@@ -45,6 +76,15 @@ class BuildDirIsNotInitialized(Exception):
         super().__init__(msg or "Build directory is not initialized yet.")
 
 
+class PlatformActionsFailed(Exception):
+    """An action applied in parallel failed for several platforms."""
+
+    def __init__(self, errors: Dict[str, Exception]):
+        self.errors = errors
+        details = "; ".join(f"{platform}: {error!r}" for platform, error in errors.items())
+        super().__init__(f"Action failed for {len(errors)} platforms: {details}")
+
+
 class BuildDir(object):
     """Representing a directory which is specific to a platform."""
 
@@ -79,10 +119,13 @@ class BuildDir(object):
     def dockerfile(self) -> DockerfileParser:
         """Return the parsed Dockerfile.
 
+        The file is parsed again only if it has changed since it was last
+        parsed, so this is cheap to call repeatedly.
+
         :return: the parsed Dockerfile.
         :rtype: DockerfileParser
         """
-        return DockerfileParser(str(self.dockerfile_path))
+        return CachedDockerfileParser(str(self.dockerfile_path))
 
     @staticmethod
     def _get_env_from_inspection(data: ImageInspectionData) -> Optional[Dict[str, str]]:
@@ -117,7 +160,7 @@ class BuildDir(object):
         envs = self._get_env_from_inspection(parent_inspect)
         if envs is None:
             logger.debug("Parent Environment not found, not applied to Dockerfile")
-        return DockerfileParser(str(self.dockerfile_path), parent_env=envs)
+        return CachedDockerfileParser(str(self.dockerfile_path), parent_env=envs)
 
 
 FileCreationFunc = Callable[[BuildDir], Iterable[Path]]
@@ -166,9 +209,7 @@ class RootBuildDir(object):
         """
         src_path = source.path
 
-        copy_method = shutil.copy2
-        if reflink.supported_at(self.path):
-            copy_method = reflink_copy
+        copy_method = get_copy_method(self.path)
         logger.debug("copy method used for copy sources: %s", copy_method.__name__)
 
         for platform in self.platforms:
@@ -218,7 +259,9 @@ class RootBuildDir(object):
         """Get the build directory for the specified platform."""
         return BuildDir(self.path / platform, platform)
 
-    def for_each_platform(self, action: Callable[[BuildDir], T]) -> Dict[str, T]:
+    def for_each_platform(
+        self, action: Callable[[BuildDir], T], max_workers: int = 1
+    ) -> Dict[str, T]:
         """Apply an action on every platform-specific directory.
 
         The action callable will be applied to the platform-specific
@@ -231,10 +274,17 @@ class RootBuildDir(object):
         to the caller. As a result, the action will not be applied to the rest
         of the platforms.
 
+        With ``max_workers`` greater than 1, the action is applied to up to
+        that many platforms at once, in threads. The action is then applied to
+        all platforms even if it fails for some of them. If it fails for one
+        platform, the error is propagated, if it fails for more platforms,
+        PlatformActionsFailed holding all the errors is raised.
+
         :param action: a callable object that will be applied on every
             platform-specific directory. This callable must accept one single
             argument in BuildDir type, and it can return data in any type.
         :type action: Callable
+        :param int max_workers: maximum number of platforms handled at once
         :return: a mapping from platform to the value returned from the
             function which is called for that platform.
         :rtype: dict[str, any]
@@ -242,8 +292,32 @@ class RootBuildDir(object):
         if not self.has_sources:
             raise BuildDirIsNotInitialized()
         results: Dict[str, T] = {}
-        for platform in self.platforms:
-            results[platform] = action(self.platform_dir(platform))
+        if max_workers <= 1 or len(self.platforms) <= 1:
+            for platform in self.platforms:
+                results[platform] = action(self.platform_dir(platform))
+            return results
+
+        errors: Dict[str, Exception] = {}
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(self.platforms)),
+                                thread_name_prefix="platform") as executor:
+            # each platform runs in a copy of the caller's context, e.g. to keep
+            # attributing resource usage to the running plugin
+            futures = {
+                platform: executor.submit(
+                    contextvars.copy_context().run, action, self.platform_dir(platform)
+                )
+                for platform in self.platforms
+            }
+            for platform, future in futures.items():
+                try:
+                    results[platform] = future.result()
+                except Exception as e:
+                    errors[platform] = e
+
+        if len(errors) == 1:
+            raise next(iter(errors.values()))
+        if errors:
+            raise PlatformActionsFailed(errors) from next(iter(errors.values()))
         return results
 
     def for_all_platforms_copy(self, action: FileCreationFunc) -> List[Path]:
@@ -291,9 +365,7 @@ class RootBuildDir(object):
                 )
             the_new_files.append(file_path)
 
-        copy_method = shutil.copy2
-        if reflink.supported_at(self.path):
-            copy_method = reflink_copy
+        copy_method = get_copy_method(self.path)
         logger.debug("copy method used for all platforms copy: %s", copy_method.__name__)
 
         for platform in self.platforms[1:]:
@@ -318,6 +390,7 @@ class ContextDir:
             path.mkdir(parents=True)
         self._path = path
         self.workflow_json = path / "workflow.json"
+        self.workflow_journal = path / "workflow.journal"
 
     def get_platform_dir(self, platform: str) -> Path:
         """Get the directory specific to the specified platform.
@@ -337,3 +410,31 @@ class ContextDir:
     def get_platform_build_log(self, platform: str) -> Path:
         """Get platform-specific build log file."""
         return self._path / f"{platform}-build.log"
+
+    def get_plugin_pstats(self, plugin_key: str) -> Path:
+        """Get the file holding cProfile statistics of a plugin run."""
+        profiles_dir = self._path / "plugin-profiles"
+        profiles_dir.mkdir(exist_ok=True)
+        return profiles_dir / f"{plugin_key}.pstats"
+
+    def get_plugin_result_file(self, digest: str) -> Path:
+        """Get the content-addressed file holding a large plugin result."""
+        results_dir = self._path / "plugin-results"
+        results_dir.mkdir(exist_ok=True)
+        return results_dir / f"{digest}.json"
+
+    def get_checksum_registry_file(self) -> Path:
+        """Get the file keeping checksums of the files of the build for all tasks."""
+        return self._path / "checksums.json"
+
+    def get_registry_cache_dir(self) -> Path:
+        """Get the directory caching registry manifests and blobs for all tasks."""
+        cache_dir = self._path / "registry-cache"
+        cache_dir.mkdir(exist_ok=True)
+        return cache_dir
+
+    def get_plugin_checkpoint(self, plugin_key: str) -> Path:
+        """Get the file holding the checkpoint of a finished plugin run."""
+        checkpoints_dir = self._path / "plugin-checkpoints"
+        checkpoints_dir.mkdir(exist_ok=True)
+        return checkpoints_dir / f"{plugin_key}.json"
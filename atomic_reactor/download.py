@@ -6,16 +6,36 @@ This software may be modified and distributed under the terms
 of the BSD license. See the LICENSE file for details.
 """
 import base64
+import contextlib
+import contextvars
+import fcntl
 import hashlib
+import json
 import logging
 import os
+import re
+import shutil
+import threading
 import time
+import uuid
+import reflink
 import requests
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Deque, Dict, List, Optional, Sequence, Tuple, Union
 from urllib.parse import urlparse
 
-from atomic_reactor.util import get_retrying_requests_session
+from atomic_reactor.dirs import reflink_copy
+from atomic_reactor.util import (ParallelHasher, get_checksum_registry,
+                                 get_retrying_requests_session)
 from atomic_reactor.constants import (
+    ARTIFACT_CACHE_MAX_SIZE,
     DEFAULT_DOWNLOAD_BLOCK_SIZE,
+    DOWNLOAD_MAX_WORKERS,
+    DOWNLOAD_MAX_WORKERS_PER_HOST,
+    DOWNLOAD_SEGMENT_MIN_SIZE,
     HTTP_BACKOFF_FACTOR,
     HTTP_MAX_RETRIES,
     CACHITO_HASH_ALG,
@@ -25,14 +45,30 @@ from atomic_reactor.constants import (
 
 logger = logging.getLogger(__name__)
 
+# suffix of files being downloaded, the state needed to resume the download
+# is kept next to them, with an additional .json suffix
+PARTIAL_SUFFIX = '.partial'
+_CACHITO_HASHER = 'cachito'
+
+
+def _dest_path(url, dest_dir, dest_filename=None) -> str:
+    if not dest_filename:
+        dest_filename = os.path.basename(urlparse(url).path)
+    return os.path.join(dest_dir, dest_filename)
+
 
 def download_url(url, dest_dir, insecure=False, session=None, dest_filename=None,
-                 expected_checksums=None, verify_cachito_digest=False):
+                 expected_checksums=None, verify_cachito_digest=False, segments=1):
     """Download file from URL, handling retries
 
     To download to a temporary directory, use:
       f = download_url(url, tempfile.mkdtemp())
 
+    The file is downloaded to <dest_filename>.partial first. If the download
+    is interrupted and the server sent an ETag or Last-Modified header, the
+    next attempt (including one by another process) continues where the
+    previous one stopped, using an HTTP Range request.
+
     :param url: URL to download from
     :param dest_dir: existing directory to create file in
     :param insecure: bool, whether to perform TLS checks
@@ -41,6 +77,8 @@ def download_url(url, dest_dir, insecure=False, session=None, dest_filename=None
     :param expected_checksums: optional dictionary of checksum_type and
                                checksum to verify downloaded files
     :param verify_cachito_digest: bool, verify sha digest for cachito archive
+    :param segments: int, download large files in up to this many byte ranges
+                     in parallel, if the server supports range requests
     :return: str, path of downloaded file
     """
 
@@ -49,54 +87,624 @@ def download_url(url, dest_dir, insecure=False, session=None, dest_filename=None
     if session is None:
         session = get_retrying_requests_session()
 
-    parsed_url = urlparse(url)
-    if not dest_filename:
-        dest_filename = os.path.basename(parsed_url.path)
-    dest_path = os.path.join(dest_dir, dest_filename)
+    dest_path = _dest_path(url, dest_dir, dest_filename)
+    partial_path = dest_path + PARTIAL_SUFFIX
+    state_path = partial_path + '.json'
+    cache = get_artifact_cache()
+    if cache and (cached_checksums := cache.fetch(expected_checksums, dest_path)):
+        logger.info('%s found in the artifact cache', url)
+        _remove_partial(partial_path, state_path)
+        if registry := get_checksum_registry():
+            registry.put(dest_path, cached_checksums)
+        return dest_path
     logger.debug('downloading %s', url)
 
-    checksums = {algo: hashlib.new(algo) for algo in expected_checksums}
-    cachito_hasher = hashlib.new(CACHITO_HASH_ALG)
+    def new_hashers():
+        hashers = {algo: hashlib.new(algo) for algo in expected_checksums}
+        if verify_cachito_digest:
+            hashers[_CACHITO_HASHER] = hashlib.new(CACHITO_HASH_ALG)
+        return hashers
+
+    result = None
+    if segments > 1:
+        result = _download_segments(session, url, insecure, partial_path, segments, new_hashers)
+    if result is None:
+        result = _download_resumable(session, url, insecure, partial_path, state_path,
+                                     new_hashers)
+    hashers, headers = result
+
+    try:
+        _verify_checksums(hashers, expected_checksums, headers, verify_cachito_digest)
+    except ValueError:
+        # corrupted content must not be resumed
+        _remove_partial(partial_path, state_path)
+        raise
+
+    os.replace(partial_path, dest_path)
+    _remove_partial(partial_path, state_path)
+    logger.debug('download finished: %s', dest_path)
+    checksums = {algo: hasher.hexdigest() for algo, hasher in hashers.items()
+                 if algo != _CACHITO_HASHER}
+    if _CACHITO_HASHER in hashers:
+        checksums.setdefault(CACHITO_HASH_ALG, hashers[_CACHITO_HASHER].hexdigest())
+    if cache:
+        # the content is stored under its own checksums, verified or not
+        cache.store(dest_path, checksums)
+    if checksums and (registry := get_checksum_registry()):
+        registry.put(dest_path, checksums)
+    return dest_path
+
+
+def _download_resumable(session, url, insecure, partial_path, state_path, new_hashers):
+    """Download the file in one stream, resuming it after failures
+
+    :return: tuple, hashers of the downloaded file and headers of the response
+    """
+    hashers = new_hashers()
+    # bytes of the partial file the hashers have seen
+    hashed_size = 0
 
     for attempt in range(HTTP_MAX_RETRIES + 1):
-        response = session.get(url, stream=True, verify=not insecure)
+        offset = 0
+        headers = {}
+        validator = _load_partial_state(state_path, url)
+        if validator and os.path.exists(partial_path):
+            offset = os.path.getsize(partial_path)
+            # the server sends the whole file if it changed in the meantime
+            headers = {'Range': f'bytes={offset}-', 'If-Range': validator}
+
+        response = session.get(url, stream=True, verify=not insecure, headers=headers)
+        if offset and response.status_code == requests.codes.range_not_satisfiable:
+            logger.debug('cannot resume download of %s, starting over', url)
+            _remove_partial(partial_path, state_path)
+            response.close()
+            offset = 0
+            response = session.get(url, stream=True, verify=not insecure)
         response.raise_for_status()
+
+        if offset and not _resumes_at(response, offset):
+            offset = 0
+        if offset:
+            logger.info('resuming download of %s at byte %d', url, offset)
+            if offset != hashed_size:
+                # e.g. the partial file was left behind by another process
+                hashers = new_hashers()
+                hashed_size = _hash_file_range(partial_path, 0, offset, hashers.values())
+        else:
+            hashers = new_hashers()
+            hashed_size = 0
+        _save_partial_state(state_path, url, response)
+
         try:
-            with open(dest_path, 'wb') as f:
+            # hash while the next chunk is downloading and written
+            with open(partial_path, 'r+b' if offset else 'wb') as f, \
+                    ParallelHasher(hashers.values()) as parallel_hasher:
+                f.seek(offset)
+                f.truncate()
                 for chunk in response.iter_content(chunk_size=DEFAULT_DOWNLOAD_BLOCK_SIZE):
                     f.write(chunk)
-                    for checksum in checksums.values():
-                        checksum.update(chunk)
-
-                    if verify_cachito_digest:
-                        cachito_hasher.update(chunk)
-
-            for algo, checksum in checksums.items():
-                if checksum.hexdigest() != expected_checksums[algo]:
-                    raise ValueError(
-                        'Computed {} checksum, {}, does not match expected checksum, {}'
-                        .format(algo, checksum.hexdigest(), expected_checksums[algo]))
-
-            if verify_cachito_digest:
-                logger.info('will verify cachito digest')
-                if 'Digest' in response.headers:
-                    logger.info('digest is in cachito response header')
-
-                    digest = base64.b64encode(cachito_hasher.digest()).decode("utf-8")
-                    digest_str = f'{CACHITO_ALG_STR}={digest}'
-                    if digest_str != response.headers['Digest']:
-                        raise ValueError(
-                            'Cachito archive digest "{}" does not match expected digest "{}"'
-                            .format(digest_str, response.headers['Digest']))
-                    else:
-                        logger.info('digest for cachito archive is correct')
-
-            break
+                    parallel_hasher.update(chunk)
+                    hashed_size += len(chunk)
+            return hashers, response.headers
         except requests.exceptions.RequestException:
             if attempt < HTTP_MAX_RETRIES:
                 time.sleep(HTTP_BACKOFF_FACTOR * (2 ** attempt))
             else:
                 raise
 
-    logger.debug('download finished: %s', dest_path)
-    return dest_path
+
+class _RangesNotSupported(Exception):
+    """The server did not return the requested byte range"""
+
+
+def _download_segments(session, url, insecure, partial_path, segments, new_hashers):
+    """Download the file in byte range segments in parallel
+
+    The segments are written into a preallocated file. Each finished segment
+    is hashed as soon as all the segments before it are hashed, so the
+    checksums are computed over the whole file, in order, while later
+    segments are still downloading.
+
+    The Digest header of cachito archives is taken from the range responses,
+    the response to the HEAD request may describe another representation.
+    Like for a download in one stream, the digest is not verified if the
+    responses have no Digest header.
+
+    :return: tuple, hashers of the downloaded file and headers of the first
+        range response, or None if the file should be downloaded in one stream
+    """
+    try:
+        response = session.head(url, allow_redirects=True, verify=not insecure)
+    except Exception as e:
+        # only a probe, the download itself reports the errors of the server
+        logger.debug('HEAD %s failed, downloading it in one stream: %s', url, e)
+        return None
+    if not response.ok or response.headers.get('Accept-Ranges') != 'bytes':
+        return None
+    try:
+        size = int(response.headers['Content-Length'])
+    except (KeyError, ValueError):
+        return None
+    segments = min(segments, size // DOWNLOAD_SEGMENT_MIN_SIZE)
+    if segments < 2:
+        return None
+
+    etag = response.headers.get('ETag')
+    if etag and etag.startswith('W/'):
+        etag = None
+    # the server sends the whole file instead if it changed in the meantime
+    validator = etag or response.headers.get('Last-Modified')
+    bounds = [size * i // segments for i in range(segments + 1)]
+    ranges = list(zip(bounds, bounds[1:]))
+    failed = threading.Event()
+    # start of the segment -> headers of its range response
+    segment_headers = {}
+    logger.info('downloading %s in %d segments', url, segments)
+
+    def download_segment(fd, start, end):
+        position = start
+        for attempt in range(HTTP_MAX_RETRIES + 1):
+            headers = {'Range': f'bytes={position}-{end - 1}'}
+            if validator:
+                headers['If-Range'] = validator
+            try:
+                segment = session.get(url, stream=True, verify=not insecure, headers=headers)
+                try:
+                    segment.raise_for_status()
+                    if not _resumes_at(segment, position):
+                        raise _RangesNotSupported(url)
+                    segment_headers[start] = segment.headers
+                    for chunk in segment.iter_content(chunk_size=DEFAULT_DOWNLOAD_BLOCK_SIZE):
+                        if failed.is_set():
+                            return
+                        chunk = chunk[:end - position]
+                        os.pwrite(fd, chunk, position)
+                        position += len(chunk)
+                finally:
+                    segment.close()
+                if position < end:
+                    raise requests.exceptions.RequestException(
+                        f'incomplete segment {start}-{end - 1} of {url}')
+                return
+            except requests.exceptions.RequestException:
+                if attempt == HTTP_MAX_RETRIES:
+                    raise
+                time.sleep(HTTP_BACKOFF_FACTOR * (2 ** attempt))
+
+    hashers = new_hashers()
+    fd = os.open(partial_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        try:
+            os.posix_fallocate(fd, 0, size)
+        except (AttributeError, OSError):
+            # not supported by the platform or the file system
+            os.ftruncate(fd, size)
+        with ThreadPoolExecutor(max_workers=segments) as executor:
+            futures = [executor.submit(contextvars.copy_context().run,
+                                       download_segment, fd, start, end)
+                       for start, end in ranges]
+            try:
+                for future, (start, end) in zip(futures, ranges):
+                    future.result()
+                    _hash_file_range(partial_path, start, end, hashers.values())
+            except BaseException:
+                failed.set()
+                raise
+    except _RangesNotSupported:
+        logger.info('%s does not support range requests, downloading it in one stream', url)
+        os.unlink(partial_path)
+        return None
+    finally:
+        os.close(fd)
+    return hashers, segment_headers[ranges[0][0]]
+
+
+def _verify_checksums(hashers, expected_checksums, headers, verify_cachito_digest):
+    for algo, expected in expected_checksums.items():
+        checksum = hashers[algo]
+        if checksum.hexdigest() != expected:
+            raise ValueError(
+                'Computed {} checksum, {}, does not match expected checksum, {}'
+                .format(algo, checksum.hexdigest(), expected))
+
+    if verify_cachito_digest:
+        logger.info('will verify cachito digest')
+        if 'Digest' in headers:
+            logger.info('digest is in cachito response header')
+
+            digest = base64.b64encode(hashers[_CACHITO_HASHER].digest()).decode("utf-8")
+            digest_str = f'{CACHITO_ALG_STR}={digest}'
+            if digest_str != headers['Digest']:
+                raise ValueError(
+                    'Cachito archive digest "{}" does not match expected digest "{}"'
+                    .format(digest_str, headers['Digest']))
+            else:
+                logger.info('digest for cachito archive is correct')
+
+
+def _resumes_at(response, offset: int) -> bool:
+    """Check if the response is the rest of the file, starting at offset"""
+    if response.status_code != requests.codes.partial_content:
+        return False
+    # e.g. "bytes 1000-1999/2000"
+    match = re.match(r'bytes (\d+)-', response.headers.get('Content-Range', ''))
+    return match is not None and int(match.group(1)) == offset
+
+
+def _hash_file_range(path: str, start: int, end: int, hashers) -> int:
+    """Hash bytes start to end (exclusive) of the file
+
+    :return: int, position the hashing stopped at, before end if the file is shorter
+    """
+    position = start
+    with open(path, 'rb') as f, ParallelHasher(hashers) as parallel_hasher:
+        f.seek(start)
+        while position < end:
+            chunk = f.read(min(end - position, DEFAULT_DOWNLOAD_BLOCK_SIZE))
+            if not chunk:
+                break
+            parallel_hasher.update(chunk)
+            position += len(chunk)
+    return position
+
+
+def _load_partial_state(state_path: str, url: str) -> Optional[str]:
+    """Get the validator (ETag or Last-Modified) of the partially downloaded file"""
+    try:
+        with open(state_path) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if state.get('url') != url:
+        return None
+    return state.get('etag') or state.get('last_modified')
+
+
+def _save_partial_state(state_path: str, url: str, response) -> None:
+    etag = response.headers.get('ETag')
+    last_modified = response.headers.get('Last-Modified')
+    # weak ETags cannot be used in If-Range
+    if etag and etag.startswith('W/'):
+        etag = None
+    if not (etag or last_modified):
+        # the download cannot be resumed safely
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(state_path)
+        return
+    state = {'url': url, 'etag': etag, 'last_modified': last_modified}
+    with open(state_path, 'w') as f:
+        json.dump(state, f)
+
+
+def _remove_partial(partial_path: str, state_path: str) -> None:
+    for path in (partial_path, state_path):
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(path)
+
+
+class ArtifactCache:
+    """Local store of downloaded files, addressed by their checksums
+
+    Files are stored as <path>/<algorithm>/<checksum>, hard links of the same
+    file for each checksum known when it was downloaded. download_url looks
+    files up by the expected checksums before going to the network, so the
+    same Maven artifact or source RPM is only downloaded once for all builds
+    sharing the cache directory, e.g. through a persistent volume.
+
+    Files are reflinked or copied between the cache and the build dirs, never
+    hard linked, so a build modifying its files cannot corrupt the cache. A
+    cached file is hashed again once placed, it is only used if it still has
+    all the expected checksums.
+
+    Entries are fully written before they are linked into place, so several
+    processes can write to the cache at the same time. When the cache grows
+    over max_size, the least recently used files are removed.
+
+    The cache only saves downloads: errors reading or writing it, e.g. a full
+    disk, are logged and the file is downloaded, or kept only in the build
+    dir, as if there was no cache.
+    """
+
+    # the strongest algorithm is preferred when several checksums are expected;
+    # md5 is too easy to collide to address content shared between builds
+    ALGORITHMS = ('sha512', 'sha256', 'sha1')
+
+    def __init__(self, path: Path, max_size: int = ARTIFACT_CACHE_MAX_SIZE):
+        self.path = path
+        self.max_size = max_size
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def _entry_path(self, algorithm: str, checksum: str) -> Optional[Path]:
+        if algorithm not in self.ALGORITHMS or not re.fullmatch(r'[0-9a-f]+', checksum):
+            return None
+        return self.path / algorithm / checksum
+
+    def fetch(self, checksums: Dict[str, str], dest_path: str) -> Optional[Dict[str, str]]:
+        """Place the file with the given checksums at dest_path, if it is cached
+
+        :param checksums: dict, checksum type mapped to the expected checksum
+        :param dest_path: str, path to place the file at
+        :return: dict, the checksums computed for the placed file, or None
+            if the file was not cached or could not be placed
+        """
+        for algorithm in self.ALGORITHMS:
+            if algorithm not in checksums:
+                continue
+            entry = self._entry_path(algorithm, checksums[algorithm].lower())
+            if entry is None:
+                continue
+            tmp_path = Path(dest_path).with_name(f'.tmp-{uuid.uuid4().hex}')
+            try:
+                computed = self._fetch_entry(entry, tmp_path, dest_path, checksums)
+            except FileNotFoundError:
+                # not cached, or evicted in the meantime
+                continue
+            except OSError as e:
+                logger.warning('cannot fetch %s:%s from artifact cache: %s',
+                               algorithm, entry.name, e)
+                with contextlib.suppress(OSError):
+                    os.unlink(tmp_path)
+                continue
+            if computed is None:
+                logger.warning('artifact cache entry %s:%s is corrupted, removing it',
+                               algorithm, entry.name)
+                continue
+            logger.debug('artifact cache hit for %s:%s', algorithm, entry.name)
+            return computed
+        return None
+
+    def _fetch_entry(self, entry: Path, tmp_path: Path, dest_path: str,
+                     checksums: Dict[str, str]) -> Optional[Dict[str, str]]:
+        # mark as recently used, shared by all links of the entry
+        os.utime(entry)
+        _reflink_or_copy(entry, tmp_path)
+        computed = self._verify(tmp_path, checksums)
+        if computed is None:
+            os.unlink(tmp_path)
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(entry)
+            return None
+        os.replace(tmp_path, dest_path)
+        return computed
+
+    @staticmethod
+    def _verify(path: Path, checksums: Dict[str, str]) -> Optional[Dict[str, str]]:
+        """Hash the file, get its checksums if they are the expected ones"""
+        hashers = {algorithm: hashlib.new(algorithm) for algorithm in checksums}
+        _hash_file_range(str(path), 0, path.stat().st_size, hashers.values())
+        computed = {algorithm: hasher.hexdigest() for algorithm, hasher in hashers.items()}
+        if any(computed[algorithm] != checksum.lower()
+               for algorithm, checksum in checksums.items()):
+            return None
+        return computed
+
+    def store(self, path: str, checksums: Dict[str, str]) -> None:
+        """Store the file under each of its checksums
+
+        :param path: str, path of the file
+        :param checksums: dict, checksum type mapped to the checksum of the file
+        """
+        entries = [entry for entry in (self._entry_path(algorithm, checksum.lower())
+                                       for algorithm, checksum in checksums.items())
+                   if entry is not None]
+        if not entries:
+            return
+        tmp_path = self.path / f'.tmp-{uuid.uuid4().hex}'
+        try:
+            _reflink_or_copy(Path(path), tmp_path)
+            for entry in entries:
+                entry.parent.mkdir(exist_ok=True)
+                with contextlib.suppress(FileExistsError):
+                    # stored by another process in the meantime
+                    os.link(tmp_path, entry)
+            self._evict()
+        except OSError as e:
+            logger.warning('cannot store %s in artifact cache: %s', path, e)
+        finally:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp_path)
+
+    def _evict(self) -> None:
+        with open(self.path / '.lock', 'w') as lock:
+            # one process evicting at a time is enough
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            # links of the same file count once
+            files: Dict[int, Tuple[float, int, List[str]]] = {}
+            for algorithm in self.ALGORITHMS:
+                with contextlib.suppress(FileNotFoundError):
+                    for entry in os.scandir(self.path / algorithm):
+                        try:
+                            stat = entry.stat()
+                        except FileNotFoundError:
+                            continue
+                        _, _, paths = files.setdefault(
+                            stat.st_ino, (stat.st_mtime, stat.st_size, [])
+                        )
+                        paths.append(entry.path)
+            total_size = sum(size for _, size, _ in files.values())
+            for _, size, paths in sorted(files.values()):
+                if total_size <= self.max_size:
+                    break
+                for path in paths:
+                    logger.debug('evicting %s from artifact cache', path)
+                    with contextlib.suppress(FileNotFoundError):
+                        os.unlink(path)
+                total_size -= size
+
+
+def _reflink_or_copy(src: Path, dst: Path) -> None:
+    """Reflink src to dst if the file system supports it, copy it otherwise
+
+    Hard links would share the inode, and with it any later modification
+    or change of the mtime, between the cache and the build dirs.
+    """
+    if reflink.supported_at(dst.parent):
+        try:
+            reflink_copy(src, dst)
+            return
+        except FileNotFoundError:
+            raise
+        except Exception as e:
+            # e.g. a reflink across file systems
+            logger.debug('cannot reflink %s, copying it: %s', src, e)
+    shutil.copyfile(src, dst)
+
+
+_artifact_cache: Optional[ArtifactCache] = None
+
+
+def set_artifact_cache(cache: Optional[ArtifactCache]) -> None:
+    """Set the cache used by download_url in this process"""
+    global _artifact_cache
+    _artifact_cache = cache
+
+
+def get_artifact_cache() -> Optional[ArtifactCache]:
+    return _artifact_cache
+
+
+@dataclass
+class DownloadJob:
+    """A file to download with DownloadManager, see download_url for the fields"""
+
+    url: str
+    dest_dir: Union[str, Path]
+    dest_filename: Optional[str] = None
+    expected_checksums: Dict[str, str] = field(default_factory=dict)
+    segments: int = 1
+
+
+class DownloadError(Exception):
+    """Some downloads of a batch failed
+
+    :ivar failures: list of (DownloadJob, exception) tuples, in the order of the jobs
+    """
+
+    def __init__(self, failures: List[Tuple[DownloadJob, Exception]]):
+        self.failures = failures
+        details = '\n'.join(f'{job.url}: {error}' for job, error in failures)
+        super().__init__(f'{len(failures)} download(s) failed:\n{details}')
+
+
+# called with the number of finished downloads, the number of all downloads and
+# the job which has just been downloaded
+ProgressCallback = Callable[[int, int, DownloadJob], None]
+
+
+def log_progress(done: int, total: int, job: DownloadJob) -> None:
+    logger.debug('%d/%d downloaded %s', done, total, job.url)
+
+
+class DownloadManager:
+    """Download batches of files concurrently
+
+    At most max_workers files are downloaded at once, and at most max_per_host
+    of them from the same host. Jobs are only handed to the workers once
+    their host has a free slot, so jobs waiting for a busy host do not keep
+    the workers from downloading from other hosts. All the downloads share
+    one retrying session, and so its connection pools.
+
+    Jobs downloading to the same file run one after another, in the order
+    of the jobs, as they would share the partially downloaded file. They
+    count against the host of the first of them.
+
+    A failed download does not stop the others. Once all of them finished,
+    the failures are raised together as a DownloadError.
+    """
+
+    def __init__(self, insecure: bool = False, session: Optional[requests.Session] = None,
+                 max_workers: int = DOWNLOAD_MAX_WORKERS,
+                 max_per_host: int = DOWNLOAD_MAX_WORKERS_PER_HOST,
+                 progress: ProgressCallback = log_progress):
+        """
+        :param insecure: bool, whether to perform TLS checks
+        :param session: optional existing requests session to use
+        :param max_workers: int, how many files to download at once
+        :param max_per_host: int, how many files to download at once from one host
+        :param progress: callable, called after each successful download
+        """
+        self.insecure = insecure
+        self.session = session or get_retrying_requests_session()
+        self.max_workers = max_workers
+        self.max_per_host = max_per_host
+        self.progress = progress
+
+    def _download(self, job: DownloadJob) -> str:
+        return download_url(job.url, job.dest_dir, insecure=self.insecure,
+                            session=self.session, dest_filename=job.dest_filename,
+                            expected_checksums=job.expected_checksums,
+                            segments=job.segments)
+
+    def download(self, jobs: Sequence[DownloadJob]) -> List[str]:
+        """Download the files of the jobs
+
+        :param jobs: sequence of DownloadJob
+        :return: list of str, paths of the downloaded files, in the order of the jobs
+        :raises DownloadError: if any of the downloads failed
+        """
+        if not jobs:
+            return []
+
+        # indexes of the jobs by the file they download to
+        groups: Dict[str, List[int]] = {}
+        for index, job in enumerate(jobs):
+            dest_path = os.path.abspath(_dest_path(job.url, job.dest_dir, job.dest_filename))
+            groups.setdefault(dest_path, []).append(index)
+
+        def download_group(indexes: List[int]) -> List[Tuple[int, Union[str, Exception]]]:
+            results: List[Tuple[int, Union[str, Exception]]] = []
+            for index in indexes:
+                try:
+                    results.append((index, self._download(jobs[index])))
+                except Exception as e:
+                    results.append((index, e))
+            return results
+
+        # groups waiting for a slot of their host, and the number of running ones
+        waiting: Dict[str, Deque[List[int]]] = {}
+        for indexes in groups.values():
+            waiting.setdefault(urlparse(jobs[indexes[0]].url).netloc, deque()).append(indexes)
+        running: Dict[str, int] = Counter()
+
+        total = len(jobs)
+        paths: List[str] = [''] * total
+        failures: List[Tuple[int, Exception]] = []
+        done = 0
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(groups)),
+                                thread_name_prefix='download') as executor:
+            futures: Dict[Future, str] = {}
+
+            def submit_ready() -> None:
+                for host, host_groups in waiting.items():
+                    while host_groups and running[host] < self.max_per_host:
+                        future = executor.submit(contextvars.copy_context().run,
+                                                 download_group, host_groups.popleft())
+                        futures[future] = host
+                        running[host] += 1
+
+            submit_ready()
+            while futures:
+                finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+                results = []
+                for future in finished:
+                    running[futures.pop(future)] -= 1
+                    results.extend(future.result())
+                submit_ready()
+                for index, result in results:
+                    done += 1
+                    if isinstance(result, Exception):
+                        logger.error('%d/%d failed to download %s: %s',
+                                     done, total, jobs[index].url, result)
+                        failures.append((index, result))
+                    else:
+                        paths[index] = result
+                        self.progress(done, total, jobs[index])
+
+        if failures:
+            raise DownloadError([(jobs[index], error) for index, error in sorted(
+                failures, key=lambda failure: failure[0]
+            )])
+        return paths
@@ -10,6 +10,7 @@ Script for building docker image. This is expected to run inside container.
 """
 
 import functools
+import hashlib
 import json
 import logging
 import threading
@@ -17,17 +18,18 @@ import os
 import time
 import re
 from dataclasses import dataclass, field, fields
+from pathlib import Path
 from textwrap import dedent
-from typing import Any, Callable, Dict, Final, List, Optional, Union, Tuple
-
-from dockerfile_parse import DockerfileParser
+from typing import Any, Callable, Dict, Final, Iterable, List, Optional, Union, Tuple
 
 from atomic_reactor.dirs import ContextDir, RootBuildDir
-from atomic_reactor.plugin import PluginsRunner
+from atomic_reactor.plugin import PluginsRunner, resources_overlap, workflow_data_resource
 from atomic_reactor.constants import (
     DOCKER_STORAGE_TRANSPORT_NAME,
     REACTOR_CONFIG_FULL_PATH,
     DOCKERFILE_FILENAME,
+    PLUGIN_RESULT_SPILL_SIZE,
+    WORKFLOW_JOURNAL_COMPACT_SIZE,
 )
 from atomic_reactor.types import ISerializer, RpmComponent
 from atomic_reactor.util import (DockerfileImages,
@@ -35,6 +37,7 @@ from atomic_reactor.util import (DockerfileImages,
 from atomic_reactor.config import Configuration, get_openshift_session
 from atomic_reactor.source import Source, DummySource
 from atomic_reactor.utils import imageutil
+from atomic_reactor.utils.dockerfile import CachedDockerfileParser
 # from atomic_reactor import get_logging_encoding
 from osbs.api import OSBS
 from osbs.utils import ImageName
@@ -266,6 +269,82 @@ class FSWatcher(threading.Thread):
         return new_data
 
 
+class SpilledResult:
+    """A plugin result stored in a content-addressed file in the context dir
+
+    Large results are usually needed by a single later plugin, keeping them
+    out of workflow.json saves every other task from loading them.
+    """
+
+    def __init__(self, path: Path, digest: str) -> None:
+        self.path = path
+        self.digest = digest
+
+    def __repr__(self) -> str:
+        return f"SpilledResult(digest={self.digest!r})"
+
+    @classmethod
+    def spill(cls, context_dir: ContextDir, value: Any) -> Any:
+        """Move the value to a file if its serialized form is too large
+
+        :return: SpilledResult referring to the file, or the value itself
+        """
+        if isinstance(value, SpilledResult):
+            return value
+        encoded = json.dumps(value, cls=WorkflowDataEncoder)
+        if len(encoded) <= PLUGIN_RESULT_SPILL_SIZE:
+            return value
+        digest = hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+        path = context_dir.get_plugin_result_file(digest)
+        if not path.exists():
+            tmp_path = path.with_name(path.name + ".tmp")
+            tmp_path.write_text(encoded, encoding="utf-8")
+            os.replace(tmp_path, path)
+        return cls(path, digest)
+
+    def load(self) -> Any:
+        logger.debug("loading plugin result from %s", self.path)
+        with open(self.path, "r") as f:
+            return WorkflowDataDecoder().restore(json.load(f))
+
+
+class PluginsResults(dict):
+    """Plugin results, loading results stored in separate files on first access
+
+    When serialized, results which were not accessed are kept as references to
+    their files.
+    """
+
+    def __getitem__(self, key: str) -> Any:
+        value = super().__getitem__(key)
+        if isinstance(value, SpilledResult):
+            value = value.load()
+            super().__setitem__(key, value)
+        return value
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self[key] if key in self else default
+
+    def pop(self, key: str, *default: Any) -> Any:
+        value = super().pop(key, *default)
+        return value.load() if isinstance(value, SpilledResult) else value
+
+    def values(self):  # type: ignore[override]
+        return [self[key] for key in self]
+
+    def items(self):  # type: ignore[override]
+        return [(key, self[key]) for key in self]
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, dict):
+            return NotImplemented
+        return dict(self.items()) == dict(other.items())
+
+    def __ne__(self, other: object) -> bool:
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+
 @dataclass
 class ImageBuildWorkflowData(ISerializer):
     """Manage workflow data.
@@ -281,12 +360,16 @@ class ImageBuildWorkflowData(ISerializer):
     dockerfile_images: DockerfileImages = field(default_factory=DockerfileImages)
     tag_conf: TagConf = field(default_factory=TagConf)
 
-    plugins_results: Dict[str, Any] = field(default_factory=dict)
+    # Results larger than PLUGIN_RESULT_SPILL_SIZE are saved in separate files
+    # and loaded on first access, see PluginsResults
+    plugins_results: Dict[str, Any] = field(default_factory=PluginsResults)
 
     # Plugin name -> timestamp in isoformat
     plugins_timestamps: Dict[str, str] = field(default_factory=dict)
     # Plugin name -> seconds
     plugins_durations: Dict[str, float] = field(default_factory=dict)
+    # Plugin name -> resource usage, see atomic_reactor.profiling.PluginProfile
+    plugins_profiles: Dict[str, Dict[str, Any]] = field(default_factory=dict)
     # Plugin name -> a string containing error message
     plugins_errors: Dict[str, str] = field(default_factory=dict)
     task_canceled: bool = False
@@ -323,6 +406,10 @@ class ImageBuildWorkflowData(ISerializer):
     # ]
     koji_upload_files: List[Dict[str, str]] = field(default_factory=list)
 
+    # Task name -> registry host -> endpoint type -> request metrics,
+    # see atomic_reactor.utils.registry_metrics
+    registry_metrics: Dict[str, Dict[str, Dict[str, Any]]] = field(default_factory=dict)
+
     @classmethod
     def load(cls, data: Dict[str, Any]):
         """Load workflow data from given input."""
@@ -351,24 +438,29 @@ class ImageBuildWorkflowData(ISerializer):
     def load_from_dir(cls, context_dir: ContextDir) -> "ImageBuildWorkflowData":
         """Load workflow data from the data directory.
 
+        Updates recorded in the journal after workflow.json was last written
+        are applied on top of it, see ``WorkflowDataJournal``.
+
         :param context_dir: a directory holding the files containing the serialized
             workflow data.
         :type context_dir: ContextDir
         :return: the workflow data containing data loaded from the specified directory.
         :rtype: ImageBuildWorkflowData
         """
-        if not context_dir.workflow_json.exists():
+        if context_dir.workflow_json.exists():
+            with open(context_dir.workflow_json, "r") as f:
+                raw_data = json.load(f)
+        elif context_dir.workflow_journal.exists():
+            # a task crashed before workflow.json was written for the first time
+            raw_data = json.loads(json.dumps(cls().as_dict(), cls=WorkflowDataEncoder))
+        else:
             return cls()
 
-        with open(context_dir.workflow_json, "r") as f:
-            file_content = f.read()
-
-        raw_data = json.loads(file_content)
+        WorkflowDataJournal.replay(context_dir, raw_data)
         validate_with_schema(raw_data, "schemas/workflow_data.json")
 
-        # NOTE: json.loads twice since the data is validated at the first time.
-        workflow_data = json.loads(file_content, object_hook=WorkflowDataDecoder())
-
+        workflow_data = WorkflowDataDecoder(context_dir).restore(raw_data)
+        workflow_data["plugins_results"] = PluginsResults(workflow_data["plugins_results"])
         loaded_data = cls(**workflow_data)
         return loaded_data
 
@@ -378,13 +470,147 @@ class ImageBuildWorkflowData(ISerializer):
     def save(self, context_dir: ContextDir) -> None:
         """Save workflow data into the files under a specific directory.
 
+        The file is replaced atomically and the journal, which is included in
+        the saved data, is removed.
+
         :param context_dir: a directory holding the files containing the serialized
             workflow data.
         :type context_dir: ContextDir
         """
         logger.info("Writing workflow data into %s", context_dir.workflow_json)
-        with open(context_dir.workflow_json, "w+") as f:
-            json.dump(self.as_dict(), f, cls=WorkflowDataEncoder)
+        data = self.as_dict()
+        # iterate the underlying dict to keep results which were not loaded spilled
+        data["plugins_results"] = {
+            key: SpilledResult.spill(context_dir, value)
+            for key, value in dict.items(self.plugins_results)
+        }
+        tmp_path = context_dir.workflow_json.with_name(context_dir.workflow_json.name + ".tmp")
+        with open(tmp_path, "w+") as f:
+            json.dump(data, f, cls=WorkflowDataEncoder)
+        os.replace(tmp_path, context_dir.workflow_json)
+        context_dir.workflow_journal.unlink(missing_ok=True)
+
+
+class WorkflowDataJournal:
+    """Append-only journal of workflow data updates
+
+    Updates are appended to the journal in the context dir as each plugin
+    finishes, so they survive a crashed task without rewriting the whole
+    workflow.json every time. For the per-plugin fields (plugins_results etc.)
+    only the entries of the finished plugin are recorded, other fields are
+    recorded whole when they have changed. Only the fields a plugin declares
+    it writes are checked for changes, fields of plugins which declare no
+    resources are all checked.
+
+    Each line is a JSON object {"field": name, "value": value}, optionally
+    with "key" if value is the entry of a per-plugin field.
+    """
+
+    PLUGIN_FIELDS: Final[Tuple[str, ...]] = (
+        "plugins_results",
+        "plugins_timestamps",
+        "plugins_durations",
+        "plugins_profiles",
+        "plugins_errors",
+    )
+
+    def __init__(
+        self,
+        context_dir: ContextDir,
+        data: ImageBuildWorkflowData,
+        compact_size: int = WORKFLOW_JOURNAL_COMPACT_SIZE,
+    ) -> None:
+        self._context_dir = context_dir
+        self._data = data
+        self._compact_size = compact_size
+        self._lock = threading.Lock()
+        # digests of the other fields as they were last recorded
+        self._digests: Dict[str, Optional[str]] = {
+            name: self._digest(name) for name in self._other_fields()
+        }
+
+    def _other_fields(self) -> List[str]:
+        return [f.name for f in fields(self._data) if f.name not in self.PLUGIN_FIELDS]
+
+    def _digest(self, name: str) -> Optional[str]:
+        try:
+            encoded = json.dumps(getattr(self._data, name), cls=WorkflowDataEncoder,
+                                 sort_keys=True)
+        except RuntimeError:
+            # changed by a plugin running concurrently, record it next time
+            return None
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    def _written_fields(self, writes: Optional[Iterable[str]]) -> List[str]:
+        if writes is None:
+            return self._other_fields()
+        writes = frozenset(writes)
+        return [name for name in self._other_fields()
+                if resources_overlap(frozenset({workflow_data_resource(name)}), writes)]
+
+    def record_plugin(self, plugin_key: str, writes: Optional[Iterable[str]] = None) -> None:
+        """Record the updates made by a finished plugin
+
+        :param plugin_key: key of the plugin
+        :param writes: resources the plugin declares it writes, see Plugin.writes,
+            None if the plugin may have changed any field
+        """
+        with self._lock:
+            entries: List[Dict[str, Any]] = []
+            for name in self.PLUGIN_FIELDS:
+                values = getattr(self._data, name)
+                if plugin_key in values:
+                    value = values[plugin_key]
+                    if name == "plugins_results":
+                        value = SpilledResult.spill(self._context_dir, value)
+                    entries.append({"field": name, "key": plugin_key, "value": value})
+            changed_digests = {}
+            for name in self._written_fields(writes):
+                digest = self._digest(name)
+                if digest is not None and digest != self._digests[name]:
+                    entries.append({"field": name, "value": getattr(self._data, name)})
+                    changed_digests[name] = digest
+            if not entries:
+                return
+
+            lines = "".join(json.dumps(entry, cls=WorkflowDataEncoder) + "\n"
+                            for entry in entries)
+            with open(self._context_dir.workflow_journal, "ab+") as f:
+                journal_size = f.seek(0, os.SEEK_END)
+                if journal_size:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        # terminate an entry truncated by a crash
+                        lines = "\n" + lines
+                f.write(lines.encode("utf-8"))
+                journal_size = f.tell()
+            self._digests.update(changed_digests)
+
+            if journal_size > self._compact_size:
+                logger.debug("compacting workflow data journal of %d bytes", journal_size)
+                self._data.save(self._context_dir)
+
+    @staticmethod
+    def replay(context_dir: ContextDir, raw_data: Dict[str, Any]) -> None:
+        """Apply journaled updates to serialized workflow data, in place
+
+        Lines which cannot be parsed, truncated by a crash while writing, are
+        ignored.
+        """
+        if not context_dir.workflow_journal.exists():
+            return
+        with open(context_dir.workflow_journal, "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    logger.warning("ignoring incomplete entry of %s: %r",
+                                   context_dir.workflow_journal, line[:100])
+                    continue
+                if "key" in entry:
+                    raw_data.setdefault(entry["field"], {})[entry["key"]] = entry["value"]
+                else:
+                    raw_data[entry["field"]] = entry["value"]
 
 
 class WorkflowDataEncoder(json.JSONEncoder):
@@ -401,22 +627,49 @@ class WorkflowDataEncoder(json.JSONEncoder):
                 "__type__": o.__class__.__name__,
                 "str": o.to_str(),
             }
+        elif isinstance(o, SpilledResult):
+            return {
+                "__type__": o.__class__.__name__,
+                "digest": o.digest,
+            }
         return super().default(o)
 
 
 class WorkflowDataDecoder:
     """Custom JSON decoder for workflow data."""
 
+    def __init__(self, context_dir: Optional[ContextDir] = None) -> None:
+        """
+        :param context_dir: the directory holding spilled plugin results,
+            required to restore references to them
+        """
+        self._context_dir = context_dir
+
+    def restore(self, data: Any) -> Any:
+        """Restore custom serializable objects in already parsed JSON data"""
+        if isinstance(data, dict):
+            return self({key: self.restore(value) for key, value in data.items()})
+        if isinstance(data, list):
+            return [self.restore(item) for item in data]
+        return data
+
     def _restore_image_name(self, data: Dict[str, str]) -> ImageName:
         """Factor to create an ImageName object."""
         return ImageName.parse(data["str"])
 
+    def _restore_spilled_result(self, data: Dict[str, str]) -> SpilledResult:
+        if self._context_dir is None:
+            raise ValueError("Cannot restore a spilled plugin result without context dir")
+        digest = data["digest"]
+        return SpilledResult(self._context_dir.get_plugin_result_file(digest), digest)
+
     def __call__(self, data: Dict[str, Any]) -> Any:
         """Restore custom serializable objects."""
         loader_meths: Final[Dict[str, Callable]] = {
             DockerfileImages.__name__: DockerfileImages.load,
             TagConf.__name__: TagConf.load,
             ImageName.__name__: self._restore_image_name,
+            SpilledResult.__name__: self._restore_spilled_result,
         }
         if "__type__" not in data:
             # __type__ is an identifier to indicate a dict object represents an
@@ -461,6 +714,8 @@ class DockerBuildWorkflow(object):
         plugins_conf: Optional[List[Dict[str, Any]]] = None,
         plugin_files: Optional[List[str]] = None,
         keep_plugins_running: bool = False,
+        plugins_max_workers: int = 1,
+        plugins_checkpoints: bool = False,
         platforms_result: Optional[str] = None,
         annotations_result: Optional[str] = None,
     ):
@@ -482,6 +737,11 @@ class DockerBuildWorkflow(object):
         :param client_version: osbs-client version used to render build json
         :param bool keep_plugins_running: keep plugins running even if error is
             raised from previous one. This is passed to ``PluginsRunner`` directly.
+        :param int plugins_max_workers: maximum number of plugins running
+            concurrently. This is passed to ``PluginsRunner`` directly.
+        :param bool plugins_checkpoints: skip plugins which already finished in
+            a previous run of the task. This is passed to ``PluginsRunner``
+            directly.
         :param platforms_result: path to platform results for prebuild task
         :param annotations_result: path to annotations result for exit task
         """
@@ -496,6 +756,8 @@ class DockerBuildWorkflow(object):
         self.annotations_result = annotations_result
 
         self.keep_plugins_running = keep_plugins_running
+        self.plugins_max_workers = plugins_max_workers
+        self.plugins_checkpoints = plugins_checkpoints
         self.plugin_files = plugin_files
         self.plugins_conf = plugins_conf or []
         self.fs_watcher = FSWatcher()
@@ -544,7 +806,7 @@ class DockerBuildWorkflow(object):
         self.imageutil.set_dockerfile_images(df_images)
 
     def _parse_dockerfile_images(self, path: str) -> DockerfileImages:
-        dfp = DockerfileParser(path)
+        dfp = CachedDockerfileParser(path)
         if dfp.baseimage is None:
             raise RuntimeError("no base image specified in Dockerfile")
 
@@ -646,13 +908,20 @@ class DockerBuildWorkflow(object):
         are all ensured to be executed.
         """
         print_version_of_tools()
+        journal = None
+        # the journal lives next to workflow.json, which a bare path does not have
+        if isinstance(self.context_dir, ContextDir):
+            journal = WorkflowDataJournal(self.context_dir, self.data)
         try:
             self.fs_watcher.start()
             runner = PluginsRunner(self,
                                    self.plugins_conf,
                                    self.plugin_files,
                                    self.keep_plugins_running,
-                                   plugins_results=self.data.plugins_results)
+                                   plugins_results=self.data.plugins_results,
+                                   max_workers=self.plugins_max_workers,
+                                   checkpoints=self.plugins_checkpoints,
+                                   journal=journal)
             runner.run()
         finally:
             self.fs_watcher.finish()
@@ -10,28 +10,77 @@ definition of plugin system
 
 plugins are supposed to be run when image is built and we need to extract some information
 """
+import contextvars
 import copy
+import fnmatch
 import logging
 import os
 import sys
 import traceback
 import imp  # pylint: disable=deprecated-module
+import importlib
 import inspect
+import pkgutil
 import time
 from abc import ABC, abstractmethod
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from contextlib import contextmanager
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Any, Dict, Generator, TYPE_CHECKING, List, Optional
-
+from pathlib import Path
+from types import ModuleType
+from typing import (Any, Dict, FrozenSet, Generator, Iterator, TYPE_CHECKING, List, Mapping,
+                    Optional, Set, Tuple, Type)
+
+from atomic_reactor.checkpoint import PluginCheckpoint, compute_fingerprint
+from atomic_reactor.constants import DOCKERFILE_FILENAME
+from atomic_reactor.plugin_index import PLUGIN_INDEX
+from atomic_reactor.profiling import profile_plugin
 from atomic_reactor.util import exception_message
+from atomic_reactor.utils.aio import EventLoopThread
 
 if TYPE_CHECKING:
-    from atomic_reactor.inner import DockerBuildWorkflow
+    from atomic_reactor.inner import DockerBuildWorkflow, WorkflowDataJournal
 
 MODULE_EXTENSIONS = ('.py', '.pyc', '.pyo')
+PLUGINS_PACKAGE = 'atomic_reactor.plugins'
+PLUGIN_INDEX_PATH = os.path.join(os.path.dirname(__file__), 'plugin_index.py')
 logger = logging.getLogger(__name__)
 
+# Shared resources which plugins declare in Plugin.reads and Plugin.writes.
+# A resource is a "/"-separated path, two resources overlap when they are
+# equal or one of them is a parent of the other, e.g. "build_dir" overlaps
+# with "build_dir/Dockerfile". Parts of a resource may be fnmatch patterns
+# for files named at runtime, e.g. "build_dir/remote-source-*.tar.gz".
+RESOURCE_BUILD_DIR = "build_dir"
+RESOURCE_DOCKERFILE = f"{RESOURCE_BUILD_DIR}/{DOCKERFILE_FILENAME}"
+
+
+def build_dir_resource(name: str) -> str:
+    """Resource name of a file or directory inside the platform build dirs"""
+    return f"{RESOURCE_BUILD_DIR}/{name}"
+
+
+def plugin_result_resource(plugin_key: str) -> str:
+    """Resource name of the result of the plugin with the given key"""
+    return f"plugins_results/{plugin_key}"
+
+
+def workflow_data_resource(field_name: str) -> str:
+    """Resource name of a field of ImageBuildWorkflowData"""
+    return f"data/{field_name}"
+
+
+def resources_overlap(left: FrozenSet[str], right: FrozenSet[str]) -> bool:
+    """Check if any resource from left overlaps with any resource from right"""
+    for a in left:
+        for b in right:
+            # a parent overlaps with all its children, compare the common parts
+            if all(fnmatch.fnmatchcase(a_part, b_part) or fnmatch.fnmatchcase(b_part, a_part)
+                   for a_part, b_part in zip(a.split("/"), b.split("/"))):
+                return True
+    return False
+
 
 @dataclass
 class PluginExecutionInfo:
@@ -55,6 +104,22 @@ class Plugin(ABC):
     # by default, if plugin fails (raises exc), execution continues
     is_allowed_to_fail = True
 
+    # Shared resources (see RESOURCE_* and *_resource() above) the plugin reads
+    # and modifies. PluginsRunner uses them to find out which plugins may run
+    # concurrently. Files coming from the source repository which no plugin
+    # modifies do not have to be declared, and the plugin's own result is
+    # always considered written. None means the plugin may touch anything and
+    # it will never run alongside other plugins.
+    reads: Optional[FrozenSet[str]] = None
+    writes: Optional[FrozenSet[str]] = None
+
+    # Whether a successful run may be recorded in a checkpoint and skipped when
+    # a retried task runs the plugin again with the same inputs. Only suitable
+    # for plugins whose outcome is fully described by their result and the
+    # files returned by get_checkpoint_files(), i.e. which do not modify the
+    # workflow data.
+    checkpoint = False
+
     def __init__(self, workflow: "DockerBuildWorkflow", *args, **kwargs):
         """
         constructor
@@ -106,6 +171,10 @@ class Plugin(ABC):
           results[plugin.key] = plugin.run()
 
         input plugins should emit build json with this method
+
+        this method may also be implemented as ``async def``; the runner awaits
+        it in an event loop shared by all plugins of the task, see
+        atomic_reactor.utils.aio for helpers
         """
 
     @staticmethod
@@ -116,6 +185,127 @@ class Plugin(ABC):
         """
         return {}
 
+    def get_checkpoint_files(self, result: Any) -> List[Path]:
+        """Files produced by this plugin, which have to remain unchanged for
+        a checkpoint of the run to be valid.
+
+        :param result: the value returned by run()
+        """
+        return []
+
+
+def scan_plugin_classes(module: ModuleType) -> Dict[str, Type[Plugin]]:
+    """Find all plugin classes available in a module
+
+    :return: dict, mapping of plugin keys to plugin classes
+    """
+    plugin_classes = {}
+    for name in dir(module):
+        binding = getattr(module, name)
+        try:
+            # if you try to compare binding and Plugin, python won't match them
+            # if you call this script directly b/c:
+            # ! <class 'plugins.plugin_rpmqa.PostBuildRPMqaPlugin'> <= <class
+            # '__main__.Plugin'>
+            # but
+            # <class 'plugins.plugin_rpmqa.PostBuildRPMqaPlugin'> <= <class
+            # 'atomic_reactor.plugin.Plugin'>
+            is_sub = issubclass(binding, Plugin)
+        except TypeError:
+            is_sub = False
+        if binding and is_sub and Plugin.__name__ != binding.__name__:
+            plugin_classes[binding.key] = binding
+    return plugin_classes
+
+
+def generate_plugin_index() -> Dict[str, Tuple[str, str]]:
+    """Import all plugin modules shipped with atomic-reactor and index their plugins
+
+    :return: dict, mapping of plugin keys to (module name, class name) tuples,
+        module names are relative to the atomic_reactor.plugins package
+    """
+    package = importlib.import_module(PLUGINS_PACKAGE)
+    index = {}
+    for module_info in pkgutil.iter_modules(package.__path__):
+        module = importlib.import_module(f"{PLUGINS_PACKAGE}.{module_info.name}")
+        for key, plugin_class in scan_plugin_classes(module).items():
+            # skip abstract base plugins and plugins imported from other modules
+            if isinstance(key, str) and plugin_class.__module__ == module.__name__:
+                index[key] = (module_info.name, plugin_class.__name__)
+    return dict(sorted(index.items()))
+
+
+def write_plugin_index(path: str = PLUGIN_INDEX_PATH) -> None:
+    """Regenerate the atomic_reactor.plugin_index module"""
+    lines = [f"    {key!r}: ({module!r}, {class_name!r}),\n"
+             for key, (module, class_name) in generate_plugin_index().items()]
+    with open(path, "w") as f:
+        f.write(PLUGIN_INDEX_TEMPLATE.format(entries="".join(lines)))
+
+
+PLUGIN_INDEX_TEMPLATE = '''"""
+Copyright (c) 2023 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+
+
+Index of plugins shipped in atomic_reactor.plugins, mapping plugin keys to
+(module name, class name) tuples.
+
+Generated by atomic_reactor.plugin.write_plugin_index(), run "make plugin-index"
+after adding, removing or renaming a plugin.
+"""
+
+PLUGIN_INDEX = {{
+{entries}}}
+'''
+
+
+class PluginClasses(Mapping):
+    """Plugin classes by plugin keys
+
+    Plugins from the plugin index are imported on first access, so that
+    running a task does not import modules of plugins it does not run.
+    """
+
+    def __init__(self, index: Dict[str, Tuple[str, str]],
+                 extra_plugins: Optional[Dict[str, Type[Plugin]]] = None):
+        """
+        :param index: dict, mapping of plugin keys to (module name, class name)
+            tuples, module names are relative to the atomic_reactor.plugins package
+        :param extra_plugins: dict, already loaded plugin classes, they take
+            precedence over the plugins from the index
+        """
+        self._index = index
+        self._loaded: Dict[str, Type[Plugin]] = dict(extra_plugins or {})
+
+    def __getitem__(self, key: str) -> Type[Plugin]:
+        if key in self._loaded:
+            return self._loaded[key]
+        module_name, class_name = self._index[key]
+        try:
+            module = importlib.import_module(f"{PLUGINS_PACKAGE}.{module_name}")
+        except (IOError, OSError, ImportError, SyntaxError) as ex:
+            logger.warning("can't load module '%s': %s", module_name, ex)
+            raise KeyError(key) from ex
+        plugin_class = getattr(module, class_name)
+        self._loaded[key] = plugin_class
+        return plugin_class
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self._loaded
+        for key in self._index:
+            if key not in self._loaded:
+                yield key
+
+    def __len__(self) -> int:
+        return len(self._loaded.keys() | self._index.keys())
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._loaded or key in self._index
+
 
 # Built-in plugins
 class SleepPlugin(Plugin):
@@ -143,6 +333,9 @@ class PluginsRunner(object):
             plugin_files: Optional[List[str]] = None,
             keep_going: bool = False,
             plugins_results: Optional[Dict[str, Any]] = None,
+            max_workers: int = 1,
+            checkpoints: bool = False,
+            journal: Optional["WorkflowDataJournal"] = None,
     ) -> None:
         """constructor
 
@@ -153,6 +346,14 @@ class PluginsRunner(object):
         :type plugin_files: list[str]
         :param bool keep_going: keep running next plugin even if error is
             raised from previous plugin.
+        :param int max_workers: maximum number of plugins running at the same
+            time. Plugins only run concurrently when they declare the resources
+            they use and those do not overlap, see ``get_plugin_dependencies``.
+        :param bool checkpoints: record checkpoints of plugins which support
+            them in the context dir and skip plugins whose checkpoint from a
+            previous run is still valid.
+        :param journal: if set, the workflow data updates made by each plugin
+            are recorded in the journal once the plugin finishes.
         """
         self.workflow = workflow
         self.plugins_results = {} if plugins_results is None else plugins_results
@@ -161,24 +362,25 @@ class PluginsRunner(object):
         self.plugin_classes = self.load_plugins()
         self.available_plugins = self.get_available_plugins()
         self.keep_going = keep_going
+        self.max_workers = max_workers
+        self.checkpoints = checkpoints
+        self.journal = journal
+        self.event_loop = EventLoopThread()
 
-    def load_plugins(self) -> Dict[str, Plugin]:
+    def load_plugins(self) -> "PluginClasses":
         """
         load all available plugins
 
-        :return: dict, bindings for plugins of the plugin_class_name class
+        Plugins shipped with atomic-reactor are looked up in the plugin index
+        and imported only when requested, plugins from plugin_files are loaded
+        by scanning the files.
+
+        :return: PluginClasses, mapping of plugin keys to plugin classes
         """
-        # imp.findmodule('atomic_reactor') doesn't work
-        plugins_dir = os.path.join(os.path.dirname(__file__), 'plugins')
-        logger.debug("loading plugins from dir '%s'", plugins_dir)
-        files = [os.path.join(plugins_dir, f)
-                 for f in os.listdir(plugins_dir)
-                 if f.endswith(".py")]
+        plugin_classes = {}
         if self.plugin_files:
             logger.debug("loading additional plugins from files '%s'", self.plugin_files)
-            files += self.plugin_files
-        plugin_classes = {}
-        for f in files:
+        for f in self.plugin_files:
             module_name = os.path.basename(f).rsplit('.', 1)[0]
             # Do not reload plugins
             if module_name in sys.modules:
@@ -189,22 +391,8 @@ class PluginsRunner(object):
                 except (IOError, OSError, ImportError, SyntaxError) as ex:
                     logger.warning("can't load module '%s': %s", f, ex)
                     continue
-            for name in dir(f_module):
-                binding = getattr(f_module, name)
-                try:
-                    # if you try to compare binding and Plugin, python won't match them
-                    # if you call this script directly b/c:
-                    # ! <class 'plugins.plugin_rpmqa.PostBuildRPMqaPlugin'> <= <class
-                    # '__main__.Plugin'>
-                    # but
-                    # <class 'plugins.plugin_rpmqa.PostBuildRPMqaPlugin'> <= <class
-                    # 'atomic_reactor.plugin.Plugin'>
-                    is_sub = issubclass(binding, Plugin)
-                except TypeError:
-                    is_sub = False
-                if binding and is_sub and Plugin.__name__ != binding.__name__:
-                    plugin_classes[binding.key] = binding
-        return plugin_classes
+            plugin_classes.update(scan_plugin_classes(f_module))
+        return PluginClasses(PLUGIN_INDEX, plugin_classes)
 
     def get_available_plugins(self):
         """
@@ -260,6 +448,9 @@ class PluginsRunner(object):
     def save_plugin_duration(self, name: str, duration: float) -> None:
         self.workflow.data.plugins_durations[name] = duration
 
+    def save_plugin_profile(self, name: str, profile: Dict[str, Any]) -> None:
+        self.workflow.data.plugins_profiles[name] = profile
+
     def _translate_special_values(self, obj_to_translate):
         """
         you may want to write plugins for values which are not known before build:
@@ -331,33 +522,235 @@ class PluginsRunner(object):
             except Exception:
                 logger.exception("failed to save plugin duration")
 
-    def run(self):
-        """Run all requested plugins."""
-        failed_msgs: List[str] = []
-        available_plugins = self.available_plugins
-        for plugin in available_plugins:
-            plugin_key = plugin.plugin_class.key
-            try:
-                plugin_instance = self.create_instance_from_plugin(
-                    plugin.plugin_class, plugin.conf
-                )
-                with self._execution_timer(plugin):
-                    self.plugins_results[plugin_key] = plugin_instance.run()
-            except Exception as ex:
-                logger.debug(traceback.format_exc())
+    @contextmanager
+    def _resource_profiler(self, exec_info: PluginExecutionInfo) -> Generator:
+        profiling = self.workflow.conf.plugin_profiling
+        if not profiling['enabled']:
+            yield
+            return
+
+        plugin_key = exec_info.plugin_class.key
+        pstats_path = None
+        if profiling['cprofile']:
+            pstats_path = self.workflow.context_dir.get_plugin_pstats(plugin_key)
+        profile = None
+        try:
+            with profile_plugin(plugin_key, pstats_path) as profile:
+                yield
+        finally:
+            if profile is not None:
+                logger.debug("plugin '%s' resource usage: %s", exec_info.plugin_name, profile)
+                self.save_plugin_profile(plugin_key, profile.as_dict())
 
+    @staticmethod
+    def _declared_resources(plugin_class) -> Optional[Tuple[FrozenSet[str], FrozenSet[str]]]:
+        reads = getattr(plugin_class, "reads", None)
+        writes = getattr(plugin_class, "writes", None)
+        if reads is None or writes is None:
+            return None
+        own_result = plugin_result_resource(plugin_class.key)
+        return frozenset(reads), frozenset(writes) | {own_result}
+
+    def get_plugin_dependencies(self) -> List[Set[int]]:
+        """Find out which plugins have to finish before a plugin can start
+
+        A plugin depends on every plugin requested before it, which writes a
+        resource the plugin reads or writes, or which reads a resource the
+        plugin writes. Plugins without declared resources depend on all
+        plugins requested before them and vice versa.
+
+        :return: for every available plugin, the indexes of the available
+            plugins it depends on
+        :rtype: list[set[int]]
+        """
+        resources = [self._declared_resources(plugin.plugin_class)
+                     for plugin in self.available_plugins]
+        dependencies: List[Set[int]] = []
+        for index, later in enumerate(resources):
+            deps = set()
+            for earlier_index, earlier in enumerate(resources[:index]):
+                if (
+                    earlier is None or later is None or
+                    resources_overlap(earlier[1], later[0] | later[1]) or
+                    resources_overlap(earlier[0], later[1])
+                ):
+                    deps.add(earlier_index)
+            dependencies.append(deps)
+        return dependencies
+
+    def _checkpoint_fingerprint(
+        self, plugin: PluginExecutionInfo, depends_on: List[PluginExecutionInfo]
+    ) -> str:
+        """Fingerprint the inputs of a plugin: its arguments, the user params
+        and the results of the plugins it depends on"""
+        return compute_fingerprint({
+            "key": plugin.plugin_class.key,
+            "args": plugin.conf,
+            "user_params": self.workflow.user_params,
+            "depends_on": {
+                dep.plugin_class.key: self.plugins_results.get(dep.plugin_class.key)
+                for dep in depends_on
+            },
+        })
+
+    def _restore_checkpoint(self, plugin: PluginExecutionInfo, fingerprint: str) -> bool:
+        plugin_key = plugin.plugin_class.key
+        checkpoint_path = self.workflow.context_dir.get_plugin_checkpoint(plugin_key)
+        checkpoint = PluginCheckpoint.load(checkpoint_path)
+        if checkpoint is None:
+            return False
+        if not checkpoint.is_valid(fingerprint):
+            logger.info("checkpoint of plugin '%s' is outdated, running it again", plugin_key)
+            checkpoint_path.unlink()
+            return False
+        logger.info("plugin '%s' already finished in a previous run, using its checkpoint",
+                    plugin_key)
+        self.plugins_results[plugin_key] = checkpoint.result
+        return True
+
+    def _save_checkpoint(self, plugin_instance: Plugin, fingerprint: str) -> None:
+        plugin_key = plugin_instance.key
+        result = self.plugins_results[plugin_key]
+        try:
+            checkpoint = PluginCheckpoint.create(
+                fingerprint, result, plugin_instance.get_checkpoint_files(result)
+            )
+            checkpoint.save(self.workflow.context_dir.get_plugin_checkpoint(plugin_key))
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning("failed to save checkpoint of plugin '%s': %s", plugin_key, e)
+
+    def _record_in_journal(
+        self, plugin_key: str, writes: Optional[FrozenSet[str]] = None
+    ) -> None:
+        if self.journal is None:
+            return
+        try:
+            self.journal.record_plugin(plugin_key, writes)
+        except (OSError, RuntimeError, TypeError, ValueError) as e:
+            # the data is still saved when the task finishes
+            logger.warning("failed to record plugin '%s' in workflow data journal: %s",
+                           plugin_key, e)
+
+    def _call_run(self, plugin_instance: Plugin) -> Any:
+        if inspect.iscoroutinefunction(plugin_instance.run):
+            return self.event_loop.run(plugin_instance.run())
+        return plugin_instance.run()
+
+    def _run_plugin(
+        self, plugin: PluginExecutionInfo, depends_on: Optional[List[PluginExecutionInfo]] = None
+    ) -> Optional[str]:
+        """Run a single plugin and store its result
+
+        :param depends_on: plugins which have to finish before this one, their
+            results are part of the checkpoint fingerprint
+        :return: error message of a failed plugin which is not allowed to fail
+            but did not stop the execution because of keep_going, None otherwise
+        :raises PluginFailedException: if the failure should stop the execution
+        """
+        plugin_key = plugin.plugin_class.key
+        fingerprint = None
+        if self.checkpoints and getattr(plugin.plugin_class, "checkpoint", False):
+            fingerprint = self._checkpoint_fingerprint(plugin, depends_on or [])
+            if self._restore_checkpoint(plugin, fingerprint):
+                # only the result of the plugin is restored
+                self._record_in_journal(plugin_key, frozenset())
+                return None
+        try:
+            plugin_instance = self.create_instance_from_plugin(
+                plugin.plugin_class, plugin.conf
+            )
+            with self._execution_timer(plugin), self._resource_profiler(plugin):
+                self.plugins_results[plugin_key] = self._call_run(plugin_instance)
+            if fingerprint is not None:
+                self._save_checkpoint(plugin_instance, fingerprint)
+        except Exception as ex:
+            logger.debug(traceback.format_exc())
+
+            if not plugin.is_allowed_to_fail:
+                self.on_plugin_failed(plugin.plugin_class.key, ex)
+
+            msg = f"plugin '{plugin_key}' raised an exception: {exception_message(ex)}"
+            if plugin.is_allowed_to_fail or self.keep_going:
+                logger.warning(msg)
+                logger.info("error is not fatal, continuing...")
                 if not plugin.is_allowed_to_fail:
-                    self.on_plugin_failed(plugin.plugin_class.key, ex)
+                    return msg
+            else:
+                logger.error(msg)
+                raise PluginFailedException(msg) from ex
+        finally:
+            self._record_in_journal(plugin_key, getattr(plugin.plugin_class, "writes", None))
+        return None
+
+    def _run_concurrently(self) -> List[str]:
+        """Run the available plugins in a thread pool, respecting their dependencies
+
+        Plugins are started in the requested order as soon as all plugins they
+        depend on have finished. When a plugin fails fatally, no plugin
+        requested after it is started anymore, but those requested before it
+        still run, so the outcome is the same as when running plugins one by one.
 
-                msg = f"plugin '{plugin_key}' raised an exception: {exception_message(ex)}"
-                if plugin.is_allowed_to_fail or self.keep_going:
-                    logger.warning(msg)
-                    logger.info("error is not fatal, continuing...")
-                    if not plugin.is_allowed_to_fail:
+        :return: error messages of non-fatal failures, in the requested order
+        """
+        plugins = self.available_plugins
+        dependencies = self.get_plugin_dependencies()
+        pending = list(range(len(plugins)))
+        finished: Set[int] = set()
+        messages: Dict[int, str] = {}
+        fatal_index: Optional[int] = None
+        fatal_error: Optional[PluginFailedException] = None
+
+        with ThreadPoolExecutor(max_workers=self.max_workers,
+                                thread_name_prefix="plugin") as executor:
+            running: Dict[Future, int] = {}
+            while True:
+                for index in list(pending):
+                    if len(running) >= self.max_workers:
+                        break
+                    if fatal_index is not None and index > fatal_index:
+                        break
+                    if dependencies[index] <= finished:
+                        pending.remove(index)
+                        # copy the context to keep e.g. the current tracing span
+                        context = contextvars.copy_context()
+                        depends_on = [plugins[dep] for dep in sorted(dependencies[index])]
+                        future = executor.submit(
+                            context.run, self._run_plugin, plugins[index], depends_on
+                        )
+                        running[future] = index
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = running.pop(future)
+                    finished.add(index)
+                    try:
+                        msg = future.result()
+                    except PluginFailedException as ex:
+                        if fatal_index is None or index < fatal_index:
+                            fatal_index, fatal_error = index, ex
+                        continue
+                    if msg:
+                        messages[index] = msg
+
+        if fatal_error is not None:
+            raise fatal_error
+        return [messages[index] for index in sorted(messages)]
+
+    def run(self):
+        """Run all requested plugins."""
+        failed_msgs: List[str] = []
+        try:
+            if self.max_workers > 1:
+                failed_msgs = self._run_concurrently()
+            else:
+                for index, plugin in enumerate(self.available_plugins):
+                    # when running one by one, every earlier plugin is an input
+                    msg = self._run_plugin(plugin, self.available_plugins[:index])
+                    if msg:
                         failed_msgs.append(msg)
-                else:
-                    logger.error(msg)
-                    raise PluginFailedException(msg) from ex
+        finally:
+            self.event_loop.close()
 
         if len(failed_msgs) == 1:
             raise PluginFailedException(failed_msgs[0])
@@ -0,0 +1,62 @@
+"""
+Copyright (c) 2023 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+
+
+Index of plugins shipped in atomic_reactor.plugins, mapping plugin keys to
+(module name, class name) tuples.
+
+Generated by atomic_reactor.plugin.write_plugin_index(), run "make plugin-index"
+after adding, removing or renaming a plugin.
+"""
+
+PLUGIN_INDEX = {
+    'add_buildargs_in_dockerfile': ('add_buildargs_in_df', 'AddBuildargsPlugin'),
+    'add_dockerfile': ('add_dockerfile', 'AddDockerfilePlugin'),
+    'add_filesystem': ('add_filesystem', 'AddFilesystemPlugin'),
+    'add_flatpak_labels': ('add_flatpak_labels', 'AddFlatpakLabelsPlugin'),
+    'add_help': ('add_help', 'AddHelpPlugin'),
+    'add_image_content_manifest': ('add_image_content_manifest', 'AddImageContentManifestPlugin'),
+    'add_labels_in_dockerfile': ('add_labels_in_df', 'AddLabelsPlugin'),
+    'all_rpm_packages': ('rpmqa', 'RPMqaPlugin'),
+    'bump_release': ('bump_release', 'BumpReleasePlugin'),
+    'cancel_build_reservation': ('cancel_build_reservation', 'CancelBuildReservation'),
+    'change_from_in_dockerfile': ('change_from_in_df', 'ChangeFromPlugin'),
+    'check_and_set_platforms': ('check_and_set_platforms', 'CheckAndSetPlatformsPlugin'),
+    'check_base_image': ('check_base_image', 'CheckBaseImagePlugin'),
+    'check_user_settings': ('check_user_settings', 'CheckUserSettingsPlugin'),
+    'compare_components': ('compare_components', 'CompareComponentsPlugin'),
+    'distgit_fetch_artefacts': ('pyrpkg_fetch_artefacts', 'DistgitFetchArtefactsPlugin'),
+    'distribution_scope': ('distribution_scope', 'DistributionScopePlugin'),
+    'export_operator_manifests': ('export_operator_manifests', 'ExportOperatorManifestsPlugin'),
+    'fetch_docker_archive': ('fetch_docker_archive', 'FetchDockerArchivePlugin'),
+    'fetch_maven_artifacts': ('fetch_maven_artifacts', 'FetchMavenArtifactsPlugin'),
+    'fetch_sources': ('fetch_sources', 'FetchSourcesPlugin'),
+    'flatpak_create_dockerfile': ('flatpak_create_dockerfile', 'FlatpakCreateDockerfilePlugin'),
+    'flatpak_create_oci': ('flatpak_create_oci', 'FlatpakCreateOciPlugin'),
+    'flatpak_update_dockerfile': ('flatpak_update_dockerfile', 'FlatpakUpdateDockerfilePlugin'),
+    'gather_builds_metadata': ('gather_builds_metadata', 'GatherBuildsMetadataPlugin'),
+    'generate_sbom': ('generate_sbom', 'GenerateSbomPlugin'),
+    'group_manifests': ('group_manifests', 'GroupManifestsPlugin'),
+    'hide_files': ('hide_files', 'HideFilesPlugin'),
+    'inject_parent_image': ('inject_parent_image', 'InjectParentImage'),
+    'inject_yum_repos': ('inject_yum_repos', 'InjectYumReposPlugin'),
+    'koji_import': ('koji_import', 'KojiImportPlugin'),
+    'koji_import_source_container': ('koji_import', 'KojiImportSourceContainerPlugin'),
+    'koji_parent': ('koji_parent', 'KojiParentPlugin'),
+    'koji_tag_build': ('koji_tag_build', 'KojiTagBuildPlugin'),
+    'maven_url_sources_metadata': ('maven_url_sources_metadata', 'MavenURLSourcesMetadataPlugin'),
+    'pin_operator_digest': ('pin_operator_digest', 'PinOperatorDigestsPlugin'),
+    'push_floating_tags': ('push_floating_tags', 'PushFloatingTagsPlugin'),
+    'resolve_composes': ('resolve_composes', 'ResolveComposesPlugin'),
+    'resolve_remote_source': ('resolve_remote_source', 'ResolveRemoteSourcePlugin'),
+    'sendmail': ('sendmail', 'SendMailPlugin'),
+    'source_container': ('build_source_container', 'SourceContainerPlugin'),
+    'store_metadata': ('store_metadata', 'StoreMetadataPlugin'),
+    'tag_and_push': ('tag_and_push', 'TagAndPushPlugin'),
+    'tag_from_config': ('tag_from_config', 'TagFromConfigPlugin'),
+    'verify_media': ('verify_media_types', 'VerifyMediaTypesPlugin'),
+}
@@ -11,13 +11,15 @@ created for a flatpak, based on the flatpak: labels key in container.yaml.
 """
 
 from atomic_reactor.dirs import BuildDir
-from atomic_reactor.plugin import Plugin
+from atomic_reactor.plugin import Plugin, RESOURCE_DOCKERFILE
 from atomic_reactor.util import label_to_string, is_flatpak_build
 
 
 class AddFlatpakLabelsPlugin(Plugin):
     key = "add_flatpak_labels"
     is_allowed_to_fail = False
+    reads = frozenset({RESOURCE_DOCKERFILE})
+    writes = frozenset({RESOURCE_DOCKERFILE})
 
     def __init__(self, workflow):
         """
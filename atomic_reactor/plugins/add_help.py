@@ -24,7 +24,12 @@ from typing import List
 
 
 from atomic_reactor.dirs import BuildDir
-from atomic_reactor.plugin import Plugin
+from atomic_reactor.plugin import (
+    Plugin,
+    RESOURCE_DOCKERFILE,
+    build_dir_resource,
+    workflow_data_resource,
+)
 from atomic_reactor.metadata import annotation_map
 from osbs.utils import Labels
 
@@ -37,6 +42,12 @@ DEFAULT_HELP_FILENAME = "help.md"
 class AddHelpPlugin(Plugin):
     key = "add_help"
     man_filename = "help.1"
+    reads = frozenset({RESOURCE_DOCKERFILE, workflow_data_resource("dockerfile_images")})
+    writes = frozenset({
+        RESOURCE_DOCKERFILE,
+        build_dir_resource(DEFAULT_HELP_FILENAME),
+        build_dir_resource(man_filename),
+    })
 
     NO_HELP_FILE_FOUND = 1
     HELP_GENERATED = 2
@@ -61,13 +61,15 @@ from osbs.utils import Labels
 
 from atomic_reactor.constants import INSPECT_CONFIG
 from atomic_reactor.dirs import BuildDir
-from atomic_reactor.plugin import Plugin
+from atomic_reactor.plugin import Plugin, RESOURCE_DOCKERFILE, workflow_data_resource
 from atomic_reactor.util import get_pipeline_run_start_time, label_to_string, LabelFormatter
 
 
 class AddLabelsPlugin(Plugin):
     key = "add_labels_in_dockerfile"
     is_allowed_to_fail = False
+    reads = frozenset({RESOURCE_DOCKERFILE, workflow_data_resource("dockerfile_images")})
+    writes = frozenset({RESOURCE_DOCKERFILE})
 
     @staticmethod
     def args_from_user_params(user_params: dict) -> dict:
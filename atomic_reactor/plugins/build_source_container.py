@@ -29,6 +29,7 @@ class SourceContainerPlugin(Plugin):
 
     is_allowed_to_fail = False
     key = PLUGIN_SOURCE_CONTAINER_KEY
+    checkpoint = True
 
     def export_image(self, image_output_dir: Path) -> Dict[str, Union[str, int]]:
         output_path = self.workflow.build_dir.any_platform.exported_squashed_image
@@ -46,6 +47,9 @@ class SourceContainerPlugin(Plugin):
             raise
         return get_exported_image_metadata(str(output_path), IMAGE_TYPE_DOCKER_ARCHIVE)
 
+    def get_checkpoint_files(self, result: Dict[str, Any]) -> List[Path]:
+        return [Path(result['image_metadata']['path'])]
+
     def split_remote_sources_to_subdirs(self, remote_source_data_dir) -> List[str]:
         """Splits remote source archives to subdirs"""
         sources_subdirs = []
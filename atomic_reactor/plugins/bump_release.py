@@ -10,7 +10,12 @@ import time
 from typing import Optional, Tuple
 
 from atomic_reactor.dirs import BuildDir
-from atomic_reactor.plugin import Plugin
+from atomic_reactor.plugin import (
+    Plugin,
+    RESOURCE_DOCKERFILE,
+    plugin_result_resource,
+    workflow_data_resource,
+)
 from osbs.utils import Labels
 from atomic_reactor.plugins.fetch_sources import PLUGIN_FETCH_SOURCES_KEY
 from atomic_reactor.constants import (PLUGIN_BUMP_RELEASE_KEY, PROG, KOJI_RESERVE_MAX_RETRIES,
@@ -29,6 +34,18 @@ class BumpReleasePlugin(Plugin):
 
     key = PLUGIN_BUMP_RELEASE_KEY
     is_allowed_to_fail = False  # We really want to stop the process
+    reads = frozenset({
+        RESOURCE_DOCKERFILE,
+        plugin_result_resource(PLUGIN_FETCH_SOURCES_KEY),
+        workflow_data_resource("dockerfile_images"),
+    })
+    writes = frozenset({
+        RESOURCE_DOCKERFILE,
+        workflow_data_resource("reserved_build_id"),
+        workflow_data_resource("reserved_token"),
+        workflow_data_resource("koji_source_nvr"),
+        workflow_data_resource("koji_source_source_url"),
+    })
 
     @staticmethod
     def args_from_user_params(user_params: dict) -> dict:
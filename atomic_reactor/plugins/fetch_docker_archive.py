@@ -5,7 +5,10 @@ All rights reserved.
 This software may be modified and distributed under the terms
 of the BSD license. See the LICENSE file for details.
 """
-from atomic_reactor.constants import IMAGE_TYPE_DOCKER_ARCHIVE
+from pathlib import Path
+from typing import Any, Dict, List
+
+from atomic_reactor.constants import IMAGE_TYPE_DOCKER_ARCHIVE, MAX_PARALLEL_PLATFORM_ACTIONS
 from atomic_reactor.dirs import BuildDir
 from atomic_reactor.plugin import Plugin
 from atomic_reactor.util import get_exported_image_metadata
@@ -14,6 +17,7 @@ from atomic_reactor.util import get_exported_image_metadata
 class FetchDockerArchivePlugin(Plugin):
     key = 'fetch_docker_archive'
     is_allowed_to_fail = False
+    checkpoint = True
 
     def __init__(self, workflow):
         """
@@ -36,4 +40,9 @@ class FetchDockerArchivePlugin(Plugin):
         return metadata
 
     def run(self):
-        return self.workflow.build_dir.for_each_platform(self.download_image)
+        return self.workflow.build_dir.for_each_platform(
+            self.download_image, max_workers=MAX_PARALLEL_PLATFORM_ACTIONS
+        )
+
+    def get_checkpoint_files(self, result: Dict[str, Dict[str, Any]]) -> List[Path]:
+        return [Path(metadata['path']) for metadata in result.values()]
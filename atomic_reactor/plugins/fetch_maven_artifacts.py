@@ -20,8 +20,8 @@ from atomic_reactor.constants import (PLUGIN_FETCH_MAVEN_KEY,
                                       REPO_FETCH_ARTIFACTS_KOJI)
 from atomic_reactor.config import get_koji_session
 from atomic_reactor.dirs import BuildDir
-from atomic_reactor.download import download_url
-from atomic_reactor.plugin import Plugin
+from atomic_reactor.download import DownloadJob, DownloadManager
+from atomic_reactor.plugin import Plugin, build_dir_resource
 from atomic_reactor.utils.koji import NvrRequest
 from atomic_reactor.utils.pnc import PNCUtil
 
@@ -44,6 +44,9 @@ class FetchMavenArtifactsPlugin(Plugin):
 
     DOWNLOAD_DIR = 'artifacts'
 
+    reads = frozenset()
+    writes = frozenset({build_dir_resource(DOWNLOAD_DIR)})
+
     def __init__(self, workflow):
         """
         :param workflow: DockerBuildWorkflow instance
@@ -210,22 +213,21 @@ class FetchMavenArtifactsPlugin(Plugin):
         insecure = koji_config.get('insecure_download', False)
 
         self.log.debug('%d files to download', len(downloads))
-        session = util.get_retrying_requests_session()
 
-        for index, download in enumerate(downloads):
+        jobs = []
+        for download in downloads:
             dest_path = artifacts_path / download.dest
             dest_dir = dest_path.parent
-            dest_filename = dest_path.name
 
             if not dest_dir.exists():
                 dest_dir.mkdir(parents=True)
 
-            self.log.debug('%d/%d downloading %s', index + 1, len(downloads),
-                           download.url)
+            jobs.append(DownloadJob(download.url, dest_dir, dest_filename=dest_path.name,
+                                    expected_checksums=download.checksums))
 
-            download_url(url=download.url, dest_dir=dest_dir, insecure=insecure, session=session,
-                         dest_filename=dest_filename, expected_checksums=download.checksums)
-            yield dest_path
+        DownloadManager(insecure=insecure).download(jobs)
+        for download in downloads:
+            yield artifacts_path / download.dest
 
     def generate_sbom_components_for_pnc(self, pnc_artifact_ids: List[int]):
         purl_specs = self.pnc_util.get_artifact_purl_specs(pnc_artifact_ids)
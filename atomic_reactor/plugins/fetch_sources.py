@@ -15,7 +15,7 @@ import tarfile
 import yaml
 from typing import List, Dict, Any
 
-from atomic_reactor.constants import (PLUGIN_FETCH_SOURCES_KEY, PNC_SYSTEM_USER,
+from atomic_reactor.constants import (DOWNLOAD_SEGMENTS, PLUGIN_FETCH_SOURCES_KEY, PNC_SYSTEM_USER,
                                       REMOTE_SOURCE_JSON_FILENAME, REMOTE_SOURCE_TARBALL_FILENAME,
                                       KOJI_BTYPE_REMOTE_SOURCES)
 from atomic_reactor.config import get_koji_session
@@ -24,7 +24,7 @@ from atomic_reactor.source import GitSource
 from atomic_reactor.util import (get_retrying_requests_session,
                                  map_to_user_params,
                                  safe_extractall)
-from atomic_reactor.download import download_url
+from atomic_reactor.download import DownloadJob, DownloadManager
 from atomic_reactor.utils.pnc import PNCUtil
 
 try:
@@ -37,6 +37,7 @@ class FetchSourcesPlugin(Plugin):
     """Download sources that may be used in further steps to compose Source Containers"""
     key = PLUGIN_FETCH_SOURCES_KEY
     is_allowed_to_fail = False
+    checkpoint = True
     SRPMS_DOWNLOAD_DIR = 'image_sources'
     REMOTE_SOURCES_DOWNLOAD_DIR = 'remote_sources'
     MAVEN_SOURCES_DOWNLOAD_DIR = 'maven_sources'
@@ -131,6 +132,14 @@ class FetchSourcesPlugin(Plugin):
                 'signing_intent': self.signing_intent,
         }
 
+    def get_checkpoint_files(self, result: Dict[str, Any]) -> List[Path]:
+        files: List[Path] = []
+        for dir_key in ('image_sources_dir', 'remote_sources_dir', 'maven_sources_dir'):
+            if result[dir_key]:
+                files.extend(path for path in sorted(Path(result[dir_key]).rglob('*'))
+                             if path.is_file())
+        return files
+
     def download_sources(self, sources, insecure=False, download_dir=SRPMS_DOWNLOAD_DIR):
         """Download sources content
 
@@ -145,14 +154,15 @@ class FetchSourcesPlugin(Plugin):
         dest_dir: Path = self.workflow.build_dir.source_container_sources_dir / download_dir
         dest_dir.mkdir(parents=True, exist_ok=True)
 
-        req_session = get_retrying_requests_session()
+        jobs = []
         for source in sources:
             subdir: Path = dest_dir / source.get('subdir', '')
             subdir.mkdir(parents=True, exist_ok=True)
             checksums = source.get('checksums', {})
-            download_url(source['url'], subdir, insecure=insecure,
-                         session=req_session, dest_filename=source.get('dest'),
-                         expected_checksums=checksums)
+            # source RPMs can be large, e.g. of kernel or firefox
+            jobs.append(DownloadJob(source['url'], subdir, dest_filename=source.get('dest'),
+                                    expected_checksums=checksums, segments=DOWNLOAD_SEGMENTS))
+        DownloadManager(insecure=insecure).download(jobs)
 
         return str(dest_dir)
 
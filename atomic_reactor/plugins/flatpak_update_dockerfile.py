@@ -16,7 +16,12 @@ from flatpak_module_tools.flatpak_builder import FlatpakBuilder
 
 from atomic_reactor.constants import PLUGIN_RESOLVE_COMPOSES_KEY
 from atomic_reactor.dirs import BuildDir
-from atomic_reactor.plugin import Plugin
+from atomic_reactor.plugin import (
+    Plugin,
+    RESOURCE_DOCKERFILE,
+    build_dir_resource,
+    plugin_result_resource,
+)
 from atomic_reactor.plugins.flatpak_create_dockerfile import (
     FLATPAK_CLEANUPSCRIPT_FILENAME,
     FLATPAK_INCLUDEPKGS_FILENAME,
@@ -28,6 +33,12 @@ from atomic_reactor.utils.flatpak_util import FlatpakUtil
 class FlatpakUpdateDockerfilePlugin(Plugin):
     key = "flatpak_update_dockerfile"
     is_allowed_to_fail = False
+    reads = frozenset({RESOURCE_DOCKERFILE, plugin_result_resource(PLUGIN_RESOLVE_COMPOSES_KEY)})
+    writes = frozenset({
+        RESOURCE_DOCKERFILE,
+        build_dir_resource(FLATPAK_INCLUDEPKGS_FILENAME),
+        build_dir_resource(FLATPAK_CLEANUPSCRIPT_FILENAME),
+    })
 
     def __init__(self, workflow):
         """
@@ -138,6 +138,10 @@ class GatherBuildsMetadataPlugin(Plugin):
         if not enabled_platforms:
             raise ValueError("No enabled platforms.")
 
+        # get_output inspects the base image for each platform, inspect it for all
+        # of them at once, the results are cached
+        self.workflow.imageutil.base_image_inspect_for_platforms(enabled_platforms)
+
         for platform in enabled_platforms:
             koji_metadata, output_files = self._get_build_metadata(platform)
 
@@ -6,10 +6,10 @@ This software may be modified and distributed under the terms
 of the BSD license. See the LICENSE file for details.
 """
 from typing import Any, Dict, Optional
-from atomic_reactor.plugin import Plugin
+from atomic_reactor.plugin import Plugin, plugin_result_resource, workflow_data_resource
 from atomic_reactor.constants import (
     INSPECT_CONFIG, PLUGIN_KOJI_PARENT_KEY, BASE_IMAGE_KOJI_BUILD, PARENT_IMAGES_KOJI_BUILDS,
-    KOJI_BTYPE_IMAGE
+    KOJI_BTYPE_IMAGE, PLUGIN_CHECK_AND_SET_PLATFORMS_KEY
 )
 from atomic_reactor.config import get_koji_session
 from atomic_reactor.util import (
@@ -49,6 +49,12 @@ class KojiParentPlugin(Plugin):
 
     key = PLUGIN_KOJI_PARENT_KEY
     is_allowed_to_fail = False
+    reads = frozenset({
+        plugin_result_resource(PLUGIN_CHECK_AND_SET_PLATFORMS_KEY),
+        workflow_data_resource("dockerfile_images"),
+        workflow_data_resource("parent_images_digests"),
+    })
+    writes = frozenset()
 
     def __init__(self, workflow, poll_interval=DEFAULT_POLL_INTERVAL,
                  poll_timeout=DEFAULT_POLL_TIMEOUT):
@@ -12,7 +12,7 @@ from typing import Any, Dict, List, Sequence
 from atomic_reactor import util
 from atomic_reactor.constants import (KOJI_BTYPE_REMOTE_SOURCE_FILE, PLUGIN_FETCH_MAVEN_KEY,
                                       PLUGIN_MAVEN_URL_SOURCES_METADATA_KEY)
-from atomic_reactor.download import download_url
+from atomic_reactor.download import DownloadJob, DownloadManager
 from atomic_reactor.plugin import Plugin
 from atomic_reactor.plugins.fetch_maven_artifacts import DownloadRequest
 
@@ -46,7 +46,9 @@ class MavenURLSourcesMetadataPlugin(Plugin):
         koji_config = self.workflow.conf.koji
         insecure = koji_config.get('insecure_download', False)
 
-        for index, download in enumerate(download_queue):
+        jobs = []
+        dest_filenames = []
+        for download in download_queue:
             dest_filename = download.dest
             if not re.fullmatch(r'^[\w\-.]+$', dest_filename):
                 dest_filename = session.head(download.url).headers.get(
@@ -58,13 +60,13 @@ class MavenURLSourcesMetadataPlugin(Plugin):
             if not os.path.exists(dest_dir):
                 os.makedirs(dest_dir)
 
-            self.log.debug('%d/%d downloading %s', index + 1, len(download_queue),
-                           download.url)
+            jobs.append(DownloadJob(download.url, dest_dir, dest_filename=dest_filename,
+                                    expected_checksums=download.checksums))
+            dest_filenames.append(dest_filename)
 
-            download_url(url=download.url, dest_dir=dest_dir, insecure=insecure,
-                         session=session, dest_filename=dest_filename,
-                         expected_checksums=download.checksums)
+        dest_paths = DownloadManager(insecure=insecure, session=session).download(jobs)
 
+        for download, dest_filename, dest_path in zip(download_queue, dest_filenames, dest_paths):
             checksum_type = list(download.checksums.keys())[0]
 
             remote_source_files.append({
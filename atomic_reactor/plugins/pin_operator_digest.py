@@ -12,7 +12,12 @@ from pathlib import Path
 
 from osbs.utils import Labels, ImageName
 
-from atomic_reactor.plugin import Plugin
+from atomic_reactor.plugin import (
+    Plugin,
+    RESOURCE_BUILD_DIR,
+    RESOURCE_DOCKERFILE,
+    workflow_data_resource,
+)
 from atomic_reactor.constants import (
     PLUGIN_PIN_OPERATOR_DIGESTS_KEY,
     INSPECT_CONFIG,
@@ -23,11 +28,8 @@ from atomic_reactor.util import (RegistrySession,
                                  has_operator_bundle_manifest,
                                  read_yaml_from_url,
                                  terminal_key_paths,
-                                 map_to_user_params)
-from osbs.utils.yaml import (
-    load_schema,
-    validate_with_schema,
-)
+                                 map_to_user_params,
+                                 validate_with_schema)
 from atomic_reactor.utils.operator import OperatorManifest
 from atomic_reactor.utils.retries import get_retrying_requests_session
 
@@ -52,6 +54,10 @@ class PinOperatorDigestsPlugin(Plugin):
 
     key = PLUGIN_PIN_OPERATOR_DIGESTS_KEY
     is_allowed_to_fail = False
+    reads = frozenset({RESOURCE_DOCKERFILE, workflow_data_resource("dockerfile_images")})
+    # the operator manifests directory is configured in container.yaml, which
+    # is only known once the plugin is created, so the whole build dir is claimed
+    writes = frozenset({RESOURCE_BUILD_DIR})
 
     args_from_user_params = map_to_user_params(
         "operator_csv_modifications_url",
@@ -81,11 +87,7 @@ class PinOperatorDigestsPlugin(Plugin):
 
     def _validate_operator_csv_modifications_schema(self, modifications):
         """Validate if provided operator CSV modification are valid according schema"""
-        schema = load_schema(
-            'atomic_reactor',
-            'schemas/operator_csv_modifications.json'
-        )
-        validate_with_schema(modifications, schema)
+        validate_with_schema(modifications, 'schemas/operator_csv_modifications.json')
 
     def _validate_operator_csv_modifications_duplicated_images(self, modifications):
         """Validate if provided operator CSV modifications doesn't provide duplicated entries"""
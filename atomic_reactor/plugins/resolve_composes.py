@@ -16,8 +16,9 @@ from atomic_reactor import util
 from atomic_reactor.config import get_koji_session, get_odcs_session
 from atomic_reactor.constants import (PLUGIN_KOJI_PARENT_KEY,
                                       PLUGIN_RESOLVE_COMPOSES_KEY,
+                                      PLUGIN_CHECK_AND_SET_PLATFORMS_KEY,
                                       BASE_IMAGE_KOJI_BUILD)
-from atomic_reactor.plugin import Plugin
+from atomic_reactor.plugin import Plugin, plugin_result_resource, workflow_data_resource
 from atomic_reactor.util import get_platforms, is_isolated_build, is_scratch_build
 from atomic_reactor.utils.odcs import WaitComposeToFinishTimeout
 
@@ -48,6 +49,12 @@ class ResolveComposesPlugin(Plugin):
 
     key = PLUGIN_RESOLVE_COMPOSES_KEY
     is_allowed_to_fail = False
+    reads = frozenset({
+        plugin_result_resource(PLUGIN_CHECK_AND_SET_PLATFORMS_KEY),
+        plugin_result_resource(PLUGIN_KOJI_PARENT_KEY),
+        workflow_data_resource("dockerfile_images"),
+    })
+    writes = frozenset({workflow_data_resource("all_yum_repourls")})
 
     args_from_user_params = util.map_to_user_params(
         "koji_target",
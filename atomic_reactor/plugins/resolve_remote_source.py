@@ -27,7 +27,7 @@ from atomic_reactor.constants import (
     REMOTE_SOURCE_JSON_ENV_FILENAME,
 )
 from atomic_reactor.dirs import BuildDir
-from atomic_reactor.plugin import Plugin
+from atomic_reactor.plugin import Plugin, build_dir_resource, workflow_data_resource
 from atomic_reactor.util import (is_scratch_build,
                                  map_to_user_params,
                                  safe_extractall
@@ -112,6 +112,14 @@ class ResolveRemoteSourcePlugin(Plugin):
     key = PLUGIN_RESOLVE_REMOTE_SOURCE
     is_allowed_to_fail = False
     REMOTE_SOURCE = "unpacked_remote_sources"
+    reads = frozenset()
+    writes = frozenset({
+        # the downloaded tarballs, see RemoteSource.tarball_filename
+        build_dir_resource(REMOTE_SOURCE_TARBALL_FILENAME),
+        build_dir_resource(RemoteSource.tarball_filename("*")),
+        build_dir_resource(REMOTE_SOURCE),
+        workflow_data_resource("buildargs"),
+    })
 
     args_from_user_params = map_to_user_params("dependency_replacements")
 
@@ -10,7 +10,7 @@ import subprocess
 import tempfile
 from typing import List
 
-from atomic_reactor.constants import PLUGIN_RPMQA
+from atomic_reactor.constants import MAX_PARALLEL_PLATFORM_ACTIONS, PLUGIN_RPMQA
 from atomic_reactor.dirs import BuildDir
 from atomic_reactor.plugin import Plugin
 from atomic_reactor.types import RpmComponent
@@ -46,7 +46,7 @@ class RPMqaPlugin(Plugin):
             self.log.info('Another plugin has already filled in the image component list, skip')
             return None
         self.workflow.data.image_components = self.workflow.build_dir.for_each_platform(
-            self.gather_output)
+            self.gather_output, max_workers=MAX_PARALLEL_PLATFORM_ACTIONS)
 
         return self.sbom_components
 
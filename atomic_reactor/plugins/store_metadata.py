@@ -67,11 +67,15 @@ class StoreMetadataPlugin(Plugin):
 
     def get_plugin_metadata(self):
         wf_data = self.workflow.data
-        return {
+        metadata = {
             "errors": wf_data.plugins_errors,
             "timestamps": wf_data.plugins_timestamps,
             "durations": wf_data.plugins_durations,
         }
+        # only recorded when plugin_profiling is enabled in reactor config
+        if wf_data.plugins_profiles:
+            metadata["profiles"] = wf_data.plugins_profiles
+        return metadata
 
     def get_filesystem_metadata(self):
         data = {}
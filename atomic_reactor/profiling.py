@@ -0,0 +1,199 @@
+"""
+Copyright (c) 2023 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+
+
+Resource usage profiling of plugins
+"""
+import cProfile
+import logging
+import resource
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field, fields
+from pathlib import Path
+from typing import Any, Dict, Generator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Linux only, CPU time of the calling thread. Plugins may run concurrently in
+# separate threads, so process-wide CPU time would mix them up.
+RUSAGE_CPU = getattr(resource, "RUSAGE_THREAD", resource.RUSAGE_SELF)
+# I/O counters of the calling thread, falling back to the whole process
+PROC_IO_FILES = ("/proc/thread-self/io", "/proc/self/io")
+
+_current_profile: ContextVar[Optional["PluginProfile"]] = ContextVar(
+    "current_plugin_profile", default=None
+)
+
+# profiles of the plugins running at the moment, to find out which overlapped
+_running_profiles: List["PluginProfile"] = []
+_running_profiles_lock = threading.Lock()
+
+
+@dataclass
+class _UsageSnapshot:
+    cpu_user: float
+    cpu_system: float
+    children_cpu: float
+    max_rss_kb: int
+    read_bytes: int
+    write_bytes: int
+    # whether the I/O counters are those of the calling thread only
+    io_per_thread: bool
+
+    @classmethod
+    def take(cls) -> "_UsageSnapshot":
+        cpu = resource.getrusage(RUSAGE_CPU)
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        io_counters, io_per_thread = _read_io_counters()
+        return cls(
+            cpu_user=cpu.ru_utime,
+            cpu_system=cpu.ru_stime,
+            children_cpu=children.ru_utime + children.ru_stime,
+            # ru_maxrss is always process-wide, in kilobytes on Linux
+            max_rss_kb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            read_bytes=io_counters.get("read_bytes", 0),
+            write_bytes=io_counters.get("write_bytes", 0),
+            io_per_thread=io_per_thread,
+        )
+
+
+def _read_io_counters() -> Tuple[Dict[str, int], bool]:
+    """Get the I/O counters and whether they are those of the calling thread only"""
+    for path in PROC_IO_FILES:
+        try:
+            with open(path) as f:
+                lines = f.read().splitlines()
+        except OSError:
+            continue
+        counters = {}
+        for line in lines:
+            name, _, value = line.partition(":")
+            counters[name.strip()] = int(value)
+        return counters, path == PROC_IO_FILES[0]
+    return {}, False
+
+
+@dataclass
+class PluginProfile:
+    """Resource usage of a single plugin run
+
+    Some counters are only available for the whole process. They are left
+    out (None) if other plugins ran at the same time, as they would include
+    the usage of those plugins.
+    """
+
+    # seconds of CPU time spent by the plugin
+    cpu_user: Optional[float] = 0.0
+    cpu_system: Optional[float] = 0.0
+    # seconds of CPU time spent by finished subprocesses
+    subprocess_cpu: Optional[float] = 0.0
+    # growth of the peak resident set size of the process
+    max_rss_delta_kb: Optional[int] = 0
+    # bytes read from and written to the storage layer
+    read_bytes: Optional[int] = 0
+    write_bytes: Optional[int] = 0
+    # HTTP requests sent through atomic-reactor sessions and the sizes of the
+    # responses, based on the Content-Length header
+    http_requests: int = 0
+    http_response_bytes: int = 0
+    # whether other plugins were profiled while this one was running
+    overlapped: bool = False
+
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def record_http_response(self, response) -> None:
+        try:
+            size = int(response.headers.get("Content-Length", 0))
+        except ValueError:
+            size = 0
+        with self._lock:
+            self.http_requests += 1
+            self.http_response_bytes += size
+
+    def update_from_snapshots(self, start: _UsageSnapshot, end: _UsageSnapshot) -> None:
+        process_wide = not self.overlapped
+        if RUSAGE_CPU != resource.RUSAGE_SELF or process_wide:
+            self.cpu_user = round(end.cpu_user - start.cpu_user, 3)
+            self.cpu_system = round(end.cpu_system - start.cpu_system, 3)
+        else:
+            self.cpu_user = self.cpu_system = None
+        if process_wide:
+            self.subprocess_cpu = round(end.children_cpu - start.children_cpu, 3)
+            self.max_rss_delta_kb = end.max_rss_kb - start.max_rss_kb
+        else:
+            self.subprocess_cpu = self.max_rss_delta_kb = None
+        if (start.io_per_thread and end.io_per_thread) or process_wide:
+            self.read_bytes = end.read_bytes - start.read_bytes
+            self.write_bytes = end.write_bytes - start.write_bytes
+        else:
+            self.read_bytes = self.write_bytes = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {f.name: getattr(self, f.name) for f in fields(self) if f.name != "_lock"}
+
+
+def hook_record_http_response(response, *args, **kwargs):
+    """requests response hook counting responses for the currently profiled plugin"""
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.record_http_response(response)
+
+
+@contextmanager
+def profile_plugin(
+    plugin_key: str, pstats_path: Optional[Path] = None
+) -> Generator[PluginProfile, None, None]:
+    """Record resource usage of the code running in the context
+
+    HTTP responses are attributed to the profile only when they are received in
+    the same context, e.g. not from threads started by the plugin itself.
+
+    :param str plugin_key: key of the profiled plugin
+    :param pstats_path: if set, collect cProfile statistics and dump them there
+    :return: PluginProfile, filled in when the context exits
+    """
+    profile = PluginProfile()
+    token = _current_profile.set(profile)
+
+    profiler = None
+    if pstats_path:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:
+            # only one profiler may be active at a time since python 3.12
+            logger.warning("cannot collect cProfile statistics of plugin '%s': %s",
+                           plugin_key, e)
+            profiler = None
+
+    with _running_profiles_lock:
+        for running in _running_profiles:
+            running.overlapped = True
+        profile.overlapped = bool(_running_profiles)
+        _running_profiles.append(profile)
+
+    start = _UsageSnapshot.take()
+    try:
+        yield profile
+    finally:
+        end = _UsageSnapshot.take()
+        with _running_profiles_lock:
+            # not remove(), profiles with the same counters compare equal
+            _running_profiles[:] = [p for p in _running_profiles if p is not profile]
+        profile.update_from_snapshots(start, end)
+        _current_profile.reset(token)
+        if profiler:
+            profiler.disable()
+            try:
+                profiler.dump_stats(str(pstats_path))
+                logger.debug("cProfile statistics of plugin '%s' written to %s",
+                             plugin_key, pstats_path)
+            except OSError:
+                logger.exception("failed to write cProfile statistics of plugin '%s'",
+                                 plugin_key)
@@ -35,6 +35,9 @@ class BinaryPreBuildTask(plugin_based.PluginBasedTask[PreBuildTaskParams]):
     """Binary container pre-build task."""
 
     task_name = 'binary_container_prebuild'
+    # koji_parent, resolve_composes, resolve_remote_source, fetch_maven_artifacts
+    # and pin_operator_digest mostly wait for remote services
+    max_parallel_plugins = 4
     plugins_conf = [
         {"name": "distgit_fetch_artefacts"},
         {"name": "check_and_set_platforms"},
@@ -77,6 +80,8 @@ class BinaryPreBuildTask(plugin_based.PluginBasedTask[PreBuildTaskParams]):
             # Set what plugins to run and how
             plugins_conf=self.plugins_conf,
             keep_plugins_running=self.keep_plugins_running,
+            plugins_max_workers=self.max_parallel_plugins,
+            plugins_checkpoints=self.checkpoint_plugins,
             platforms_result=self._params.platforms_result,
         )
         return workflow
@@ -86,6 +91,7 @@ class BinaryPostBuildTask(plugin_based.PluginBasedTask[TaskParams]):
     """Binary container post-build task."""
 
     task_name = 'binary_container_postbuild'
+    checkpoint_plugins = True
     plugins_conf = [
         {"name": "fetch_docker_archive"},
         {"name": "flatpak_create_oci"},
@@ -26,6 +26,7 @@ from atomic_reactor import source
 from atomic_reactor import util
 from atomic_reactor.constants import OTEL_SERVICE_NAME
 from atomic_reactor.plugin import TaskCanceledException
+from atomic_reactor.utils import registry_metrics, retries
 
 logger = logging.getLogger(__name__)
 
@@ -125,6 +126,10 @@ class Task(abc.ABC, Generic[ParamsT]):
         raise TaskCanceledException("Tekton task was canceled")
 
     def run(self, *args, **kwargs):
+        task_key = self.task_name
+        if hasattr(self._params, 'platform'):
+            task_key += '_' + self._params.platform
+        registry_metrics.reset_registry_metrics()
         try:
             if self.ignore_sigterm:
                 signal.signal(signal.SIGTERM, signal.SIG_IGN)
@@ -154,10 +159,13 @@ class Task(abc.ABC, Generic[ParamsT]):
 
             RequestsInstrumentor().instrument()
 
-            span_name = self.task_name
-            if hasattr(self._params, 'platform'):
-                span_name += '_' + self._params.platform
+            span_name = task_key
             tracer = get_tracer(module_name=span_name, service_name=OTEL_SERVICE_NAME)
+            # registry content is shared by all tasks of the build through the context dir
+            registry_cache_dir = self.get_context_dir().get_registry_cache_dir()
+            util.set_registry_cache(util.RegistryCache(registry_cache_dir))
+            checksums_file = self.get_context_dir().get_checksum_registry_file()
+            util.set_checksum_registry(util.ChecksumRegistry(checksums_file))
             with tracer.start_as_current_span(span_name):
                 result = self.execute(*args, **kwargs)
             if self._params.task_result:
@@ -170,5 +178,19 @@ class Task(abc.ABC, Generic[ParamsT]):
 
         finally:
             signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            if registry_cache := util.get_registry_cache():
+                registry_cache.log_stats()
+            util.set_registry_cache(None)
+            if checksum_registry := util.get_checksum_registry():
+                try:
+                    checksum_registry.save()
+                except OSError as e:
+                    logger.warning("failed to save the checksums of the build files: %s", e)
+            util.set_checksum_registry(None)
+            retries.log_connection_stats()
+            registry_metrics.log_registry_metrics()
             if self.autosave_context_data:
+                metrics = registry_metrics.get_registry_metrics()
+                if metrics:
+                    self.workflow_data.registry_metrics[task_key] = metrics
                 self.workflow_data.save(self.get_context_dir())
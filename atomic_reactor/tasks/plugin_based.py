@@ -7,9 +7,10 @@ of the BSD license. See the LICENSE file for details.
 """
 
 import logging
+from pathlib import Path
 from typing import Optional, ClassVar, List, Dict, Any
 
-from atomic_reactor import inner, util
+from atomic_reactor import download, inner, util
 from atomic_reactor.tasks.common import Task, ParamsT
 from atomic_reactor.util import get_platforms
 
@@ -26,6 +27,16 @@ class PluginBasedTask(Task[ParamsT]):
     # previous one. Defaults to False.
     keep_plugins_running: ClassVar[bool] = False
 
+    # Maximum number of plugins allowed to run concurrently. Only plugins which
+    # declare the resources they read and write can run alongside others.
+    # Defaults to 1, i.e. plugins run one by one.
+    max_parallel_plugins: ClassVar[int] = 1
+
+    # Indicate whether plugins which finished in a previous attempt of the
+    # task (e.g. a Tekton retry) are skipped, as long as their checkpoints in
+    # the context dir are still valid. Defaults to False.
+    checkpoint_plugins: ClassVar[bool] = False
+
     # Specify the plugin configuration used by PluginsRunner to find out and
     # run the specific plugins. Example:
     #   {"name": "add_filesystem", "args": {...}}
@@ -46,6 +57,8 @@ class PluginBasedTask(Task[ParamsT]):
             # Set what plugins to run and how
             plugins_conf=self.plugins_conf,
             keep_plugins_running=self.keep_plugins_running,
+            plugins_max_workers=self.max_parallel_plugins,
+            plugins_checkpoints=self.checkpoint_plugins,
         )
         return workflow
 
@@ -64,11 +77,18 @@ class PluginBasedTask(Task[ParamsT]):
         if init_build_dirs:
             workflow.build_dir.init_build_dirs(get_platforms(workflow.data), workflow.source)
 
+        artifact_cache = workflow.conf.artifact_cache
+        if artifact_cache['path']:
+            download.set_artifact_cache(
+                download.ArtifactCache(Path(artifact_cache['path']), artifact_cache['max_size'])
+            )
         try:
             workflow.build_container_image()
         except Exception as e:
             logger.error("task %s failed: %s", self.task_name, e)
             raise
+        finally:
+            download.set_artifact_cache(None)
 
         # OSBS2 TBD: OSBS used to log the original Dockerfile after executing the workflow.
         #   It probably doesn't make sense to do that here, but it would be good to log the
@@ -52,6 +52,7 @@ class SourceBuildTask(SourceBuildBaseTask):
     """Source container build phases task."""
 
     task_name = 'source_container_build'
+    checkpoint_plugins = True
     plugins_conf = [
         {"name": "fetch_sources"},
         {"name": "bump_release"},
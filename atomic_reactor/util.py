@@ -10,23 +10,32 @@ from dataclasses import dataclass
 import typing
 import _hashlib
 import hashlib
+import fcntl
+import contextlib
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import partial
 from itertools import chain
 import json
 import io
 import os
+import queue
 import re
 import requests
 from requests.exceptions import SSLError, HTTPError, RetryError
 import tempfile
-from typing import Any, Final, Iterator, Sequence, Dict, Union, List, BinaryIO, Tuple, Optional
+import threading
+import time
+from typing import (Any, Final, Iterable, Iterator, Sequence, Dict, Union, List, BinaryIO, Tuple,
+                    Mapping, Optional, TypeVar)
 import logging
 import uuid
 import yaml
 import string
 import signal
 import tarfile
-from collections import namedtuple
+from collections import Counter, namedtuple
 from copy import deepcopy
 from base64 import b64decode
 from pathlib import Path
@@ -34,10 +43,14 @@ from typing import Callable
 
 from urllib.parse import urlparse
 
+import jsonschema
+import pkg_resources
+
 if typing.TYPE_CHECKING:
     from atomic_reactor.inner import DockerBuildWorkflow, ImageBuildWorkflowData
 
 import atomic_reactor.utils.retries
+from atomic_reactor.utils.registry_metrics import instrumented_request
 from atomic_reactor.constants import (DOCKERFILE_FILENAME, REPO_CONTAINER_CONFIG, TOOLS_USED,
                                       IMAGE_TYPE_DOCKER_ARCHIVE, IMAGE_TYPE_OCI, IMAGE_TYPE_OCI_TAR,
                                       MEDIA_TYPE_DOCKER_V2_SCHEMA1, MEDIA_TYPE_DOCKER_V2_SCHEMA2,
@@ -52,7 +65,10 @@ from atomic_reactor.constants import (DOCKERFILE_FILENAME, REPO_CONTAINER_CONFIG
                                       REPO_CONTENT_SETS_CONFIG,
                                       REPO_FETCH_ARTIFACTS_URL,
                                       REPO_FETCH_ARTIFACTS_PNC,
-                                      USER_CONFIG_FILES, REPO_FETCH_ARTIFACTS_KOJI)
+                                      USER_CONFIG_FILES, REPO_FETCH_ARTIFACTS_KOJI,
+                                      REGISTRY_CACHE_MAX_SIZE, REGISTRY_CACHE_TAG_TTL,
+                                      REGISTRY_CACHE_NOT_FOUND_TTL, MAX_PARALLEL_REGISTRY_REQUESTS,
+                                      HASH_BLOCK_SIZE, HASH_PIPELINE_DEPTH)
 from atomic_reactor.auth import HTTPRegistryAuth
 from atomic_reactor.types import ISerializer, ImageInspectionData
 
@@ -301,29 +317,140 @@ def _process_plugin_substitution(mapping, key_parts, value):
                            (plugin_name, plugins_num))
 
 
+class ParallelHasher:
+    """
+    Update hash objects with the same data, each in its own thread.
+
+    hashlib releases the GIL while hashing large buffers, so md5 and sha256
+    of a large file together take about as long as the slower of the two,
+    and reading or downloading the next block overlaps with hashing the
+    previous ones. At most depth blocks are queued for each hash object.
+
+    Use as a context manager, leaving it waits until all data is hashed.
+    """
+
+    def __init__(self, hash_objs: Iterable[_hashlib.HASH], depth: int = HASH_PIPELINE_DEPTH):
+        self._queues: List[queue.Queue] = []
+        self._threads = []
+        self._error: Optional[BaseException] = None
+        for hash_obj in hash_objs:
+            pending: queue.Queue = queue.Queue(depth)
+            thread = threading.Thread(target=self._hash, args=(hash_obj, pending), daemon=True)
+            thread.start()
+            self._queues.append(pending)
+            self._threads.append(thread)
+
+    def _hash(self, hash_obj: _hashlib.HASH, pending: queue.Queue) -> None:
+        while (item := pending.get()) is not None:
+            data, done = item
+            try:
+                if self._error is None:
+                    hash_obj.update(data)
+            except Exception as e:
+                self._error = e
+            finally:
+                if done:
+                    done()
+
+    def update(self, data: Union[bytes, memoryview],
+               done: Optional[Callable[[], None]] = None) -> None:
+        """
+        Queue data to be hashed.
+
+        :param data: bytes-like object, must not change until done is called
+        :param done: optional callable, called once all hash objects are
+            updated with data, e.g. to reuse the buffer
+        """
+        if not self._queues:
+            if done is not None:
+                done()
+            return
+        if done is not None:
+            done = self._call_after(len(self._queues), done)
+        for pending in self._queues:
+            pending.put((data, done))
+
+    @staticmethod
+    def _call_after(count: int, callback: Callable[[], None]) -> Callable[[], None]:
+        remaining = count
+        lock = threading.Lock()
+
+        def done():
+            nonlocal remaining
+            with lock:
+                remaining -= 1
+                if remaining:
+                    return
+            callback()
+
+        return done
+
+    def close(self) -> None:
+        """Wait until all queued data is hashed"""
+        for pending in self._queues:
+            pending.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._queues, self._threads = [], []
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self) -> 'ParallelHasher':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
 def _compute_checksums(
-    fd: BinaryIO, hash_objs: List[_hashlib.HASH], blocksize: int = 65536
+    fd: BinaryIO, hash_objs: List[_hashlib.HASH], blocksize: int = HASH_BLOCK_SIZE
 ) -> None:
     """
     Compute file checksums in given hash objects.
 
+    Blocks are read into a few preallocated buffers, which are reused once
+    all hash objects are done with them, see ParallelHasher.
+
     :param fd: file-like object
     :param hash_objs: list, hashlib hash objects for each algorithm to be calculated
     :param blocksize: block size used to read fd
     """
-    buf = fd.read(blocksize)
-    while len(buf) > 0:
-        for hash_object in hash_objs:
-            hash_object.update(buf)
-        buf = fd.read(blocksize)
+    if not hasattr(fd, 'readinto'):
+        with ParallelHasher(hash_objs) as hasher:
+            while block := fd.read(blocksize):
+                hasher.update(block)
+        return
+
+    free_buffers: queue.Queue = queue.Queue()
+    buf = bytearray(blocksize)
+    size = fd.readinto(buf)
+    if size < blocksize:
+        # most likely all of it, there is no reading to overlap the hashing with
+        while size:
+            for hash_obj in hash_objs:
+                hash_obj.update(memoryview(buf)[:size])
+            size = fd.readinto(buf)
+        return
+
+    for _ in range(HASH_PIPELINE_DEPTH):
+        free_buffers.put(bytearray(blocksize))
+    with ParallelHasher(hash_objs) as hasher:
+        while size:
+            hasher.update(memoryview(buf)[:size], done=partial(free_buffers.put, buf))
+            buf = free_buffers.get()
+            size = fd.readinto(buf)
 
 
-def get_checksums(filename: Union[str, BinaryIO], algorithms: List[str]) -> Dict[str, str]:
+def get_checksums(filename: Union[str, BinaryIO], algorithms: List[str],
+                  blocksize: int = HASH_BLOCK_SIZE) -> Dict[str, str]:
     """
     Compute a checksum(s) of given file using specified algorithms.
 
+    The checksums are computed in parallel, see ParallelHasher.
+
     :param filename: path to file or file-like object
     :param algorithms: list of cryptographic hash functions, currently supported: md5, sha256
+    :param blocksize: block size used to read the file
     :return: dictionary
     """
     if not algorithms:
@@ -333,22 +460,156 @@ def get_checksums(filename: Union[str, BinaryIO], algorithms: List[str]) -> Dict
     if not all(elem in allowed_algorithms for elem in algorithms):
         raise ValueError('Algorithms supported {}. Found {}'.format(allowed_algorithms, algorithms))
 
-    hash_objs = [getattr(hashlib, algorithm)() for algorithm in algorithms]
-
-    if isinstance(filename, str):
-        with open(filename, mode='rb') as f:
-            _compute_checksums(f, hash_objs)
+    registry = None
+    known: Dict[str, str] = {}
+    if isinstance(filename, str) and (registry := get_checksum_registry()):
+        known = registry.get(filename)
+    hash_objs = [getattr(hashlib, algorithm)() for algorithm in algorithms
+                 if algorithm not in known]
+
+    if hash_objs:
+        if isinstance(filename, str):
+            with open(filename, mode='rb', buffering=0) as f:
+                _compute_checksums(f, hash_objs, blocksize)
+        else:
+            _compute_checksums(filename, hash_objs, blocksize)
+        computed = {hash_obj.name: hash_obj.hexdigest() for hash_obj in hash_objs}
+        if registry and isinstance(filename, str):
+            registry.put(filename, computed)
+        known = {**known, **computed}
     else:
-        _compute_checksums(filename, hash_objs)
+        logger.debug('checksums of %s are known already', filename)
 
     checksums = {}
-    for hash_obj in hash_objs:
-        sum_name = '{}sum'.format(hash_obj.name)
-        checksums[sum_name] = hash_obj.hexdigest()
+    for algorithm in algorithms:
+        sum_name = '{}sum'.format(algorithm)
+        checksums[sum_name] = known[algorithm]
         logger.debug('%s: %s', sum_name, checksums[sum_name])
     return checksums
 
 
+class ChecksumRegistry:
+    """
+    Checksums of the files of a build, so each file is hashed only once
+
+    Entries are keyed on the real path of the file and are only used while
+    the inode, size and modification time of the file stay the same. Files
+    downloaded with download_url are registered with the checksums computed
+    while downloading, get_checksums registers what it computes and skips
+    what is known already.
+
+    With a path, the registry is kept in that file, e.g. in the context dir,
+    so it is shared by all tasks of the build. New entries are only kept in
+    memory until save() merges them into the file, e.g. once the task
+    finishes, so registering hundreds of files does not rewrite the file
+    for each of them.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        # entries registered since the last save()
+        self._unsaved: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._loaded_mtime: Optional[int] = None
+
+    @staticmethod
+    def _stat_key(path: str) -> List[int]:
+        stat = os.stat(path)
+        return [stat.st_ino, stat.st_size, stat.st_mtime_ns]
+
+    @staticmethod
+    def _read_file(path: Path) -> Dict[str, Dict[str, Any]]:
+        try:
+            return json.loads(path.read_text())
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _load(self) -> None:
+        """Read the entries saved by other processes, if there are new ones"""
+        if self.path is None:
+            return
+        try:
+            mtime = self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._loaded_mtime:
+            return
+        entries = self._read_file(self.path)
+        with self._lock:
+            # the entries of this process are at least as recent
+            entries.update(self._unsaved)
+            self._entries.update(entries)
+            self._loaded_mtime = mtime
+
+    def get(self, path: str) -> Dict[str, str]:
+        """
+        Get the known checksums of a file
+
+        :param path: str, path to the file
+        :return: dict, checksum type (e.g. md5) mapped to the checksum
+        """
+        key = os.path.realpath(path)
+        try:
+            stat_key = self._stat_key(key)
+        except OSError:
+            return {}
+        self._load()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry['stat'] != stat_key:
+                return {}
+            return dict(entry['checksums'])
+
+    def put(self, path: str, checksums: Dict[str, str]) -> None:
+        """
+        Register checksums of a file, as it is now
+
+        :param path: str, path to the file
+        :param checksums: dict, checksum type (e.g. md5) mapped to the checksum
+        """
+        key = os.path.realpath(path)
+        stat_key = self._stat_key(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry['stat'] != stat_key:
+                entry = self._entries[key] = {'stat': stat_key, 'checksums': {}}
+            entry['checksums'].update(checksums)
+            self._unsaved[key] = entry
+
+    def save(self) -> None:
+        """Merge the entries registered since the last save into the file"""
+        if self.path is None:
+            return
+        with self._lock:
+            unsaved = deepcopy(self._unsaved)
+            self._unsaved.clear()
+        if not unsaved:
+            return
+        with open(f'{self.path}.lock', 'w') as lock:
+            # merge with the entries of the other processes, one at a time
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            entries = self._read_file(self.path)
+            entries.update(unsaved)
+            with NamedTemporaryFile('w', dir=self.path.parent, prefix='.tmp-',
+                                    delete=False) as f:
+                json.dump(entries, f)
+            os.replace(f.name, self.path)
+
+
+_checksum_registry: Optional[ChecksumRegistry] = None
+
+
+def set_checksum_registry(registry: Optional[ChecksumRegistry]) -> None:
+    """Set the registry of checksums used by this process"""
+    global _checksum_registry
+    _checksum_registry = registry
+
+
+def get_checksum_registry() -> Optional[ChecksumRegistry]:
+    return _checksum_registry
+
+
 def get_exported_image_metadata(path, image_type) -> Dict[str, Union[str, int]]:
     logger.info('getting metadata for exported image %s (%s)', path, image_type)
     metadata = {'path': path, 'type': image_type}
@@ -527,6 +788,248 @@ class Dockercfg(object):
                 raise ValueError("Failed to parse 'auth' in '%s'" % self.json_secret_path)
 
 
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+def map_concurrently(func: Callable[[T], R], items: Sequence[T], max_workers: int) -> List[R]:
+    """Like map(), but call func for up to max_workers items at once, in threads
+
+    Results are in the order of items. The threads run in copies of the
+    caller's context.
+
+    :raises: the exception of the first item whose call failed
+    """
+    if max_workers <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items)),
+                            thread_name_prefix='registry') as executor:
+        futures = [executor.submit(contextvars.copy_context().run, func, item) for item in items]
+        return [future.result() for future in futures]
+
+
+class RegistryCache:
+    """On-disk cache of registry content addressed by digest
+
+    Manifests and config blobs are immutable once addressed by their digest,
+    so they can be shared by all tasks of a pipeline run through the context
+    dir. Content is only stored if it matches its digest. Manifests are stored
+    along with the media type the registry returned them as, and are only
+    served as that very media type. Entries are written
+    atomically, so several processes can share the cache. When the cache
+    grows over max_size, the least recently used entries are removed.
+
+    Tags are mutable, they are resolved to digests from the cache only for
+    tag_ttl seconds after they were looked up in the registry, and only by
+    clients which ask for it. After that, the ETag of the tag is kept, so the
+    manifest is only downloaded again if the tag moved. Tags the registry did
+    not find are remembered for not_found_ttl seconds.
+
+    The stats of this process, e.g. how many manifests were served from the
+    cache, are counted, see get_stats().
+    """
+
+    def __init__(self, path: Path, max_size: int = REGISTRY_CACHE_MAX_SIZE,
+                 tag_ttl: float = REGISTRY_CACHE_TAG_TTL,
+                 not_found_ttl: float = REGISTRY_CACHE_NOT_FOUND_TTL):
+        self.path = path
+        self.max_size = max_size
+        self.tag_ttl = tag_ttl
+        self.not_found_ttl = not_found_ttl
+        self._blobs_dir = path / "blobs"
+        self._tags_dir = path / "tags"
+        self._media_types_dir = path / "media_types"
+        self._blobs_dir.mkdir(parents=True, exist_ok=True)
+        self._tags_dir.mkdir(parents=True, exist_ok=True)
+        self._media_types_dir.mkdir(parents=True, exist_ok=True)
+        self._stats: typing.Counter[str] = Counter()
+        self._stats_lock = threading.Lock()
+
+    def count(self, event: str) -> None:
+        """Count an event, e.g. 'tag_revalidated', for the stats"""
+        with self._stats_lock:
+            self._stats[event] += 1
+
+    def get_stats(self) -> Dict[str, float]:
+        """Get the counted events and the hit ratios computed from them
+
+        Manifests looked up by tag are hits if they were resolved from the
+        cache or the registry confirmed the cached manifest is current.
+        Missing tags are hits if the registry was not asked again.
+        """
+        with self._stats_lock:
+            stats: Dict[str, float] = dict(self._stats)
+
+        def ratio(hits: float, misses: float) -> float:
+            return hits / (hits + misses) if hits + misses else 0.0
+
+        get = stats.get
+        stats['blob_hit_ratio'] = ratio(get('blob_hits', 0), get('blob_misses', 0))
+        stats['tag_hit_ratio'] = ratio(get('tag_hits', 0) + get('tag_revalidated', 0),
+                                       get('tag_fetched', 0))
+        stats['not_found_hit_ratio'] = ratio(get('not_found_hits', 0), get('not_found', 0))
+        return stats
+
+    def log_stats(self) -> None:
+        stats = self.get_stats()
+        logger.debug("registry cache: blob hit ratio %.2f, tag hit ratio %.2f, "
+                     "not found hit ratio %.2f, counts: %s",
+                     stats.pop('blob_hit_ratio'), stats.pop('tag_hit_ratio'),
+                     stats.pop('not_found_hit_ratio'), stats)
+
+    def _blob_path(self, digest: str) -> Optional[Path]:
+        algorithm, _, hex_digest = digest.partition(':')
+        if algorithm != 'sha256' or not re.fullmatch(r'[0-9a-f]{64}', hex_digest):
+            return None
+        return self._blobs_dir / hex_digest
+
+    def _write_atomically(self, path: Path, content: bytes) -> None:
+        with NamedTemporaryFile(dir=path.parent, prefix='.tmp-', delete=False) as f:
+            f.write(content)
+        os.replace(f.name, path)
+
+    def get_blob(self, digest: str) -> Optional[bytes]:
+        path = self._blob_path(digest)
+        if path is None:
+            return None
+        try:
+            content = path.read_bytes()
+            # mark as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            self.count('blob_misses')
+            return None
+        logger.debug("registry cache hit for %s", digest)
+        self.count('blob_hits')
+        return content
+
+    def put_blob(self, digest: str, content: bytes) -> None:
+        path = self._blob_path(digest)
+        if path is None or hashlib.sha256(content).hexdigest() != path.name:
+            logger.debug("not caching %s, content does not match the digest", digest)
+            return
+        self._write_atomically(path, content)
+        self._evict()
+
+    def get_manifest(self, digest: str, media_type: str) -> Optional[bytes]:
+        """Get the manifest if it was stored as exactly the given media type"""
+        path = self._blob_path(digest)
+        if path is None:
+            return None
+        try:
+            stored_media_type = (self._media_types_dir / path.name).read_text()
+        except FileNotFoundError:
+            stored_media_type = None
+        if stored_media_type != media_type:
+            self.count('blob_misses')
+            return None
+        return self.get_blob(digest)
+
+    def put_manifest(self, digest: str, content: bytes, media_type: str) -> None:
+        path = self._blob_path(digest)
+        if path is None or hashlib.sha256(content).hexdigest() != path.name:
+            logger.debug("not caching %s, content does not match the digest", digest)
+            return
+        self._write_atomically(self._media_types_dir / path.name, media_type.encode())
+        self.put_blob(digest, content)
+
+    def _tag_path(self, registry: str, image: ImageName, media_type: str) -> Path:
+        key = f'{registry}/{image.to_str(registry=False)}#{media_type}'
+        return self._tags_dir / hashlib.sha256(key.encode()).hexdigest()
+
+    def _read_tag(
+        self, registry: str, image: ImageName, media_type: str
+    ) -> Tuple[Optional[Dict[str, Optional[str]]], float]:
+        """Get the tag entry and its age in seconds"""
+        path = self._tag_path(registry, image, media_type)
+        try:
+            age = time.time() - path.stat().st_mtime
+            return json.loads(path.read_text()), age
+        except (FileNotFoundError, ValueError):
+            return None, 0
+
+    def get_tag(self, registry: str, image: ImageName, media_type: str) -> Optional[str]:
+        """Get the digest of the manifest the tag pointed to recently"""
+        entry, age = self._read_tag(registry, image, media_type)
+        if entry is None or age > self.tag_ttl:
+            return None
+        return entry['digest']
+
+    def get_tag_etag(
+        self, registry: str, image: ImageName, media_type: str
+    ) -> Optional[Tuple[str, str]]:
+        """Get the digest and the ETag of the manifest the tag pointed to, however long ago"""
+        entry, _ = self._read_tag(registry, image, media_type)
+        if entry is None:
+            return None
+        digest, etag = entry['digest'], entry.get('etag')
+        if not digest or not etag:
+            return None
+        return digest, etag
+
+    def put_tag(self, registry: str, image: ImageName, media_type: str, digest: str,
+                etag: Optional[str] = None) -> None:
+        entry = {'digest': digest, 'etag': etag}
+        self._write_atomically(self._tag_path(registry, image, media_type),
+                               json.dumps(entry).encode())
+
+    def is_tag_missing(self, registry: str, image: ImageName, media_type: str) -> bool:
+        """Check if the registry recently did not find the tag"""
+        entry, age = self._read_tag(registry, image, media_type)
+        return entry is not None and entry['digest'] is None and age <= self.not_found_ttl
+
+    def put_missing_tag(self, registry: str, image: ImageName, media_type: str) -> None:
+        self._write_atomically(self._tag_path(registry, image, media_type),
+                               json.dumps({'digest': None}).encode())
+
+    def _evict(self) -> None:
+        with open(self.path / '.lock', 'w') as lock:
+            # one process evicting at a time is enough
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            entries = []
+            for entry in os.scandir(self._blobs_dir):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total_size = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total_size <= self.max_size:
+                    break
+                logger.debug("evicting %s from registry cache", path)
+                with contextlib.suppress(FileNotFoundError):
+                    os.unlink(path)
+                with contextlib.suppress(FileNotFoundError):
+                    os.unlink(self._media_types_dir / os.path.basename(path))
+                total_size -= size
+
+
+_registry_cache: Optional[RegistryCache] = None
+
+
+def set_registry_cache(cache: Optional[RegistryCache]) -> None:
+    """Set the cache used by registry clients of this process"""
+    global _registry_cache
+    _registry_cache = cache
+
+
+def get_registry_cache() -> Optional[RegistryCache]:
+    return _registry_cache
+
+
+def _cached_manifest_response(content: bytes, media_type: str, digest: str) -> requests.Response:
+    response = requests.Response()
+    response.status_code = requests.codes.ok
+    response._content = content
+    response.headers['Content-Type'] = media_type
+    response.headers['Docker-Content-Digest'] = digest
+    return response
+
+
 class RegistrySession(object):
     def __init__(self, registry, insecure=False, dockercfg_path=None, access=None):
         self.registry = registry
@@ -556,7 +1059,11 @@ class RegistrySession(object):
                 # with https then fallback
                 self._fallback = 'http://{}'.format(self.registry)
 
-        self.session = get_retrying_requests_session()
+        # sessions to the same registry with the same credentials share the
+        # connections and cookies, auth and verify are passed with each request
+        self.session = atomic_reactor.utils.retries.get_shared_requests_session(
+            ('registry', registry, insecure, dockercfg_path, tuple(access or ()))
+        )
 
     @classmethod
     def create_from_config(cls, config, registry=None, access=None):
@@ -606,15 +1113,21 @@ class RegistrySession(object):
     def _do(self, f, relative_url, *args, **kwargs):
         kwargs['auth'] = self.auth
         kwargs['verify'] = not self.insecure
+
+        def send(base):
+            url = base + relative_url
+            method = getattr(f, '__name__', 'request').upper()
+            return instrumented_request(lambda: f(url, *args, **kwargs), method, url)
+
         if self._fallback:
             try:
-                res = f(self._base + relative_url, *args, **kwargs)
+                res = send(self._base)
                 self._fallback = None  # don't fallback after one success
                 return res
             except (SSLError, requests.ConnectionError):
                 self._base = self._fallback
                 self._fallback = None
-        return f(self._base + relative_url, *args, **kwargs)
+        return send(self._base)
 
     def get(self, relative_url, data=None, **kwargs):
         return self._do(self.session.get, relative_url, **kwargs)
@@ -644,10 +1157,25 @@ class RegistryClient(object):
     To create a client for a specific registry (configured in config map), use
     >>> session = RegistrySession.create_from_config(...)
     >>> client = RegistryClient(session)
+
+    Manifests and config blobs fetched by digest are kept in the registry
+    cache, see set_registry_cache(). Manifests looked up by tag again are
+    only downloaded if the registry says their ETag changed. With
+    resolve_tags_from_cache, tags looked up recently are not looked up in the
+    registry again, and tags the registry did not find are not looked up again
+    for a short while either. That is only suitable for images whose tags are
+    not expected to move during the build.
     """
 
-    def __init__(self, registry_session):
+    def __init__(self, registry_session, cache: Optional[RegistryCache] = None,
+                 resolve_tags_from_cache: bool = False):
         self._session = registry_session
+        self._cache = cache
+        self._resolve_tags_from_cache = resolve_tags_from_cache
+
+    @property
+    def cache(self) -> Optional[RegistryCache]:
+        return self._cache or get_registry_cache()
 
     @property
     def insecure(self):
@@ -662,8 +1190,17 @@ class RegistryClient(object):
     ) -> Tuple[Optional[requests.Response], Optional[Exception]]:
         saved_not_found = None
         media_type = get_manifest_media_type(version)
+        if cached_response := self._get_cached_manifest(image, media_type):
+            return cached_response, None
+        if self._is_cached_not_found(image, media_type):
+            logger.debug("skipping version %s, %s was not found recently", version, image)
+            return None, self._cached_not_found_error(image)
+
+        cached_etag = self._get_cached_etag(image, media_type)
+        extra_headers = {'If-None-Match': cached_etag[1]} if cached_etag else None
         try:
-            response = query_registry(self._session, image, digest=None, version=version)
+            response = query_registry(self._session, image, digest=None, version=version,
+                                      extra_headers=extra_headers)
         except (HTTPError, RetryError) as ex:
             if ex.response is None:
                 raise
@@ -673,6 +1210,7 @@ class RegistryClient(object):
                                    ' (Does the image exist?)'.format(image.to_str())) from ex
             if ex.response.status_code == requests.codes.not_found:
                 saved_not_found = ex
+                self._cache_not_found(image, media_type)
             # If the registry has a v2 manifest that can't be converted into a v1
             # manifest, the registry fails with status=400 (BAD_REQUEST), and an error code of
             # MANIFEST_INVALID. Note that if the registry has v2 manifest and
@@ -693,25 +1231,177 @@ class RegistryClient(object):
             else:
                 raise
 
+        if response.status_code == requests.codes.not_modified and cached_etag:
+            if revalidated_response := self._get_revalidated_manifest(
+                image, media_type, *cached_etag
+            ):
+                return revalidated_response, None
+            # the cached manifest was evicted in the meantime
+            response = query_registry(self._session, image, digest=None, version=version)
+
         if not manifest_is_media_type(response, media_type):
             logger.warning("content does not match expected media type")
             return None, saved_not_found
         logger.debug("content matches expected media type")
+        self._cache_manifest(image, media_type, response)
         return response, saved_not_found
 
+    def _get_cached_manifest(
+        self, image: ImageName, media_type: str
+    ) -> Optional[requests.Response]:
+        cache = self.cache
+        if cache is None:
+            return None
+        digest = image.tag if image.tag.startswith('sha256:') else None
+        if digest is None and self._resolve_tags_from_cache:
+            digest = cache.get_tag(self._session.registry, image, media_type)
+        if not digest:
+            return None
+        content = cache.get_manifest(digest, media_type)
+        if content is None:
+            return None
+        logger.debug("using cached manifest %s of %s", digest, image.to_str())
+        if digest != image.tag:
+            cache.count('tag_hits')
+        return _cached_manifest_response(content, media_type, digest)
+
+    def _get_cached_etag(self, image: ImageName, media_type: str) -> Optional[Tuple[str, str]]:
+        """Get the digest and ETag of the manifest the tag pointed to, to revalidate it"""
+        cache = self.cache
+        if cache is None or image.tag.startswith('sha256:'):
+            return None
+        return cache.get_tag_etag(self._session.registry, image, media_type)
+
+    def _get_revalidated_manifest(
+        self, image: ImageName, media_type: str, digest: str, etag: str
+    ) -> Optional[requests.Response]:
+        cache = self.cache
+        content = cache.get_manifest(digest, media_type) if cache is not None else None
+        if cache is None or content is None:
+            return None
+        logger.debug("manifest %s of %s has not changed", digest, image.to_str())
+        cache.count('tag_revalidated')
+        # the tag has just been looked up in the registry
+        cache.put_tag(self._session.registry, image, media_type, digest, etag)
+        return _cached_manifest_response(content, media_type, digest)
+
+    def _cache_manifest(self, image: ImageName, media_type: str,
+                        response: requests.Response) -> None:
+        cache = self.cache
+        digest = response.headers.get('Docker-Content-Digest')
+        if cache is None or not digest:
+            return
+        # the response has been checked to be of the media type
+        cache.put_manifest(digest, response.content, media_type)
+        if not image.tag.startswith('sha256:'):
+            cache.count('tag_fetched')
+            cache.put_tag(self._session.registry, image, media_type, digest,
+                          response.headers.get('ETag'))
+
+    def _is_cached_not_found(self, image: ImageName, media_type: str) -> bool:
+        cache = self.cache
+        if cache is None or not self._resolve_tags_from_cache:
+            return False
+        if not cache.is_tag_missing(self._session.registry, image, media_type):
+            return False
+        cache.count('not_found_hits')
+        return True
+
+    def _cache_not_found(self, image: ImageName, media_type: str) -> None:
+        cache = self.cache
+        if cache is None or image.tag.startswith('sha256:'):
+            return
+        cache.count('not_found')
+        cache.put_missing_tag(self._session.registry, image, media_type)
+
+    def _cached_not_found_error(self, image: ImageName) -> HTTPError:
+        response = requests.Response()
+        response.status_code = requests.codes.not_found
+        return HTTPError(f'404 Client Error: {image.to_str()} was not found recently '
+                         f'(cached)', response=response)
+
+    def _served_manifest_version(
+        self, response: requests.Response, versions: Sequence[str], has_content: bool
+    ) -> Optional[str]:
+        """Return which of the versions the registry served, None if it is not clear"""
+        received_media_type = response.headers.get('Content-Type')
+        if received_media_type is None and has_content:
+            received_media_type = guess_manifest_media_type(response.content)
+        if received_media_type is None:
+            return None
+        # ignore parameters and the +prettyjws suffix of signed manifests
+        received_prefix = received_media_type.split(';')[0].strip().rsplit('+', 1)[0]
+        for version in versions:
+            if get_manifest_media_type(version).rsplit('+', 1)[0] == received_prefix:
+                return version
+        return None
+
+    def resolve_manifest_digest(
+        self, image: ImageName, versions: Sequence[str]
+    ) -> Optional['ManifestDigest']:
+        """Get the digest of the manifest the registry serves for image, in one request
+
+        All the media types of versions are sent in one Accept header, first
+        with a HEAD request, then with GET if the registry does not allow HEAD
+        or does not say which media type it served.
+
+        Unlike querying the versions one by one, this only finds the manifest
+        the registry has stored, not the ones it can convert it to.
+
+        :return: ManifestDigest with a single version, or None if the response
+            is ambiguous and the versions have to be queried one by one
+        """
+        context = '/'.join([x for x in [image.namespace, image.repo] if x])
+        url = '/v2/{}/manifests/{}'.format(context, image.tag)
+        headers = {'Accept': ', '.join(get_manifest_media_type(v) for v in versions)}
+
+        for request, has_content in ((self._session.head, False), (self._session.get, True)):
+            try:
+                response = request(url, headers=headers)
+                response.raise_for_status()
+            except (HTTPError, RetryError) as ex:
+                logger.debug("resolving manifest digest for %s failed: %s", image, ex)
+                if ex.response is not None and ex.response.status_code in (
+                    requests.codes.not_found, requests.codes.unauthorized
+                ):
+                    return None
+                continue
+
+            version = self._served_manifest_version(response, versions, has_content)
+            digest = response.headers.get('Docker-Content-Digest')
+            if version is None or not digest:
+                continue
+            if version == 'v1' and len(versions) > 1:
+                # registries not understanding the Accept header default to schema 1
+                return None
+            logger.debug('Image %s has %s manifest digest: %s', image, version, digest)
+            return ManifestDigest({version: digest})
+
+        return None
+
     def get_manifest_digests(self,
                              image,
                              versions=('v1', 'v2', 'v2_list', 'oci', 'oci_index'),
-                             require_digest=True):
+                             require_digest=True,
+                             single_request=False):
         """Return manifest digest for image.
 
         :param image: ImageName, the remote image to inspect
         :param versions: tuple, which manifest schema versions to fetch digest
         :param require_digest: bool, when True exception is thrown if no digest is
                                      set in the headers.
+        :param single_request: bool, when True, only get the digest of the manifest
+                               stored in the registry, see resolve_manifest_digest.
+                               Versions are queried one by one only if the registry
+                               response is ambiguous.
 
         :return: dict, versions mapped to their digest
         """
+        if single_request and versions:
+            resolved = self.resolve_manifest_digest(image, versions)
+            if resolved is not None:
+                return resolved
+            logger.debug("querying manifest digests of %s one by one", image)
 
         digests = {}
         # If all of the media types return a 404 NOT_FOUND status, then we rethrow
@@ -798,18 +1488,21 @@ class RegistryClient(object):
         return 'sha256:{}'.format(digest_dict['sha256sum'])
 
     def get_all_manifests(
-        self, image: ImageName, versions: Sequence[str] = ('v1', 'v2', 'v2_list', 'oci_index')
+        self, image: ImageName, versions: Sequence[str] = ('v1', 'v2', 'v2_list', 'oci_index'),
+        max_workers: int = 1,
     ) -> Dict[str, requests.Response]:
         """Return manifest digests for image.
 
         :param image: ImageName, the remote image to inspect
         :param versions: tuple, for which manifest schema versions to fetch manifests
+        :param max_workers: int, for how many versions to fetch manifests at once
 
         :return: dict of successful responses, with versions as keys
         """
+        responses = map_concurrently(lambda version: self.get_manifest(image, version)[0],
+                                     versions, max_workers)
         digests = {}
-        for version in versions:
-            response, _ = self.get_manifest(image, version)
+        for version, response in zip(versions, responses):
             if response:
                 digests[version] = response
 
@@ -828,8 +1521,96 @@ class RegistryClient(object):
 
         :return: dict of inspected image
         """
-        all_man_digests = self.get_all_manifests(image)
+        all_man_digests = self.get_all_manifests(image, max_workers=MAX_PARALLEL_REGISTRY_REQUESTS)
+        blob_config, config_digest = self._config_and_id_from_manifests(
+            image, all_man_digests, arch
+        )
+        return self._inspect_from_config(image, blob_config, config_digest, arch)
+
+    def get_inspect_for_arches(
+        self, image: ImageName, arches: Sequence[str],
+        max_workers: int = MAX_PARALLEL_REGISTRY_REQUESTS,
+    ) -> Dict[str, ImageInspectionData]:
+        """Return inspect for image, for each of the architectures.
+
+        Unlike calling get_inspect_for_image for each architecture, the
+        manifests of the image are only fetched once, and the per-arch
+        manifests and configs of a manifest list are fetched concurrently.
+
+        :param image: The remote image to inspect
+        :param arches: The architectures to inspect, GOARCH names
+        :param max_workers: How many requests to send at once
+
+        :return: dict of inspected images, with architectures as keys
+        """
+        all_man_digests = self.get_all_manifests(image, max_workers=max_workers)
+        manifest_list_response = all_man_digests.get('v2_list') or all_man_digests.get('oci_index')
+        # config blob and image ID for each architecture
+        configs: Mapping[str, Tuple[dict, Optional[str]]]
+        if manifest_list_response is not None:
+            configs = self.get_configs_from_manifest_list(
+                image, manifest_list_response.json(), arches, max_workers=max_workers
+            )
+        else:
+            config = self._config_and_id_from_manifests(image, all_man_digests, None)
+            configs = {arch: config for arch in arches}
+
+        return {
+            arch: self._inspect_from_config(image, blob_config, config_digest, arch)
+            for arch, (blob_config, config_digest) in configs.items()
+        }
+
+    def get_configs_from_manifest_list(
+        self, image: ImageName, manifest_list: dict, arches: Sequence[str],
+        max_workers: int = MAX_PARALLEL_REGISTRY_REQUESTS,
+    ) -> Dict[str, Tuple[dict, str]]:
+        """Get the config blobs and image IDs of several images in a manifest list.
+
+        The manifests of all the architectures are fetched concurrently, then
+        their configs. Each distinct manifest and config is fetched only once.
 
+        :param image: ImageName, the remote image the manifest list belongs to
+        :param manifest_list: dict, the manifest list or OCI image index
+        :param arches: The architectures to get the configs for, GOARCH names
+        :param max_workers: How many requests to send at once
+
+        :return: dict of (config blob, image ID) tuples, with architectures as keys
+        """
+        manifests = {arch: self._manifest_from_list(image, manifest_list, arch)
+                     for arch in arches}
+        # several architectures can share an image, e.g. noarch images
+        manifest_versions = {
+            manifest['digest']: 'v2' if manifest['mediaType'] == MEDIA_TYPE_DOCKER_V2_SCHEMA2
+            else 'oci'
+            for manifest in manifests.values()
+        }
+        manifest_digests = list(manifest_versions)
+        image_manifests = map_concurrently(
+            lambda digest: json.loads(
+                self._query_by_digest(image, digest, version=manifest_versions[digest])
+            ),
+            manifest_digests, max_workers,
+        )
+        config_digests = {digest: image_manifest['config']['digest']
+                          for digest, image_manifest in zip(manifest_digests, image_manifests)}
+
+        unique_config_digests = list(dict.fromkeys(config_digests.values()))
+        blob_configs = dict(zip(
+            unique_config_digests,
+            map_concurrently(lambda digest: self._blob_config_by_digest(image, digest),
+                             unique_config_digests, max_workers),
+        ))
+
+        configs = {}
+        for arch, manifest in manifests.items():
+            config_digest = config_digests[manifest['digest']]
+            configs[arch] = (blob_configs[config_digest], config_digest)
+        return configs
+
+    def _config_and_id_from_manifests(
+        self, image: ImageName, all_man_digests: Dict[str, requests.Response],
+        arch: Optional[str],
+    ) -> Tuple[dict, Optional[str]]:
         config_digest: Optional[str]
 
         # we have manifest list
@@ -858,6 +1639,12 @@ class RegistryClient(object):
             raise RuntimeError("Image {image_name} not found: No v2 schema 1 image, "
                                "or v2 schema 2 image or list, found".format(image_name=image))
 
+        return blob_config, config_digest
+
+    def _inspect_from_config(
+        self, image: ImageName, blob_config: dict, config_digest: Optional[str],
+        arch: Optional[str],
+    ) -> ImageInspectionData:
         if not blob_config:
             raise RuntimeError(f"Image {image}: Couldn't get inspect data from digest config")
         if arch and blob_config['architecture'] != arch:
@@ -882,9 +1669,18 @@ class RegistryClient(object):
 
         return image_inspect
 
+    def _query_by_digest(self, image: ImageName, digest: str, **query_kwargs) -> bytes:
+        """Get the content of a manifest or blob, from the registry cache if possible"""
+        cache = self.cache
+        if cache is not None and (content := cache.get_blob(digest)) is not None:
+            return content
+        content = query_registry(self._session, image, digest=digest, **query_kwargs).content
+        if cache is not None:
+            cache.put_blob(digest, content)
+        return content
+
     def _blob_config_by_digest(self, image: ImageName, config_digest: str) -> dict:
-        config_response = query_registry(self._session, image, digest=config_digest, is_blob=True)
-        blob_config = config_response.json()
+        blob_config = json.loads(self._query_by_digest(image, config_digest, is_blob=True))
         return blob_config
 
     def _config_and_id_from_manifest_list(
@@ -896,6 +1692,18 @@ class RegistryClient(object):
         that the list has exactly one image matching the specified architecture and inspect that
         image.
         """
+        manifest = self._manifest_from_list(image, manifest_list, arch)
+        image_digest = manifest["digest"]
+
+        if manifest["mediaType"] == MEDIA_TYPE_DOCKER_V2_SCHEMA2:
+            return self.get_config_and_id_from_registry(image, image_digest, version='v2')
+        else:
+            return self.get_config_and_id_from_registry(image, image_digest, version='oci')
+
+    def _manifest_from_list(
+        self, image: ImageName, manifest_list: dict, arch: Optional[str]
+    ) -> dict:
+        """Get the entry of the manifest list for the architecture, or the first one"""
         manifests = manifest_list["manifests"]
         if not manifests:
             logger.error("Empty manifest list: %r", manifest_list)
@@ -922,12 +1730,7 @@ class RegistryClient(object):
             raise RuntimeError(f"Image {image}: v2 schema 1 in manifest list, "
                                f"oci in image index is missing")
 
-        image_digest = manifest["digest"]
-
-        if manifest["mediaType"] == MEDIA_TYPE_DOCKER_V2_SCHEMA2:
-            return self.get_config_and_id_from_registry(image, image_digest, version='v2')
-        else:
-            return self.get_config_and_id_from_registry(image, image_digest, version='oci')
+        return manifest
 
     def get_config_and_id_from_registry(self, image, digest: str, version='v2') -> Tuple[Dict, str]:
         """Return image config by digest
@@ -938,8 +1741,7 @@ class RegistryClient(object):
 
         :return: dict, versions mapped to their digest
         """
-        response = query_registry(self._session, image, digest=digest, version=version)
-        manifest_config = response.json()
+        manifest_config = json.loads(self._query_by_digest(image, digest, version=version))
 
         config_digest = manifest_config['config']['digest']
         blob_config = self._blob_config_by_digest(image, config_digest)
@@ -1018,7 +1820,8 @@ def get_manifest_media_version(digest):
 
 
 def query_registry(
-    registry_session, image: ImageName, digest=None, version='v1', is_blob=False
+    registry_session, image: ImageName, digest=None, version='v1', is_blob=False,
+    extra_headers: Optional[Dict[str, str]] = None,
 ) -> requests.Response:
     """Return manifest digest for image.
 
@@ -1027,6 +1830,7 @@ def query_registry(
     :param digest: str, digest of the image manifest
     :param version: str, which manifest schema version to fetch digest
     :param is_blob: bool, read blob config if set to True
+    :param extra_headers: dict, additional request headers, e.g. If-None-Match
 
     :return: requests.Response object
     """
@@ -1038,6 +1842,7 @@ def query_registry(
         object_type = 'blobs'
 
     headers = {'Accept': (get_manifest_media_type(version))}
+    headers.update(extra_headers or {})
     url = '/v2/{}/{}/{}'.format(context, object_type, reference)
     logger.debug("query_registry: querying %s, headers: %s", url, headers)
 
@@ -1111,7 +1916,8 @@ def get_manifest(image, registry_session, version):
 
 
 def get_manifest_digests(image, registry, insecure=False, dockercfg_path=None,
-                         versions=('v1', 'v2', 'v2_list', 'oci', 'oci_index'), require_digest=True):
+                         versions=('v1', 'v2', 'v2_list', 'oci', 'oci_index'), require_digest=True,
+                         single_request=False):
     """Return manifest digest for image.
 
     :param image: ImageName, the remote image to inspect
@@ -1122,6 +1928,7 @@ def get_manifest_digests(image, registry, insecure=False, dockercfg_path=None,
     :param versions: tuple, which manifest schema versions to fetch digest
     :param require_digest: bool, when True exception is thrown if no digest is
                                  set in the headers.
+    :param single_request: bool, see RegistryClient.get_manifest_digests
 
     :return: dict, versions mapped to their digest
     """
@@ -1129,7 +1936,8 @@ def get_manifest_digests(image, registry, insecure=False, dockercfg_path=None,
     registry_client = RegistryClient(registry_session)
     return registry_client.get_manifest_digests(image=image,
                                                 versions=versions,
-                                                require_digest=require_digest)
+                                                require_digest=require_digest,
+                                                single_request=single_request)
 
 
 def get_manifest_list(image, registry, insecure=False, dockercfg_path=None):
@@ -1241,6 +2049,83 @@ def are_plugins_in_order(plugins_conf, *plugins_names):
     return True
 
 
+class SchemaRegistry:
+    """Process-wide cache of JSON schemas and their validators
+
+    osbs.utils.yaml loads the schema from the package and checks it against
+    the meta-schema on every validation, which costs far more than validating
+    the data itself. The registry does that once per schema. Validators are
+    kept per thread, because the $ref resolver of a validator is not safe to
+    use from several threads at once.
+    """
+
+    def __init__(self) -> None:
+        self._schemas: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def get_schema(self, package: str, schema: str) -> Dict[str, Any]:
+        """Get the loaded and checked schema
+
+        :raises jsonschema.SchemaError: if the schema itself is not valid
+        """
+        key = (package, schema)
+        with self._lock:
+            loaded = self._schemas.get(key)
+            if loaded is None:
+                loaded = osbs_yaml.load_schema(package, schema)
+                jsonschema.Draft4Validator.check_schema(loaded)
+                self._schemas[key] = loaded
+        return loaded
+
+    def get_validator(self, package: str, schema: str) -> jsonschema.Draft4Validator:
+        validators = getattr(self._local, "validators", None)
+        if validators is None:
+            validators = self._local.validators = {}
+        key = (package, schema)
+        validator = validators.get(key)
+        if validator is None:
+            validator = jsonschema.Draft4Validator(self.get_schema(package, schema))
+            validators[key] = validator
+        return validator
+
+    def validate(self, data: Any, schema: str, package: str = "atomic_reactor") -> None:
+        """Validate data against a JSON schema from the package
+
+        :raises osbs.OsbsValidationException: if the data is not valid
+        """
+        validator = self.get_validator(package, schema)
+        if not validator.is_valid(data):
+            # let osbs report the error, keeping the messages people are used to
+            osbs_yaml.validate_with_schema(data, validator.schema)
+
+    def precompile(self, package: str = "atomic_reactor", schemas_dir: str = "schemas") -> int:
+        """Load and check all schemas of the package up front
+
+        :return: number of schemas in the registry
+        """
+        for name in sorted(pkg_resources.resource_listdir(package, schemas_dir)):
+            if name.endswith(".json"):
+                self.get_schema(package, f"{schemas_dir}/{name}")
+        with self._lock:
+            return len(self._schemas)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._schemas.clear()
+            self._local = threading.local()
+
+
+schema_registry = SchemaRegistry()
+
+
+def precompile_schemas(package: str = "atomic_reactor") -> None:
+    """Fill the schema registry, so that no task pays for loading schemas later"""
+    start = datetime.now()
+    count = schema_registry.precompile(package)
+    logger.debug("precompiled %d JSON schemas in %s", count, datetime.now() - start)
+
+
 def read_yaml_from_file_path(file_path, schema, package='atomic_reactor'):
     """
     :param yaml_data: string, path to the yaml data
@@ -1249,7 +2134,7 @@ def read_yaml_from_file_path(file_path, schema, package='atomic_reactor'):
     """
     with open(file_path) as f:
         yaml_data = f.read()
-    return osbs_yaml.read_yaml(yaml_data, schema, package)
+    return read_yaml(yaml_data, schema, package)
 
 
 def read_yaml_from_url(url, schema, package='atomic_reactor'):
@@ -1267,7 +2152,7 @@ def read_yaml_from_url(url, schema, package='atomic_reactor'):
         f.write(chunk.decode('utf-8'))
 
     f.seek(0)
-    return osbs_yaml.read_yaml(f.read(), schema, package)
+    return read_yaml(f.read(), schema, package)
 
 
 def read_yaml(yaml_data, schema, package='atomic_reactor'):
@@ -1276,7 +2161,9 @@ def read_yaml(yaml_data, schema, package='atomic_reactor'):
     :param schema: string, path to the JSON schema file
     :param package: string, package name containing the JSON schema file
     """
-    return osbs_yaml.read_yaml(yaml_data, schema, package)
+    data = yaml.safe_load(yaml_data)
+    schema_registry.validate(data, schema, package)
+    return data
 
 
 def validate_with_schema(data: dict, schema: str, package: str = "atomic_reactor") -> None:
@@ -1287,8 +2174,7 @@ def validate_with_schema(data: dict, schema: str, package: str = "atomic_reactor
     :param package: package name containing the JSON schema file
     :raises osbs.OsbsValidationException: if the data is not valid according to the schema
     """
-    schema = osbs_yaml.load_schema(package, schema)
-    osbs_yaml.validate_with_schema(data, schema)
+    schema_registry.validate(data, schema, package)
 
 
 def allow_path_in_dockerignore(build_path, allow_path):
@@ -1872,7 +2758,7 @@ def read_user_config_file(workflow, filename):
     :rtype: None or dict
     :raises jsonschema.SchemaError: if the schema is loaded incorrectly.
     :raises OsbsValidationException: if the validation fails.
-    :raises: any other errors raised from ``osbs.utils.yaml.read_yaml``.
+    :raises: any other errors raised from ``read_yaml``.
     """
     _, work_dir = workflow.source.get_build_file_path()
     schema_file = USER_CONFIG_FILES[filename]
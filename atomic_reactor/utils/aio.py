@@ -0,0 +1,142 @@
+"""
+Copyright (c) 2023 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+
+
+Support for plugins implementing run() as a coroutine
+"""
+import asyncio
+import concurrent.futures
+import contextvars
+import functools
+import logging
+import threading
+import time
+from typing import Any, Awaitable, Callable, Coroutine, Iterable, List, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class EventLoopThread:
+    """An asyncio event loop running in a background thread
+
+    PluginsRunner keeps one per task, so every async plugin shares the same
+    loop, whether it was started from the main thread or from a worker thread
+    running plugins concurrently. The thread is started on first use.
+    """
+
+    def __init__(self) -> None:
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=loop.run_forever, name="plugin-event-loop", daemon=True
+                )
+                thread.start()
+                self._loop, self._thread = loop, thread
+            return self._loop
+
+    @property
+    def is_running(self) -> bool:
+        return self._loop is not None
+
+    def run(self, coro: Coroutine[Any, Any, T]) -> T:
+        """Run a coroutine in the loop and wait for its result
+
+        The coroutine runs in a copy of the caller's context, so e.g. the
+        current tracing span is kept.
+        """
+        loop = self._ensure_started()
+        outcome: concurrent.futures.Future = concurrent.futures.Future()
+
+        def copy_outcome(task: asyncio.Task) -> None:
+            if task.cancelled():
+                outcome.cancel()
+            elif task.exception() is not None:
+                outcome.set_exception(task.exception())
+            else:
+                outcome.set_result(task.result())
+
+        def start_task() -> None:
+            # a task copies the current context, which is the caller's one here
+            loop.create_task(coro).add_done_callback(copy_outcome)
+
+        loop.call_soon_threadsafe(start_task, context=contextvars.copy_context())
+        return outcome.result()
+
+    def close(self) -> None:
+        """Cancel tasks left behind by plugins and stop the loop"""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is None or thread is None:
+            return
+
+        async def cancel_pending_tasks() -> None:
+            current = asyncio.current_task()
+            pending = [task for task in asyncio.all_tasks() if task is not current]
+            for task in pending:
+                task.cancel()
+            if pending:
+                logger.debug("cancelling %d unfinished async tasks", len(pending))
+                await asyncio.gather(*pending, return_exceptions=True)
+            await loop.shutdown_asyncgens()
+
+        asyncio.run_coroutine_threadsafe(cancel_pending_tasks(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+async def run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking call, e.g. of a requests session or koji, in the loop's executor
+
+    requests and koji have no asyncio API, this lets async plugins overlap
+    such calls without blocking the shared loop.
+    """
+    loop = asyncio.get_running_loop()
+    call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+    return await loop.run_in_executor(None, call)
+
+
+async def gather_limited(aws: Iterable[Awaitable[T]], limit: int) -> List[T]:
+    """Like asyncio.gather, but with at most ``limit`` awaitables running at once
+
+    :raises: the first exception raised by any of the awaitables
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def limited(aw: Awaitable[T]) -> T:
+        async with semaphore:
+            return await aw
+
+    return list(await asyncio.gather(*(limited(aw) for aw in aws)))
+
+
+async def poll(check: Callable[[], Optional[T]], interval: float, timeout: float) -> T:
+    """Call the blocking ``check`` until it returns a value which is not None
+
+    Unlike time.sleep() based polling, waiting between the checks does not
+    occupy a thread, so many resources (composes, requests) can be awaited
+    at once.
+
+    :raises TimeoutError: if ``check`` did not return a value in time
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        value = await run_blocking(check)
+        if value is not None:
+            return value
+        if time.monotonic() + interval > deadline:
+            raise TimeoutError(f"no result after {timeout} seconds")
+        await asyncio.sleep(interval)
@@ -13,7 +13,7 @@ import requests
 import time
 from typing import List, Dict
 
-from atomic_reactor.constants import REMOTE_SOURCE_TARBALL_FILENAME
+from atomic_reactor.constants import DOWNLOAD_SEGMENTS, REMOTE_SOURCE_TARBALL_FILENAME
 from atomic_reactor.download import download_url
 from atomic_reactor.util import get_retrying_requests_session
 
@@ -183,7 +183,7 @@ class CachitoAPI(object):
         url = self.assemble_download_url(request_id)
         dest_path = download_url(
             url, dest_dir=dest_dir, insecure=not self.session.verify, session=self.session,
-            dest_filename=dest_filename, verify_cachito_digest=True)
+            dest_filename=dest_filename, verify_cachito_digest=True, segments=DOWNLOAD_SEGMENTS)
         logger.debug('Sources bundle for request %d downloaded to %s', request_id, dest_path)
         return dest_path
 
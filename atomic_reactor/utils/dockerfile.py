@@ -0,0 +1,129 @@
+"""
+Copyright (c) 2023 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+
+
+Dockerfile parser which parses a Dockerfile only when it changes
+"""
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from dockerfile_parse import DockerfileParser
+
+logger = logging.getLogger(__name__)
+
+StatKey = Tuple[int, int, int, int]
+
+
+@dataclass
+class _ParsedDockerfile:
+    stat_key: StatKey
+    structure: List[Dict[str, Any]]
+    # values computed from the structure, e.g. labels, per parent env and build args
+    derived: Dict[Hashable, Any] = field(default_factory=dict)
+
+
+_parsed_dockerfiles: Dict[str, _ParsedDockerfile] = {}
+_lock = threading.Lock()
+
+
+def _stat_key(path: str) -> StatKey:
+    stat = os.stat(path)
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns, stat.st_ctime_ns
+
+
+def forget_parsed_dockerfile(path: str) -> None:
+    with _lock:
+        _parsed_dockerfiles.pop(os.path.abspath(path), None)
+
+
+class CachedDockerfileParser(DockerfileParser):
+    """DockerfileParser sharing the parsed Dockerfile between instances
+
+    Plugins create a new parser whenever they look at the Dockerfile, and
+    every property of DockerfileParser (labels, envs, parent_images, ...)
+    parses the whole file again. This parser keeps the parsed structure and
+    the values derived from it per file, for as long as the inode, size and
+    modification time of the file stay the same. Writes through any parser
+    drop the cached data right away, even if the file system timestamps are
+    too coarse to tell the write apart.
+    """
+
+    def _get_parsed(self) -> Optional[_ParsedDockerfile]:
+        if self.fileobj is not None or self.cache_content:
+            return None
+        path = os.path.abspath(self.dockerfile_path)
+        try:
+            stat_key = _stat_key(path)
+        except OSError:
+            return None
+        with _lock:
+            parsed = _parsed_dockerfiles.get(path)
+        if parsed is None or parsed.stat_key != stat_key:
+            parsed = _ParsedDockerfile(stat_key, super().structure)
+            with _lock:
+                _parsed_dockerfiles[path] = parsed
+        return parsed
+
+    def _get_derived(self, key: Tuple[Any, ...], compute: Callable[[], Any]) -> Any:
+        parsed = self._get_parsed()
+        if parsed is None:
+            return compute()
+        try:
+            cache_key = key + (
+                frozenset(self.parent_env.items()), frozenset(self.build_args.items())
+            )
+            return parsed.derived[cache_key]
+        except TypeError:
+            # parent env or build args values which are not hashable
+            return compute()
+        except KeyError:
+            value = parsed.derived[cache_key] = compute()
+            return value
+
+    def _forget(self) -> None:
+        if self.fileobj is None:
+            forget_parsed_dockerfile(self.dockerfile_path)
+
+    @property
+    def structure(self):
+        parsed = self._get_parsed()
+        if parsed is None:
+            return super().structure
+        return [dict(instruction) for instruction in parsed.structure]
+
+    @property
+    def parent_images(self):
+        return list(self._get_derived(
+            ("parent_images",), lambda: DockerfileParser.parent_images.fget(self)
+        ))
+
+    @parent_images.setter
+    def parent_images(self, parents):
+        DockerfileParser.parent_images.fset(self, parents)
+
+    @contextmanager
+    def _open_dockerfile(self, mode):
+        # all reads and writes of DockerfileParser go through here
+        try:
+            with super()._open_dockerfile(mode) as dockerfile:
+                yield dockerfile
+        finally:
+            if "w" in mode:
+                self._forget()
+
+    def _instruction_getter(self, name, env_replace):
+        def compute():
+            result = DockerfileParser._instruction_getter(self, name, env_replace)
+            return type(result), dict(result)
+
+        # Labels, Envs and Args write through the parser they are bound to
+        result_type, values = self._get_derived((name, env_replace), compute)
+        return result_type(dict(values), self)
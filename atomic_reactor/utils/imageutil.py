@@ -6,13 +6,12 @@ This software may be modified and distributed under the terms
 of the BSD license. See the LICENSE file for details.
 """
 
-import functools
 import subprocess
 import logging
 import tarfile
 import json
 
-from typing import Optional, Union, Dict, List, Any
+from typing import Optional, Union, Dict, List, Any, Sequence, Tuple
 from pathlib import Path
 
 from osbs.utils import ImageName
@@ -57,6 +56,10 @@ class ImageUtil:
         """
         self._dockerfile_images = dockerfile_images
         self._conf = conf
+        # Important: the keys must have the image name as a string, not an ImageName.
+        #   While the ImageName object *is* hashable, it is also mutable, which can lead
+        #   to very unpleasant bugs.
+        self._inspect_cache: Dict[Tuple[str, Optional[str]], ImageInspectionData] = {}
 
     def set_dockerfile_images(self, dockerfile_images: util.DockerfileImages) -> None:
         """Set a new dockerfile_images instance."""
@@ -96,21 +99,65 @@ class ImageUtil:
 
         return self.get_inspect_for_image(base_image, platform)
 
-    @functools.lru_cache(maxsize=None)
+    def get_inspect_for_image_platforms(
+        self, image: Union[str, ImageName], platforms: Sequence[str]
+    ) -> Dict[str, ImageInspectionData]:
+        """Inspect an image for several platforms at once.
+
+        Like calling get_inspect_for_image for each platform, but the manifests of
+        the image are fetched only once, and the images for the platforms which
+        are not cached yet are inspected concurrently.
+
+        :param image: The image to inspect
+        :param platforms: The platforms to inspect the image for, platform or GOARCH names
+        :return: dict of inspected images, with the platforms as keys
+        """
+        if not image_is_inspectable(image):
+            raise ValueError(f"{image!r} is not inspectable")
+
+        image_str = str(image)
+        goarches = {platform: self._conf.platform_to_goarch_mapping[platform]
+                    for platform in platforms}
+        missing = [goarch for goarch in dict.fromkeys(goarches.values())
+                   if (image_str, goarch) not in self._inspect_cache]
+        if missing:
+            parsed_image = ImageName.parse(image_str)
+            client = self._get_registry_client(parsed_image.registry)
+            for goarch, inspect in client.get_inspect_for_arches(parsed_image, missing).items():
+                self._inspect_cache[(image_str, goarch)] = inspect
+
+        return {platform: self._inspect_cache[(image_str, goarch)]
+                for platform, goarch in goarches.items()}
+
+    def base_image_inspect_for_platforms(
+        self, platforms: Sequence[str]
+    ) -> Dict[str, ImageInspectionData]:
+        """Inspect the base image for several platforms at once.
+
+        If the base image is scratch or custom, return an empty dict for each platform.
+
+        :param platforms: The platforms to inspect the base image for, platform or GOARCH names
+        """
+        base_image: Union[str, ImageName] = self._dockerfile_images.base_image
+        if not image_is_inspectable(base_image):
+            return {platform: {} for platform in platforms}
+
+        return self.get_inspect_for_image_platforms(base_image, platforms)
+
     def _cached_inspect_image(
         self, image: str, goarch: Optional[str] = None
     ) -> ImageInspectionData:
-        # Important: this method must take the image name as a string, not an ImageName.
-        #   The functools cache decorator maps inputs to outputs in a dict. While the
-        #   ImageName object *is* hashable, it is also mutable, which can lead to very
-        #   unpleasant bugs.
-        parsed_image = ImageName.parse(image)
-        client = self._get_registry_client(parsed_image.registry)
-        return client.get_inspect_for_image(parsed_image, goarch)
+        key = (image, goarch)
+        if key not in self._inspect_cache:
+            parsed_image = ImageName.parse(image)
+            client = self._get_registry_client(parsed_image.registry)
+            self._inspect_cache[key] = client.get_inspect_for_image(parsed_image, goarch)
+        return self._inspect_cache[key]
 
     def _get_registry_client(self, registry: str) -> util.RegistryClient:
         session = util.RegistrySession.create_from_config(self._conf, registry)
-        return util.RegistryClient(session)
+        # parent images are not expected to move during a build
+        return util.RegistryClient(session, resolve_tags_from_cache=True)
 
     def extract_file_from_image(self, image: Union[str, ImageName],
                                 src_path: str, dst_path: str) -> None:
@@ -0,0 +1,194 @@
+"""
+Copyright (c) 2023 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+
+
+Tracing and per-endpoint metrics of the requests sent to container registries
+"""
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from requests import RequestException, Response
+from otel_extensions import get_tracer
+
+from atomic_reactor.constants import OTEL_SERVICE_NAME, REGISTRY_LATENCY_BUCKETS
+
+logger = logging.getLogger(__name__)
+
+REGISTRY_PATH_RE = re.compile(r'/v2/(?P<repository>.+)/(?P<kind>manifests|blobs|tags)/(?P<rest>.*)')
+
+
+def classify_registry_url(url: str) -> Tuple[str, Optional[str]]:
+    """Get the endpoint type and the repository of a registry API URL
+
+    :return: tuple, endpoint type (manifest, blob, upload, mount, tags, ping
+        or other) and the repository, if the URL has one
+    """
+    parsed = urlparse(url)
+    match = REGISTRY_PATH_RE.search(parsed.path)
+    if not match:
+        return ('ping' if parsed.path.rstrip('/').endswith('/v2') else 'other'), None
+
+    kind, repository = match.group('kind'), match.group('repository')
+    if kind == 'manifests':
+        return 'manifest', repository
+    if kind == 'tags':
+        return 'tags', repository
+    if match.group('rest').startswith('uploads'):
+        # cross-repository blob mount, see the distribution spec
+        if 'mount' in parse_qs(parsed.query):
+            return 'mount', repository
+        return 'upload', repository
+    return 'blob', repository
+
+
+@dataclass
+class EndpointMetrics:
+    """Requests sent to one type of endpoint of one registry"""
+
+    requests: int = 0
+    # requests which failed without a response, e.g. connection errors
+    errors: int = 0
+    # retries done by the retrying session, not included in requests
+    retries: int = 0
+    # sizes of the responses, based on the Content-Length header
+    response_bytes: int = 0
+    latency_seconds: float = 0.0
+    # number of requests per latency bucket, see REGISTRY_LATENCY_BUCKETS
+    latency_histogram: List[int] = field(
+        default_factory=lambda: [0] * (len(REGISTRY_LATENCY_BUCKETS) + 1)
+    )
+    status_codes: Dict[str, int] = field(default_factory=dict)
+
+    def record(self, duration: float, response: Optional[Response],
+               retries: int) -> None:
+        self.requests += 1
+        self.retries += retries
+        self.latency_seconds += duration
+        bucket = next((i for i, bound in enumerate(REGISTRY_LATENCY_BUCKETS) if duration <= bound),
+                      len(REGISTRY_LATENCY_BUCKETS))
+        self.latency_histogram[bucket] += 1
+        if response is None:
+            self.errors += 1
+            return
+        self.response_bytes += _response_size(response)
+        status = str(response.status_code)
+        self.status_codes[status] = self.status_codes.get(status, 0) + 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        bounds = [str(bound) for bound in REGISTRY_LATENCY_BUCKETS] + ['+Inf']
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'retries': self.retries,
+            'response_bytes': self.response_bytes,
+            'latency_seconds': round(self.latency_seconds, 3),
+            'latency_histogram': dict(zip(bounds, self.latency_histogram)),
+            'status_codes': dict(self.status_codes),
+        }
+
+
+_metrics: Dict[Tuple[str, str], EndpointMetrics] = {}
+_metrics_lock = threading.Lock()
+
+
+def _response_size(response: Response) -> int:
+    try:
+        return int(response.headers.get('Content-Length', 0))
+    except ValueError:
+        return 0
+
+
+def _retries_of(response: Optional[Response]) -> int:
+    # urllib3 keeps the history of the retries in the Retry object of the response
+    retry = getattr(getattr(response, 'raw', None), 'retries', None)
+    return len(getattr(retry, 'history', None) or ())
+
+
+def record_registry_request(host: str, endpoint: str, duration: float,
+                            response: Optional[Response], retries: int = 0) -> None:
+    with _metrics_lock:
+        metrics = _metrics.setdefault((host, endpoint), EndpointMetrics())
+        metrics.record(duration, response, retries)
+
+
+def instrumented_request(
+    send: Callable[[], Response], method: str, url: str,
+    endpoint: Optional[str] = None,
+) -> Response:
+    """Send a registry request in a tracing span and record its metrics
+
+    :param send: callable sending the request
+    :param method: str, HTTP method, for the span
+    :param url: str, the requested URL
+    :param endpoint: str, endpoint type, e.g. 'token'; guessed from the URL if not set
+    :return: the response returned by send
+    """
+    repository = None
+    if endpoint is None:
+        endpoint, repository = classify_registry_url(url)
+    host = urlparse(url).netloc
+
+    tracer = get_tracer(module_name=__name__, service_name=OTEL_SERVICE_NAME)
+    with tracer.start_as_current_span(f'registry {endpoint}') as span:
+        span.set_attribute('http.method', method)
+        span.set_attribute('registry.host', host)
+        span.set_attribute('registry.endpoint', endpoint)
+        if repository:
+            span.set_attribute('registry.repository', repository)
+
+        start = time.monotonic()
+        response = None
+        try:
+            response = send()
+            return response
+        except RequestException as e:
+            response = e.response
+            raise
+        finally:
+            retries = _retries_of(response)
+            record_registry_request(host, endpoint, time.monotonic() - start, response,
+                                    retries)
+            span.set_attribute('registry.retries', retries)
+            if response is not None:
+                span.set_attribute('http.status_code', response.status_code)
+                span.set_attribute('registry.response_bytes', _response_size(response))
+
+
+def get_registry_metrics() -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """
+    Get the metrics of the registry requests sent by this process
+
+    :return: dict, registry host mapped to a dict of endpoint types mapped to
+        their metrics, see EndpointMetrics
+    """
+    with _metrics_lock:
+        metrics = {key: endpoint_metrics.as_dict()
+                   for key, endpoint_metrics in _metrics.items()}
+
+    by_host: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    for (host, endpoint), endpoint_metrics in sorted(metrics.items()):
+        by_host.setdefault(host, {})[endpoint] = endpoint_metrics
+    return by_host
+
+
+def reset_registry_metrics() -> None:
+    with _metrics_lock:
+        _metrics.clear()
+
+
+def log_registry_metrics() -> None:
+    for host, endpoints in get_registry_metrics().items():
+        for endpoint, metrics in endpoints.items():
+            logger.info('%s %s: %d requests (%d errors, %d retries), %d bytes in %.3fs, '
+                        'status codes: %s', host, endpoint, metrics['requests'],
+                        metrics['errors'], metrics['retries'], metrics['response_bytes'],
+                        metrics['latency_seconds'], metrics['status_codes'])
@@ -7,12 +7,15 @@ of the BSD license. See the LICENSE file for details.
 """
 
 import backoff
+import base64
+import binascii
 import logging
 import os
 import paramiko
 import random
 import time
 from contextlib import contextmanager
+from dataclasses import dataclass
 from datetime import datetime
 from functools import cached_property
 from shlex import quote
@@ -28,6 +31,17 @@ RETRY_ON_SSH_EXCEPTIONS = (paramiko.ssh_exception.NoValidConnectionsError,
 BACKOFF_FACTOR = 0.5
 # max last wait fime will be 128s
 MAX_RETRIES = 8
+# Reads all slot files in one go, prints a line per slot:
+#   <slot id> <mtime> <flock exit code, 0 or 42 if locked> <base64 encoded content>
+SCAN_SLOTS_SCRIPT = (
+    'cd {slots_dir} || exit 1; '
+    'for i in {slot_ids}; do '
+    'f=slot_$i; touch "$f" || exit 1; '
+    'flock --conflict-exit-code 42 --nonblocking "$f.lock" true; l=$?; '
+    'printf "%s %s %s " "$i" "$(stat -c %Y "$f")" "$l"; '
+    'base64 -w 0 "$f" || exit 1; echo; '
+    'done'
+)
 
 logger = logging.getLogger(__name__)
 
@@ -144,6 +158,23 @@ class SlotData:
         return datetime.fromisoformat(self.timestamp)
 
 
+@dataclass
+class SlotStatus:
+    """ State of a slot, as read by RemoteHost.scan_slots """
+
+    id: int
+    data: SlotData
+    # modification time of the slot file, in seconds since the epoch
+    mtime: int
+    # whether the lock of the slot is held right now, e.g. by a client locking it
+    locked: bool
+
+    @property
+    def is_free(self) -> bool:
+        """ Free or corrupted slots can be locked, see HostSlot.lock """
+        return self.data.is_empty or not self.data.is_valid
+
+
 class RemoteHost:
 
     def __init__(
@@ -457,16 +488,50 @@ class RemoteHost:
                            self.hostname, slot_id, prid)
         return unlocked
 
+    def scan_slots(self) -> List[SlotStatus]:
+        """ Read the state of all slots with a single remote command
+
+        :return: list of SlotStatus, ordered by slot ID
+        """
+        cmd = SCAN_SLOTS_SCRIPT.format(slots_dir=quote(self.slots_dir),
+                                       slot_ids=" ".join(str(i) for i in range(self.slots)))
+        _errmsg = f"{self.hostname}: cannot read slots"
+        try:
+            stdout, stderr, code = self._run(cmd)
+        except Exception as ex:
+            raise SlotReadError(_errmsg) from ex
+
+        if code != 0:
+            _errmsg = f"{_errmsg}: {stderr}" if stderr else _errmsg
+            raise SlotReadError(_errmsg)
+
+        statuses = []
+        for line in stdout.splitlines():
+            try:
+                slot_id, mtime, lock_code, content = (line.split(" ", 3) + [""])[:4]
+                content = base64.b64decode(content, validate=True).decode().strip()
+                status = SlotStatus(id=int(slot_id), data=SlotData.from_string(content),
+                                    mtime=int(mtime), locked=int(lock_code) == 42)
+            except (ValueError, binascii.Error) as ex:
+                raise SlotReadError(f"{_errmsg}: unexpected output {line!r}") from ex
+            statuses.append(status)
+
+        if [status.id for status in statuses] != list(range(self.slots)):
+            raise SlotReadError(f"{_errmsg}: unexpected output {stdout!r}")
+        return statuses
+
     def available_slots(self) -> List[int]:
         """ Get slots on host which are in free state """
         logger.debug("%s: retrieve list of available slots", self.hostname)
         available_slots = []
-        with self._ssh_session() as ssh_session:
-            for slot_id in range(self.slots):
-                if not self.is_free(slot_id, ssh_session):
-                    logger.debug("%s: slot %s is not free", self.hostname, slot_id)
-                    continue
-                available_slots.append(slot_id)
+        for status in self.scan_slots():
+            if not status.is_free:
+                logger.debug("%s: slot %s is not free", self.hostname, status.id)
+            elif status.locked:
+                # another client is locking or unlocking it right now
+                logger.debug("%s: slot %s is being locked", self.hostname, status.id)
+            else:
+                available_slots.append(status.id)
 
         return available_slots
 
@@ -561,12 +626,14 @@ class HostSlot:
 
     def lock(self, prid: str) -> bool:
         """ Lock the slot for a pipelinerun """
-        if not self.is_free and self.is_valid:
+        # read the slot file once
+        slot_data = self._data
+        if not slot_data.is_empty and slot_data.is_valid:
             logger.debug("%s: slot %s is not free, unable to lock it",
                          self.hostname, self.id)
             return False
 
-        if not self.is_valid:
+        if not slot_data.is_valid:
             logger.warning("%s: slot %s contains invalid content, it's corrupted, "
                            "will use it.", self.hostname, self.id)
 
@@ -576,18 +643,20 @@ class HostSlot:
 
     def unlock(self, prid: str) -> bool:
         """ Unlock the slot for a pipelinerun """
-        if self.is_free:
+        # read the slot file once
+        slot_data = self._data
+        if slot_data.is_empty:
             logger.warning("%s: slot %s is free, skip unlocking", self.hostname, self.id)
             # Should we return False instead?
             return True
 
-        if not self.is_valid:
+        if not slot_data.is_valid:
             logger.warning("%s: slot %s contains invalid content, it's corrupted, "
                            "will unlock it.", self.hostname, self.id)
             self._write()
             return True
 
-        if not self.is_locked_by(prid):
+        if slot_data.prid != prid:
             logger.warning("%s: cannot unlock slot %s, it's not locked by %s",
                            self.hostname, self.id, prid)
             return False
@@ -8,19 +8,24 @@ of the BSD license. See the LICENSE file for details.
 
 import logging
 import subprocess
-from typing import List
+import threading
+from typing import Dict, Hashable, List, Optional
 
 import backoff
 import requests
 from requests.adapters import HTTPAdapter
+from urllib3 import HTTPConnectionPool
 from urllib3.util import Retry
 
 from atomic_reactor.constants import (HTTP_CLIENT_STATUS_RETRY,
                                       HTTP_MAX_RETRIES,
                                       HTTP_BACKOFF_FACTOR,
                                       HTTP_REQUEST_TIMEOUT,
+                                      HTTP_POOL_CONNECTIONS,
+                                      HTTP_POOL_MAXSIZE,
                                       SUBPROCESS_MAX_RETRIES,
                                       SUBPROCESS_BACKOFF_FACTOR)
+from atomic_reactor.profiling import hook_record_http_response
 
 logger = logging.getLogger(__name__)
 
@@ -38,6 +43,25 @@ class SessionWithTimeout(requests.Session):
         return super(SessionWithTimeout, self).request(*args, **kwargs)
 
 
+class SharedHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter shared by all sessions with the same retry policy and pool sizes
+
+    The adapter holds the connection pools, sharing it lets the sessions
+    created all over atomic-reactor reuse open (TLS) connections to the same
+    hosts. The pools live as long as the process, closing a session which
+    uses the adapter does not close them.
+    """
+
+    def close(self):
+        pass
+
+
+_shared_adapters: Dict[Hashable, SharedHTTPAdapter] = {}
+_shared_sessions: Dict[Hashable, requests.Session] = {}
+_shared_lock = threading.Lock()
+
+
 # This is a hook to mock during tests to temporarily disable retries
 def _http_retries_disabled():
     return False
@@ -56,32 +80,108 @@ def hook_log_error_response_content(response, *args, **kwargs):
         )
 
 
-def get_retrying_requests_session(client_statuses=HTTP_CLIENT_STATUS_RETRY,
-                                  times=HTTP_MAX_RETRIES, delay=HTTP_BACKOFF_FACTOR,
-                                  allowed_methods=None, raise_on_status=True):
+def _get_shared_adapter(client_statuses, times, delay, allowed_methods, raise_on_status,
+                        pool_connections, pool_maxsize) -> SharedHTTPAdapter:
     if _http_retries_disabled():
         times = 0
+    if allowed_methods:
+        allowed_methods = frozenset(allowed_methods)
+    key = (tuple(client_statuses), int(times), delay, allowed_methods, raise_on_status,
+           pool_connections, pool_maxsize)
+
+    with _shared_lock:
+        adapter = _shared_adapters.get(key)
+        if adapter is not None:
+            return adapter
+
+        retry = Retry(
+            total=int(times),
+            backoff_factor=delay,
+            status_forcelist=client_statuses,
+            allowed_methods=allowed_methods
+        )
 
-    retry = Retry(
-        total=int(times),
-        backoff_factor=delay,
-        status_forcelist=client_statuses,
-        allowed_methods=allowed_methods
-    )
+        # raise_on_status was added later to Retry, adding compatibility to work
+        # with newer versions and ignoring this option with older ones
+        if hasattr(retry, 'raise_on_status'):
+            retry.raise_on_status = raise_on_status
 
-    # raise_on_status was added later to Retry, adding compatibility to work
-    # with newer versions and ignoring this option with older ones
-    if hasattr(retry, 'raise_on_status'):
-        retry.raise_on_status = raise_on_status
+        adapter = SharedHTTPAdapter(pool_connections=pool_connections,
+                                    pool_maxsize=pool_maxsize,
+                                    max_retries=retry)
+        _shared_adapters[key] = adapter
+        return adapter
+
+
+def get_retrying_requests_session(client_statuses=HTTP_CLIENT_STATUS_RETRY,
+                                  times=HTTP_MAX_RETRIES, delay=HTTP_BACKOFF_FACTOR,
+                                  allowed_methods=None, raise_on_status=True,
+                                  pool_connections=HTTP_POOL_CONNECTIONS,
+                                  pool_maxsize=HTTP_POOL_MAXSIZE):
+    adapter = _get_shared_adapter(client_statuses, times, delay, allowed_methods,
+                                  raise_on_status, pool_connections, pool_maxsize)
 
     session = SessionWithTimeout()
-    session.mount('http://', HTTPAdapter(max_retries=retry))
-    session.mount('https://', HTTPAdapter(max_retries=retry))
-    session.hooks['response'] = [hook_log_error_response_content]
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.hooks['response'] = [hook_log_error_response_content, hook_record_http_response]
+
+    return session
+
+
+def get_shared_requests_session(key: Hashable, **kwargs) -> requests.Session:
+    """
+    Get the retrying session shared by all callers using the same key
+
+    Unlike sessions which only share connections, a shared session also
+    keeps e.g. cookies. Callers must pass auth and verify with each request.
 
+    :param key: identifies the remote service and the credentials used for it
+    :param kwargs: retry policy and pool sizes, see get_retrying_requests_session()
+    """
+    session_key = (key, _http_retries_disabled(), tuple(sorted(kwargs.items())))
+    with _shared_lock:
+        session = _shared_sessions.get(session_key)
+    if session is None:
+        session = get_retrying_requests_session(**kwargs)
+        with _shared_lock:
+            session = _shared_sessions.setdefault(session_key, session)
     return session
 
 
+def get_connection_stats() -> Dict[str, Dict[str, int]]:
+    """
+    Count the connections opened and the requests sent to each host
+
+    Only hosts whose connection pools are still kept by the shared adapters
+    are included.
+
+    :return: dict, "scheme://host:port" mapped to a dict with the number of
+        "connections" and "requests"
+    """
+    with _shared_lock:
+        adapters = list(_shared_adapters.values())
+
+    stats: Dict[str, Dict[str, int]] = {}
+    for adapter in adapters:
+        pools = adapter.poolmanager.pools
+        for pool_key in pools.keys():
+            pool: Optional[HTTPConnectionPool] = pools.get(pool_key)
+            if pool is None:
+                continue
+            host_stats = stats.setdefault(f'{pool.scheme}://{pool.host}:{pool.port}',
+                                          {'connections': 0, 'requests': 0})
+            host_stats['connections'] += pool.num_connections
+            host_stats['requests'] += pool.num_requests
+    return stats
+
+
+def log_connection_stats() -> None:
+    for host, host_stats in sorted(get_connection_stats().items()):
+        logger.debug('%s: %d requests over %d connections',
+                     host, host_stats['requests'], host_stats['connections'])
+
+
 @backoff.on_exception(
     backoff.expo,
     subprocess.CalledProcessError,
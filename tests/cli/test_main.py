@@ -14,6 +14,7 @@ import pytest
 
 import atomic_reactor
 from atomic_reactor.cli import main, parser, task
+from atomic_reactor import util
 
 
 @pytest.mark.parametrize(
@@ -43,3 +44,48 @@ def test_run(verbose, quiet, expect_loglevel):
     flexmock(atomic_reactor).should_receive("set_logging").with_args(level=expect_loglevel)
     flexmock(osbs).should_receive("set_logging").with_args(level=expect_loglevel)
     main.run()
+
+
+@pytest.mark.parametrize("precompile", [False, True])
+def test_run_precompile_schemas(precompile):
+    flexmock(task).should_receive("source_container_build").with_args({"user_params": "{}"})
+    (
+        flexmock(parser)
+        .should_receive("parse_args")
+        .and_return(
+            {
+                "verbose": False,
+                "quiet": False,
+                "precompile_schemas": precompile,
+                "user_params": "{}",
+                "func": task.source_container_build,
+            }
+        )
+    )
+    flexmock(util.schema_registry).should_receive("precompile").times(int(precompile)).and_return(0)
+    main.run()
+
+
+@pytest.mark.parametrize("token_cache_file", [None, "/workspace/tokens.json"])
+def test_run_registry_token_cache(token_cache_file):
+    flexmock(task).should_receive("source_container_build").with_args({"user_params": "{}"})
+    (
+        flexmock(parser)
+        .should_receive("parse_args")
+        .and_return(
+            {
+                "verbose": False,
+                "quiet": False,
+                "registry_token_cache": token_cache_file,
+                "user_params": "{}",
+                "func": task.source_container_build,
+            }
+        )
+    )
+    (
+        flexmock(main)
+        .should_receive("set_token_cache_file")
+        .with_args(token_cache_file)
+        .times(int(bool(token_cache_file)))
+    )
+    main.run()
@@ -28,6 +28,8 @@ SOURCE_URI = "git://example.org/namespace/repo"
 EXPECTED_ARGS = {
     "quiet": False,
     "verbose": False,
+    "precompile_schemas": False,
+    "registry_token_cache": None,
     "build_dir": BUILD_DIR,
     "context_dir": CONTEXT_DIR,
     "config_file": constants.REACTOR_CONFIG_FULL_PATH,
@@ -48,6 +50,8 @@ EXPECTED_ARGS_CONTAINER_PREBUILD = {
 EXPECTED_ARGS_JOB = {
     "quiet": False,
     "verbose": False,
+    "precompile_schemas": False,
+    "registry_token_cache": None,
     "config_file": constants.REACTOR_CONFIG_FULL_PATH,
     "namespace": JOB_NAMESPACE,
 }
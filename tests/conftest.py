@@ -12,6 +12,7 @@ from pathlib import Path
 import pytest
 import requests
 import requests.exceptions
+from atomic_reactor.auth import bearer_token_cache
 from atomic_reactor.constants import DOCKERFILE_FILENAME
 from atomic_reactor.dirs import ContextDir, RootBuildDir
 from atomic_reactor.source import DummySource
@@ -131,3 +132,9 @@ def local_fake_repo(tmpdir):
     dockerfile.write('CMD ["httpd"]', mode="a")
     call(["git", "commit", "-a", "-m", "change cmd to httpd"])
     return repo_path
+
+
+@pytest.fixture(autouse=True)
+def clear_bearer_token_cache():
+    """Do not share registry tokens between tests"""
+    bearer_token_cache.clear()
@@ -14,6 +14,8 @@ HERE = os.path.dirname(__file__)
 FILES = os.path.join(HERE, 'files')
 
 MOCK = os.environ.get('NOMOCK') is None
+# benchmarks print timings but do not assert them, they are only run on demand
+BENCHMARK = os.environ.get('BENCHMARK') is not None
 
 INPUT_IMAGE = "busybox:latest"
 DOCKERFILE_FILENAME = 'Dockerfile'
@@ -147,4 +149,8 @@ skip_koji_check_for_base_image: False
 deep_manifest_list_inspection: True
 
 fail_on_digest_mismatch: True
+
+artifact_cache:
+    path: /var/cache/atomic-reactor/artifacts
+    max_size: 1073741824
 """)
@@ -623,25 +623,26 @@ def mock_koji_manifest_download(source_dir: Path, requests_mock,
         f = io.BytesIO(remote_bytes)
         return f
 
+    def register_download(url, body_callback):
+        # large files are probed with HEAD for range support
+        requests_mock.register_uri('HEAD', url, content=b'')
+        requests_mock.register_uri('GET', url, body=body_callback)
+
     for archive in [REMOTE_SOURCE_TARBALL_FILENAME, REMOTE_SOURCE_JSON_FILENAME]:
         body_callback = body_remote_callback
         if archive.endswith('json'):
             body_callback = body_remote_json_callback
 
-        requests_mock.register_uri('GET', get_remote_url(KOJI_BUILD_RS, file_name=archive),
-                                   body=body_callback)
-        requests_mock.register_uri('GET', get_remote_url(KOJI_PARENT_BUILD_RS, file_name=archive),
-                                   body=body_callback)
+        register_download(get_remote_url(KOJI_BUILD_RS, file_name=archive), body_callback)
+        register_download(get_remote_url(KOJI_PARENT_BUILD_RS, file_name=archive), body_callback)
 
     for archive in ALL_ARCHIVE_NAMES:
         body_callback = body_remote_callback
         if archive.endswith('json'):
             body_callback = body_remote_json_callback
 
-        requests_mock.register_uri('GET', get_remote_url(KOJI_BUILD_MRS, file_name=archive),
-                                   body=body_callback)
-        requests_mock.register_uri('GET', get_remote_url(KOJI_PARENT_BUILD_MRS, file_name=archive),
-                                   body=body_callback)
+        register_download(get_remote_url(KOJI_BUILD_MRS, file_name=archive), body_callback)
+        register_download(get_remote_url(KOJI_PARENT_BUILD_MRS, file_name=archive), body_callback)
 
     requests_mock.register_uri('GET', get_pnc_source_url(),
                                body=body_remote_callback)
@@ -654,13 +655,10 @@ def mock_koji_manifest_download(source_dir: Path, requests_mock,
                                headers={'Location': get_pnc_source_url()},
                                body=body_remote_callback,
                                status_code=302)
-    requests_mock.register_uri('GET', get_kojifile_source_mead_url(KOJI_MEAD_BUILD,
-                                                                   KOJIFILE_MEAD_SOURCE_ARCHIVE),
-                               body=body_remote_callback)
-    requests_mock.register_uri('GET', get_remote_file_url(KOJI_BUILD_RS),
-                               body=body_remote_callback)
-    requests_mock.register_uri('GET', get_remote_file_url(KOJI_PARENT_BUILD_RS),
-                               body=body_remote_callback)
+    register_download(get_kojifile_source_mead_url(KOJI_MEAD_BUILD, KOJIFILE_MEAD_SOURCE_ARCHIVE),
+                      body_remote_callback)
+    register_download(get_remote_file_url(KOJI_BUILD_RS), body_remote_callback)
+    register_download(get_remote_file_url(KOJI_PARENT_BUILD_RS), body_remote_callback)
 
 
 @pytest.mark.usefixtures('user_params')
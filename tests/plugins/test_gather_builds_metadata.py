@@ -151,6 +151,10 @@ def test_gather_builds_metadata(has_s390x_build_logs, workflow: DockerBuildWorkf
     task_results = {'binary-container-build-x86-64': {'task_result': json.dumps(X86_64_HOST)},
                     'binary-container-build-s390x': {'task_result': json.dumps(S390X_HOST)}}
     flexmock(workflow.osbs).should_receive('get_task_results').and_return(task_results)
+    (flexmock(workflow.imageutil)
+     .should_receive('base_image_inspect_for_platforms')
+     .with_args(["x86_64", "s390x"])
+     .once())
 
     plugin = GatherBuildsMetadataPlugin(workflow)
 
@@ -230,6 +234,7 @@ def test_get_build_metadata_fails(task_results, remote_hosts, error_msg,
 
     flexmock(RemoteHost).should_receive('rpms_installed').and_return(None)
     flexmock(workflow.osbs).should_receive('get_task_results').and_return(task_results)
+    flexmock(workflow.imageutil).should_receive('base_image_inspect_for_platforms')
 
     plugin = GatherBuildsMetadataPlugin(workflow)
 
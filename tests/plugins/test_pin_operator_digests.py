@@ -24,7 +24,7 @@ from atomic_reactor.constants import (
     INSPECT_CONFIG,
     PLUGIN_PIN_OPERATOR_DIGESTS_KEY,
 )
-from atomic_reactor.plugin import PluginFailedException
+from atomic_reactor.plugin import PluginFailedException, build_dir_resource, resources_overlap
 from atomic_reactor.plugins.pin_operator_digest import (
     PinOperatorDigestsPlugin,
     PullspecReplacer,
@@ -293,6 +293,11 @@ def get_user_config(manifests_dir, repo_replacements=None, enable_digest_pinning
 
 
 class TestPinOperatorDigest(object):
+    @pytest.mark.parametrize('manifests_dir', ['manifests', 'bundle/manifests'])
+    def test_writes_configured_manifests_dir(self, manifests_dir):
+        written = frozenset({build_dir_resource(manifests_dir)})
+        assert resources_overlap(PinOperatorDigestsPlugin.writes, written)
+
     def test_run_only_for_operator_bundle_label(self, workflow, repo_dir, caplog):
         runner = mock_env(workflow, repo_dir, df_operator_label=False,
                           write_container_yaml=False)
@@ -32,7 +32,7 @@ from atomic_reactor.constants import (
     REMOTE_SOURCE_JSON_CONFIG_FILENAME,
     REMOTE_SOURCE_JSON_ENV_FILENAME,
 )
-from atomic_reactor.plugin import PluginFailedException
+from atomic_reactor.plugin import PluginFailedException, build_dir_resource, resources_overlap
 from atomic_reactor.plugins.resolve_remote_source import (
     RemoteSource,
     ResolveRemoteSourcePlugin,
@@ -520,6 +520,12 @@ def teardown_function(*args):
     sys.modules.pop('resolve_remote_source', None)
 
 
+@pytest.mark.parametrize('name', [None, 'first', 'second'])
+def test_writes_tarballs(name):
+    written = frozenset({build_dir_resource(RemoteSource.tarball_filename(name))})
+    assert resources_overlap(ResolveRemoteSourcePlugin.writes, written)
+
+
 def test_source_request_to_json_missing_optional_keys(workflow):
     p = ResolveRemoteSourcePlugin(workflow)
 
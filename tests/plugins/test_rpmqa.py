@@ -188,9 +188,10 @@ def test_rpmqa_plugin_rpm_query_failed(caplog, workflow, build_dir, base_from_sc
 
     log_msg_getting = 'getting rpms from rpmdb:'
 
+    # platforms are queried in parallel, all of them are attempted
     (flexmock(subprocess)
      .should_receive("check_output")
-     .once()
+     .times(len(platforms))
      .and_raise(Exception, 'rpm query failed'))
 
     with pytest.raises(Exception, match='rpm query failed'):
@@ -412,3 +412,21 @@ def test_plugin_annotations(workflow):
 
     assert annotations['foo'] == {"bar": "baz"}
     assert annotations['spam'] == ["eggs"]
+
+
+@pytest.mark.parametrize('profiles', [{}, {'add_help': {'cpu_user': 0.5, 'http_requests': 2}}])
+def test_plugin_profiles(workflow, profiles):
+    env = (MockEnv(workflow)
+           .for_plugin(StoreMetadataPlugin.key)
+           .set_plugin_args({"url": "http://example.com/"})
+           .mock_build_outcome(failed=False))
+    prepare(workflow)
+    workflow.data.plugins_profiles = dict(profiles)
+
+    output = env.create_runner().run()
+    plugins_metadata = output[StoreMetadataPlugin.key]["annotations"]["plugins-metadata"]
+
+    if profiles:
+        assert plugins_metadata["profiles"] == profiles
+    else:
+        assert "profiles" not in plugins_metadata
@@ -10,6 +10,7 @@ import json
 from dataclasses import dataclass
 from typing import Optional, ClassVar
 from copy import deepcopy
+from pathlib import Path
 
 from flexmock import flexmock
 import pytest
@@ -20,6 +21,7 @@ from atomic_reactor import inner
 from atomic_reactor import source
 from atomic_reactor import util
 from atomic_reactor.tasks import common
+from atomic_reactor.utils import registry_metrics
 
 
 TASK_ARGS = {
@@ -198,6 +200,57 @@ class TestTask:
 
         task.run()
 
+    def test_run_sets_registry_cache(self, params):
+
+        caches = []
+
+        class SomeTask(common.Task):
+            def execute(self):
+                caches.append(util.get_registry_cache())
+
+        SomeTask(params).run()
+
+        assert caches[0].path == dirs.ContextDir(Path(params.context_dir)).get_registry_cache_dir()
+        assert util.get_registry_cache() is None
+
+    def test_run_sets_checksum_registry(self, params):
+
+        registries = []
+        build_file = Path(params.context_dir) / 'build_file'
+        build_file.write_bytes(b'abc')
+
+        class SomeTask(common.Task):
+            def execute(self):
+                registries.append(util.get_checksum_registry())
+                registries[0].put(str(build_file), {'md5': 'abc-md5'})
+
+        SomeTask(params).run()
+
+        context_dir = dirs.ContextDir(Path(params.context_dir))
+        assert registries[0].path == context_dir.get_checksum_registry_file()
+        assert util.get_checksum_registry() is None
+        # saved for the next tasks once the task finished
+        saved = util.ChecksumRegistry(context_dir.get_checksum_registry_file())
+        assert saved.get(str(build_file)) == {'md5': 'abc-md5'}
+
+    def test_run_records_registry_metrics(self, params):
+
+        class SomeTask(common.Task):
+            task_name = 'some_task'
+
+            def execute(self):
+                registry_metrics.record_registry_request('reg.io', 'manifest', 0.2, None)
+
+        # metrics of a previous task in the same process are not included
+        registry_metrics.record_registry_request('reg.io', 'blob', 0.1, None)
+        task = SomeTask(params)
+        task.run()
+
+        metrics = task.workflow_data.registry_metrics['some_task']
+        assert list(metrics) == ['reg.io']
+        assert list(metrics['reg.io']) == ['manifest']
+        assert metrics['reg.io']['manifest']['requests'] == 1
+
     def test_run_task_ignores_sigterm(self, params):
 
         class TaskIgnoreSigterm(common.Task):
@@ -20,7 +20,8 @@ from atomic_reactor.tasks.common import TaskParams
 from atomic_reactor.tasks.binary import PreBuildTaskParams, BinaryPreBuildTask
 from atomic_reactor.util import DockerfileImages
 
-from atomic_reactor import inner, dirs
+from atomic_reactor import download, inner, dirs
+from atomic_reactor.config import Configuration
 from atomic_reactor.dirs import RootBuildDir, ContextDir
 from atomic_reactor.tasks import plugin_based
 
@@ -81,6 +82,8 @@ class TestPluginBasedTask:
                 user_params={"a": "b"},
                 reactor_config_path="config.yaml",
                 keep_plugins_running=False,
+                plugins_max_workers=1,
+                plugins_checkpoints=False,
             )
         )
         mocked_workflow.should_receive("build_container_image").and_raise(
@@ -122,6 +125,28 @@ class TestPluginBasedTask:
 
         assert "task default failed: something is wrong" in caplog.text
 
+    def test_execute_sets_artifact_cache(self, task_with_mocked_deps, monkeypatch, tmp_path):
+        task, mocked_workflow = task_with_mocked_deps
+        cache_dir = tmp_path / "artifacts"
+        monkeypatch.setattr(
+            Configuration, "artifact_cache",
+            property(lambda self: {"path": str(cache_dir), "max_size": 1024}),
+        )
+        caches = []
+
+        def _build_container_image():
+            caches.append(download.get_artifact_cache())
+
+        mocked_workflow.should_receive("build_container_image").replace_with(
+            _build_container_image
+        )
+
+        task.execute()
+
+        assert caches[0].path == cache_dir
+        assert caches[0].max_size == 1024
+        assert download.get_artifact_cache() is None
+
 
 @pytest.mark.parametrize(
     "build_result",
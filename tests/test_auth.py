@@ -5,13 +5,19 @@ All rights reserved.
 This software may be modified and distributed under the terms
 of the BSD license. See the LICENSE file for details.
 """
-from atomic_reactor.auth import HTTPBearerAuth, HTTPRegistryAuth, HTTPBasicAuthWithB64
+from atomic_reactor.auth import (BearerTokenCache, HTTPBearerAuth, HTTPRegistryAuth,
+                                 HTTPBasicAuthWithB64)
+from atomic_reactor.constants import BEARER_TOKEN_DEFAULT_EXPIRY, BEARER_TOKEN_EXPIRY_MARGIN
+from flexmock import flexmock
 from requests.auth import HTTPBasicAuth
 import base64
 import json
+import os
 import pytest
 import requests
 import responses
+import time
+from urllib.parse import parse_qs, urlparse
 
 
 BEARER_TOKEN = 'the-token'
@@ -28,6 +34,16 @@ def bearer_success_callback(request):
     return (200, {}, json.dumps('success'))
 
 
+def bearer_registry_callback(request):
+    if request.headers.get('Authorization') == 'Bearer {}'.format(BEARER_TOKEN):
+        return (200, {}, json.dumps('success'))
+    return bearer_unauthorized_callback(request)
+
+
+def realm_calls():
+    return [call for call in responses.calls if call.request.url.startswith(BEARER_REALM_URL)]
+
+
 def b64encode(username, password):
     return base64.b64encode('{}:{}'.format(username, password).encode('utf-8')).decode('utf-8')
 
@@ -124,6 +140,101 @@ class TestHTTPBearerAuth(object):
 
         assert len(responses.calls) == 8
 
+    @responses.activate
+    def test_token_shared_between_instances(self):
+        responses.add(responses.GET, BEARER_REALM_URL + '?scope=repository:fedora:pull',
+                      json={'token': BEARER_TOKEN}, match_querystring=True)
+        url = 'https://registry.example.com/v2/fedora/tags/list'
+        responses.add_callback(responses.GET, url, callback=bearer_registry_callback)
+
+        assert requests.get(url, auth=HTTPBearerAuth()).json() == 'success'
+        # the realm and the token are known, no 401 response this time
+        assert requests.get(url, auth=HTTPBearerAuth()).json() == 'success'
+        assert len(responses.calls) == 4
+
+        # other credentials do not share the token
+        auth = HTTPBearerAuth(username='spam', password='bacon')
+        assert requests.get(url, auth=auth).json() == 'success'
+        assert len(realm_calls()) == 2
+
+    @responses.activate
+    @pytest.mark.parametrize('expires_in', [None, 300])
+    def test_token_expires(self, expires_in):
+        token_info = {'token': BEARER_TOKEN}
+        if expires_in:
+            token_info['expires_in'] = expires_in
+        responses.add(responses.GET, BEARER_REALM_URL + '?scope=repository:fedora:pull',
+                      json=token_info, match_querystring=True)
+        url = 'https://registry.example.com/v2/fedora/tags/list'
+        responses.add_callback(responses.GET, url, callback=bearer_registry_callback)
+
+        auth = HTTPBearerAuth()
+        assert requests.get(url, auth=auth).json() == 'success'
+
+        lifetime = (expires_in or BEARER_TOKEN_DEFAULT_EXPIRY) - BEARER_TOKEN_EXPIRY_MARGIN
+        now = time.time()
+        flexmock(time).should_receive('time').and_return(now + lifetime - 1)
+        assert requests.get(url, auth=auth).json() == 'success'
+        assert len(responses.calls) == 4
+
+        flexmock(time).should_receive('time').and_return(now + lifetime + 1)
+        assert requests.get(url, auth=auth).json() == 'success'
+        assert len(responses.calls) == 7
+
+    @responses.activate
+    def test_revoked_token_replaced(self):
+        token_cache = BearerTokenCache()
+        token_cache.put_challenge('https://registry.example.com', BEARER_REALM_URL, '')
+        token_cache.put_token(BEARER_REALM_URL, '', ['repository:fedora:pull'], 'anonymous',
+                              'revoked-token', 300)
+
+        responses.add(responses.GET, BEARER_REALM_URL + '?scope=repository:fedora:pull',
+                      json={'token': BEARER_TOKEN}, match_querystring=True)
+        url = 'https://registry.example.com/v2/fedora/tags/list'
+        responses.add_callback(responses.GET, url, callback=bearer_unauthorized_callback)
+        responses.add_callback(responses.GET, url, callback=bearer_success_callback)
+
+        auth = HTTPBearerAuth(token_cache=token_cache)
+        assert requests.get(url, auth=auth).json() == 'success'
+        assert responses.calls[0].request.headers['Authorization'] == 'Bearer revoked-token'
+        assert token_cache.get_token(
+            BEARER_REALM_URL, '', 'repository:fedora:pull', 'anonymous'
+        ) == BEARER_TOKEN
+
+    @responses.activate
+    @pytest.mark.parametrize('realm_supports_scopes', [True, False])
+    def test_expired_tokens_refreshed_at_once(self, realm_supports_scopes):
+        def realm_callback(request):
+            scopes = parse_qs(urlparse(request.url).query)['scope']
+            if len(scopes) > 1 and not realm_supports_scopes:
+                return (400, {}, json.dumps('invalid scope'))
+            return (200, {}, json.dumps({'token': BEARER_TOKEN, 'expires_in': 60}))
+
+        responses.add_callback(responses.GET, BEARER_REALM_URL, callback=realm_callback)
+        urls = ['https://registry.example.com/v2/{}/tags/list'.format(repo)
+                for repo in ('fedora', 'centos', 'ubi')]
+        for url in urls:
+            responses.add_callback(responses.GET, url, callback=bearer_registry_callback)
+
+        auth = HTTPBearerAuth()
+        for url in urls:
+            assert requests.get(url, auth=auth).json() == 'success'
+
+        later = time.time() + 60
+        flexmock(time).should_receive('time').and_return(later)
+        for url in urls:
+            assert requests.get(url, auth=auth).json() == 'success'
+
+        if realm_supports_scopes:
+            assert len(realm_calls()) == 4
+            last_query = parse_qs(urlparse(realm_calls()[-1].request.url).query)
+            assert last_query['scope'] == [
+                'repository:fedora:pull', 'repository:centos:pull', 'repository:ubi:pull',
+            ]
+        else:
+            # one failed attempt, then one token per repository
+            assert len(realm_calls()) == 7
+
     @responses.activate
     @pytest.mark.parametrize(('partial_url', 'repo'), (
         ('tags/list', 'fedora'),
@@ -203,6 +314,48 @@ class TestHTTPBearerAuth(object):
         assert len(responses.calls) == 1
 
 
+class TestBearerTokenCache(object):
+
+    def test_tokens_persisted(self, tmp_path):
+        path = tmp_path / 'tokens.json'
+        cache = BearerTokenCache(path)
+        cache.put_challenge('https://registry.example.com', BEARER_REALM_URL, 'registry')
+        cache.put_token(BEARER_REALM_URL, 'registry', ['repository:fedora:pull'], 'anonymous',
+                        BEARER_TOKEN, 300)
+
+        assert os.stat(path).st_mode & 0o777 == 0o600
+
+        other_process_cache = BearerTokenCache(path)
+        assert other_process_cache.get_challenge('https://registry.example.com') == (
+            BEARER_REALM_URL, 'registry'
+        )
+        assert other_process_cache.get_token(
+            BEARER_REALM_URL, 'registry', 'repository:fedora:pull', 'anonymous'
+        ) == BEARER_TOKEN
+        assert other_process_cache.get_token(
+            BEARER_REALM_URL, 'registry', 'repository:fedora:pull', 'spam'
+        ) is None
+
+        # tokens of both processes are kept
+        other_process_cache.put_token(BEARER_REALM_URL, 'registry', ['repository:ubi:pull'],
+                                      'anonymous', 'other-token', 300)
+        cache.put_token(BEARER_REALM_URL, 'registry', ['repository:centos:pull'], 'anonymous',
+                        BEARER_TOKEN, 300)
+        assert BearerTokenCache(path).get_token(
+            BEARER_REALM_URL, 'registry', 'repository:ubi:pull', 'anonymous'
+        ) == 'other-token'
+
+    def test_unreadable_file_ignored(self, tmp_path):
+        path = tmp_path / 'tokens.json'
+        path.write_text('not json')
+        cache = BearerTokenCache(path)
+
+        assert cache.get_challenge('https://registry.example.com') is None
+        cache.put_token(BEARER_REALM_URL, 'registry', ['repository:fedora:pull'], 'anonymous',
+                        BEARER_TOKEN, 300)
+        assert json.loads(path.read_text())['tokens']
+
+
 class TestHTTPRegistryAuth(object):
 
     def test_initialization(self):
@@ -0,0 +1,66 @@
+"""
+Copyright (c) 2023 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+"""
+import os
+
+import pytest
+
+from atomic_reactor.checkpoint import PluginCheckpoint, compute_fingerprint
+
+
+def test_compute_fingerprint():
+    assert compute_fingerprint({"a": 1, "b": [1, 2]}) == compute_fingerprint({"b": [1, 2], "a": 1})
+    assert compute_fingerprint({"a": 1}) != compute_fingerprint({"a": 2})
+
+
+def test_checkpoint_roundtrip(tmp_path):
+    produced = tmp_path / "image.tar"
+    produced.write_text("image")
+    checkpoint_path = tmp_path / "plugin.json"
+
+    checkpoint = PluginCheckpoint.create("abc", {"path": str(produced)}, [produced])
+    checkpoint.save(checkpoint_path)
+
+    loaded = PluginCheckpoint.load(checkpoint_path)
+    assert loaded == checkpoint
+    assert loaded.is_valid("abc")
+    assert not loaded.is_valid("def")
+
+
+@pytest.mark.parametrize("change", ["remove", "rewrite", "touch"])
+def test_checkpoint_files_changed(tmp_path, change):
+    produced = tmp_path / "image.tar"
+    produced.write_text("image")
+    checkpoint = PluginCheckpoint.create("abc", None, [produced])
+
+    if change == "remove":
+        produced.unlink()
+    elif change == "rewrite":
+        produced.write_text("another image")
+    else:
+        stat = produced.stat()
+        os.utime(produced, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+
+    assert not checkpoint.is_valid("abc")
+
+
+def test_checkpoint_unserializable_result(tmp_path):
+    checkpoint_path = tmp_path / "plugin.json"
+    checkpoint = PluginCheckpoint.create("abc", object(), [])
+
+    with pytest.raises(TypeError):
+        checkpoint.save(checkpoint_path)
+    assert not checkpoint_path.exists()
+
+
+@pytest.mark.parametrize("content", [None, "not json", '{"unknown": 1}'])
+def test_load_missing_or_broken_checkpoint(tmp_path, content):
+    checkpoint_path = tmp_path / "plugin.json"
+    if content is not None:
+        checkpoint_path.write_text(content)
+
+    assert PluginCheckpoint.load(checkpoint_path) is None
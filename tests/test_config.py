@@ -609,7 +609,7 @@ odcs:
         'image_label_info_url_format', 'image_equal_labels', 'fail_on_digest_mismatch',
         'openshift', 'group_manifests', 'platform_descriptors', 'registry', 'yum_proxy',
         'source_registry', 'sources_command', 'hide_files', 'skip_koji_check_for_base_image',
-        'deep_manifest_list_inspection'
+        'deep_manifest_list_inspection', 'artifact_cache'
     ])
     def test_get_methods(self, parse_from, method, tmpdir, caplog, monkeypatch):
         if parse_from == 'raw':
@@ -665,6 +665,30 @@ odcs:
             log_msg = f"reading config from {filename}"
         assert log_msg in caplog.text
 
+    @pytest.mark.parametrize(('config', 'expect'), [
+        ("""\
+plugin_profiling:
+  enabled: true
+         """,
+         {'enabled': True, 'cprofile': False}),
+        ("""\
+plugin_profiling:
+  enabled: true
+  cprofile: true
+         """,
+         {'enabled': True, 'cprofile': True}),
+        ("""\
+         """,
+         {'enabled': False, 'cprofile': False}),
+    ])
+    def test_get_plugin_profiling(self, config, expect):
+        config += "\n" + REQUIRED_CONFIG
+        config_json = read_yaml(config, 'schemas/config.json')
+
+        conf = Configuration(raw_config=config_json)
+
+        assert conf.plugin_profiling == expect
+
     @pytest.mark.parametrize(('config', 'expect'), [
         ("""\
 platform_descriptors:
@@ -5,8 +5,11 @@ All rights reserved.
 This software may be modified and distributed under the terms
 of the BSD license. See the LICENSE file for details.
 """
+import contextvars
 import os
 import tempfile
+import threading
+import time
 from pathlib import Path
 from typing import Any, Iterable
 import shutil
@@ -14,7 +17,7 @@ import shutil
 import reflink
 from flexmock import flexmock
 import pytest
-from atomic_reactor.constants import DOCKERFILE_FILENAME
+from atomic_reactor.constants import BUILD_DIR_HARDLINK_MIN_SIZE, DOCKERFILE_FILENAME
 
 from atomic_reactor.dirs import (
     BuildDir,
@@ -23,6 +26,7 @@ from atomic_reactor.dirs import (
     DockerfileNotExist,
     FileCreationFunc,
     ImageInspectionData,
+    PlatformActionsFailed,
     RootBuildDir,
 )
 from atomic_reactor.source import DummySource
@@ -132,7 +136,7 @@ def test_rootbuilddir_copy_sources_reflink(caplog, build_dir, mock_source, refli
     flexmock(reflink).should_receive('reflink').and_return(True).times(int(reflink_support))
     flexmock(shutil).should_receive('copy2').and_return(True).times(int(not reflink_support))
 
-    method_name = shutil.copy2.__name__
+    method_name = 'hardlink_or_copy'
     if reflink_support:
         method_name = 'reflink_copy'
 
@@ -142,6 +146,42 @@ def test_rootbuilddir_copy_sources_reflink(caplog, build_dir, mock_source, refli
     assert log_msg in caplog.text
 
 
+def test_rootbuilddir_copy_sources_hardlinks_large_files(build_dir, mock_source):
+    root_path = build_dir / "root_builddir"
+    root_path.mkdir()
+    large_file = Path(mock_source.path, "artifact.tar")
+    large_file.write_bytes(b"x" * BUILD_DIR_HARDLINK_MIN_SIZE)
+
+    platforms = ["x86_64", "ppc64le"]
+    root = RootBuildDir(root_path)
+    root.platforms = platforms
+    flexmock(reflink).should_receive('supported_at').and_return(False)
+    root._copy_sources(mock_source)
+
+    for platform in platforms:
+        copied_large_file = root.path / platform / "artifact.tar"
+        assert copied_large_file.samefile(large_file)
+        copied_dockerfile = root.path / platform / DOCKERFILE_FILENAME
+        assert copied_dockerfile.stat().st_nlink == 1
+
+
+def test_rootbuilddir_copy_sources_hardlink_failure(build_dir, mock_source):
+    root_path = build_dir / "root_builddir"
+    root_path.mkdir()
+    large_file = Path(mock_source.path, "artifact.tar")
+    large_file.write_bytes(b"x" * BUILD_DIR_HARDLINK_MIN_SIZE)
+
+    root = RootBuildDir(root_path)
+    root.platforms = ["x86_64"]
+    flexmock(reflink).should_receive('supported_at').and_return(False)
+    flexmock(os).should_receive('link').and_raise(OSError("Invalid cross-device link"))
+    root._copy_sources(mock_source)
+
+    copied_large_file = root.path / "x86_64" / "artifact.tar"
+    assert not copied_large_file.samefile(large_file)
+    assert copied_large_file.read_bytes() == large_file.read_bytes()
+
+
 def test_rootbuilddir_has_sources_if_build_dirs_not_inited(build_dir):
     assert not RootBuildDir(build_dir).has_sources
 
@@ -231,6 +271,67 @@ def test_rootbuilddir_for_each_platform_failure_from_action(build_dir, mock_sour
         root.for_each_platform(failure_action)
 
 
+current_plugin: contextvars.ContextVar = contextvars.ContextVar("current_plugin", default=None)
+
+
+def test_rootbuilddir_for_each_platform_parallel(build_dir, mock_source):
+    platforms = ["aarch64", "ppc64le", "s390x", "x86_64"]
+    root = RootBuildDir(build_dir)
+    root.init_build_dirs(platforms, mock_source)
+
+    running = 0
+    max_running = 0
+    lock = threading.Lock()
+
+    def action(build_dir: BuildDir) -> Any:
+        nonlocal running, max_running
+        with lock:
+            running += 1
+            max_running = max(max_running, running)
+        # let the platforms which start first finish last
+        time.sleep(0.1 / (platforms.index(build_dir.platform) + 1))
+        with lock:
+            running -= 1
+        return build_dir.platform, current_plugin.get()
+
+    current_plugin.set("some_plugin")
+    results = root.for_each_platform(action, max_workers=3)
+
+    assert list(results) == platforms
+    assert results == {platform: (platform, "some_plugin") for platform in platforms}
+    assert 1 < max_running <= 3
+
+
+def test_rootbuilddir_for_each_platform_parallel_single_failure(build_dir, mock_source):
+    root = RootBuildDir(build_dir)
+    root.init_build_dirs(["x86_64", "s390x"], mock_source)
+    handled = []
+
+    def action(build_dir: BuildDir) -> Any:
+        handled.append(build_dir.platform)
+        return failure_action(build_dir)
+
+    with pytest.raises(ValueError, match="Error is raised"):
+        root.for_each_platform(action, max_workers=2)
+    assert sorted(handled) == ["s390x", "x86_64"]
+
+
+def test_rootbuilddir_for_each_platform_parallel_multiple_failures(build_dir, mock_source):
+    root = RootBuildDir(build_dir)
+    root.init_build_dirs(["x86_64", "s390x", "ppc64le"], mock_source)
+
+    def action(build_dir: BuildDir) -> Any:
+        if build_dir.platform == "ppc64le":
+            return "the test does not care about this value"
+        raise ValueError(f"{build_dir.platform} failed")
+
+    with pytest.raises(PlatformActionsFailed, match="Action failed for 2 platforms") as exc_info:
+        root.for_each_platform(action, max_workers=2)
+
+    assert list(exc_info.value.errors) == ["s390x", "x86_64"]
+    assert str(exc_info.value.errors["x86_64"]) == "x86_64 failed"
+
+
 def create_dockerfile(build_dir: BuildDir) -> Iterable[Path]:
     # Create: ./Dockerfile
     dockerfile = build_dir.path / DOCKERFILE_FILENAME
@@ -301,7 +402,7 @@ def test_rootbuilddir_for_all_platforms_copy_reflink(caplog, build_dir, mock_sou
     root.init_build_dirs(["x86_64", "s390x"], mock_source)
     root.for_all_platforms_copy(create_dockerfile)
 
-    method_name = shutil.copy2.__name__
+    method_name = 'hardlink_or_copy'
     if reflink_support:
         method_name = 'reflink_copy'
 
@@ -6,18 +6,28 @@ This software may be modified and distributed under the terms
 of the BSD license. See the LICENSE file for details.
 """
 
+import base64
+import errno
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from io import BufferedReader, BytesIO
+import hashlib
+import json
 import os
 import requests
 import responses
 import tempfile
+import threading
 import time
+from collections import Counter
 
 import pytest
 from flexmock import flexmock
 
-from atomic_reactor.util import get_retrying_requests_session
-from atomic_reactor.download import download_url
+from atomic_reactor.util import (ChecksumRegistry, get_retrying_requests_session,
+                                 set_checksum_registry)
+from atomic_reactor import download
+from atomic_reactor.download import (ArtifactCache, DownloadError, DownloadJob, DownloadManager,
+                                     download_url, set_artifact_cache)
 from atomic_reactor.constants import CACHITO_ALG_STR
 
 
@@ -80,7 +90,7 @@ class TestDownloadUrl(object):
         dest_dir = tempfile.mkdtemp()
         session = get_retrying_requests_session()
         # get response shows successful connection
-        response = flexmock()
+        response = flexmock(status_code=200, headers={})
         (response
          .should_receive('raise_for_status'))
         # but streaming from the response fails
@@ -96,3 +106,525 @@ class TestDownloadUrl(object):
          .should_receive('sleep'))
         with pytest.raises(requests.exceptions.RequestException):
             download_url(url, dest_dir, session=session)
+
+    @staticmethod
+    def fake_session(*responses):
+        """Session returning the given (status, headers, chunks) responses in order
+
+        A chunk which is an exception is raised while streaming the content.
+        """
+        requests_headers = []
+        remaining = list(responses)
+
+        def iter_content(chunks):
+            for chunk in chunks:
+                if isinstance(chunk, Exception):
+                    raise chunk
+                yield chunk
+
+        def get(url, stream, verify, headers=None):
+            requests_headers.append(headers or {})
+            status, response_headers, chunks = remaining.pop(0)
+            return flexmock(status_code=status, headers=response_headers,
+                            raise_for_status=lambda: None, close=lambda: None,
+                            iter_content=lambda chunk_size: iter_content(chunks))
+
+        return flexmock(get=get), requests_headers
+
+    def test_resume_interrupted_download(self, tmp_path):
+        url = 'https://example.com/path/file'
+        content = b'0123456789'
+        session, sent_headers = self.fake_session(
+            (200, {'ETag': '"v1"'}, [b'01234', requests.exceptions.ConnectionError()]),
+            (206, {'ETag': '"v1"', 'Content-Range': 'bytes 5-9/10'}, [b'56789']),
+        )
+        flexmock(time).should_receive('sleep')
+
+        result = download_url(url, str(tmp_path), session=session,
+                              expected_checksums={'md5': hashlib.md5(content).hexdigest()})
+
+        assert sent_headers == [{}, {'Range': 'bytes=5-', 'If-Range': '"v1"'}]
+        with open(result, 'rb') as f:
+            assert f.read() == content
+        assert os.listdir(tmp_path) == ['file']
+
+    @pytest.mark.parametrize('status, response_headers, chunks', [
+        (206, {'Content-Range': 'bytes 5-9/10'}, [b'56789']),
+        # the server does not support ranges or the file changed
+        (200, {}, [b'01234', b'56789']),
+    ])
+    def test_resume_partial_file(self, tmp_path, status, response_headers, chunks):
+        url = 'https://example.com/path/file'
+        content = b'0123456789'
+        # left behind by a previous build
+        (tmp_path / 'file.partial').write_bytes(b'01234')
+        (tmp_path / 'file.partial.json').write_text(
+            json.dumps({'url': url, 'etag': None, 'last_modified': 'yesterday'}))
+        session, sent_headers = self.fake_session((status, response_headers, chunks))
+
+        result = download_url(url, str(tmp_path), session=session,
+                              expected_checksums={'sha256': hashlib.sha256(content).hexdigest()})
+
+        assert sent_headers == [{'Range': 'bytes=5-', 'If-Range': 'yesterday'}]
+        with open(result, 'rb') as f:
+            assert f.read() == content
+        assert os.listdir(tmp_path) == ['file']
+
+    def test_corrupted_partial_file_removed(self, tmp_path):
+        url = 'https://example.com/path/file'
+        session, _ = self.fake_session((200, {'ETag': '"v1"'}, [b'garbage']))
+
+        with pytest.raises(ValueError, match='does not match expected checksum'):
+            download_url(url, str(tmp_path), session=session,
+                         expected_checksums={'md5': 'abc'})
+        assert os.listdir(tmp_path) == []
+
+
+class RangeServer(object):
+    """Local HTTP server of one file, supporting range requests"""
+
+    def __init__(self, content, accept_ranges=True, honor_ranges=True,
+                 head_digest=None, get_digest=None):
+        self.content = content
+        self.accept_ranges = accept_ranges
+        self.honor_ranges = honor_ranges
+        # Digest headers of the HEAD and GET responses
+        self.head_digest = head_digest
+        self.get_digest = get_digest
+        # ranges which are cut off half way through, the first time they are requested
+        self.interrupt = set()
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def send_file_headers(self, status, length):
+                self.send_response(status)
+                self.send_header('Content-Length', str(length))
+                self.send_header('ETag', '"v1"')
+                if server.accept_ranges:
+                    self.send_header('Accept-Ranges', 'bytes')
+
+            def do_HEAD(self):
+                server.requests.append(('HEAD', None))
+                self.send_file_headers(200, len(server.content))
+                if server.head_digest:
+                    self.send_header('Digest', server.head_digest)
+                self.end_headers()
+
+            def do_GET(self):
+                range_header = self.headers.get('Range')
+                server.requests.append(('GET', range_header))
+                if not range_header or not server.honor_ranges:
+                    self.send_file_headers(200, len(server.content))
+                    self.end_headers()
+                    self.wfile.write(server.content)
+                    return
+
+                start, end = (int(n) for n in range_header[len('bytes='):].split('-'))
+                body = server.content[start:end + 1]
+                self.send_file_headers(206, len(body))
+                self.send_header('Content-Range',
+                                 f'bytes {start}-{end}/{len(server.content)}')
+                if server.get_digest:
+                    self.send_header('Digest', server.get_digest)
+                self.end_headers()
+                if range_header in server.interrupt:
+                    server.interrupt.remove(range_header)
+                    self.wfile.write(body[:len(body) // 2])
+                    self.close_connection = True
+                    return
+                self.wfile.write(body)
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.httpd.server_port}/path/file'
+        self.thread = threading.Thread(target=self.httpd.serve_forever, args=(0.01,), daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@responses.activate
+def test_download_url_registers_checksums(tmp_path):
+    url = 'https://example.com/path/file'
+    responses.add(responses.GET, url, body=b'abc')
+    registry = ChecksumRegistry()
+    set_checksum_registry(registry)
+    try:
+        result = download_url(url, str(tmp_path),
+                              expected_checksums={'md5': hashlib.md5(b'abc').hexdigest()})
+    finally:
+        set_checksum_registry(None)
+
+    assert registry.get(result) == {'md5': hashlib.md5(b'abc').hexdigest()}
+
+
+class TestSegmentedDownload(object):
+    content = os.urandom(10 * 1024 + 3)
+
+    @pytest.fixture(autouse=True)
+    def small_segments(self, monkeypatch):
+        monkeypatch.setattr(download, 'DOWNLOAD_SEGMENT_MIN_SIZE', 1024)
+        monkeypatch.setattr(download, 'DEFAULT_DOWNLOAD_BLOCK_SIZE', 256)
+
+    def download(self, server, dest_dir, segments=4, verify_cachito_digest=False):
+        session = get_retrying_requests_session()
+        session.trust_env = False
+        checksums = {'sha256': hashlib.sha256(self.content).hexdigest()}
+        result = download_url(server.url, str(dest_dir), session=session,
+                              expected_checksums=checksums, segments=segments,
+                              verify_cachito_digest=verify_cachito_digest)
+        with open(result, 'rb') as f:
+            assert f.read() == self.content
+        assert os.listdir(dest_dir) == ['file']
+
+    def test_segments(self, tmp_path):
+        with RangeServer(self.content) as server:
+            self.download(server, tmp_path)
+
+        assert server.requests[0] == ('HEAD', None)
+        assert sorted(server.requests[1:]) == [
+            ('GET', 'bytes=0-2559'),
+            ('GET', 'bytes=2560-5120'),
+            ('GET', 'bytes=5121-7681'),
+            ('GET', 'bytes=7682-10242'),
+        ]
+
+    def test_segments_limited_by_size(self, tmp_path):
+        with RangeServer(self.content) as server:
+            self.download(server, tmp_path, segments=100)
+
+        # at least DOWNLOAD_SEGMENT_MIN_SIZE each
+        assert len(server.requests) == 1 + 10
+
+    def test_interrupted_segment_resumed(self, tmp_path):
+        flexmock(time).should_receive('sleep')
+        with RangeServer(self.content) as server:
+            server.interrupt.add('bytes=2560-5120')
+            self.download(server, tmp_path)
+
+        segment_requests = [r for _, r in server.requests if r and r.endswith('-5120')]
+        assert len(segment_requests) == 2
+        # only the rest of the segment is requested again
+        resumed_at = int(segment_requests[1][len('bytes='):].split('-')[0])
+        assert 2560 < resumed_at <= 3840
+
+    def cachito_digest(self, content):
+        digest = base64.b64encode(hashlib.sha256(content).digest()).decode('utf-8')
+        return f'{CACHITO_ALG_STR}={digest}'
+
+    def test_cachito_digest_from_range_responses(self, tmp_path):
+        with RangeServer(self.content, head_digest=self.cachito_digest(b'other'),
+                         get_digest=self.cachito_digest(self.content)) as server:
+            self.download(server, tmp_path, verify_cachito_digest=True)
+
+    def test_cachito_digest_mismatch_in_range_responses(self, tmp_path):
+        with RangeServer(self.content, head_digest=self.cachito_digest(self.content),
+                         get_digest=self.cachito_digest(b'other')) as server:
+            with pytest.raises(ValueError, match='digest'):
+                self.download(server, tmp_path, verify_cachito_digest=True)
+
+        assert os.listdir(tmp_path) == []
+
+    def test_cachito_digest_not_in_range_responses(self, tmp_path):
+        # not verified, as when the whole file is downloaded without a Digest
+        with RangeServer(self.content, head_digest=self.cachito_digest(b'other')) as server:
+            self.download(server, tmp_path, verify_cachito_digest=True)
+
+    def test_head_failure_falls_back_to_one_stream(self, tmp_path):
+        session = get_retrying_requests_session()
+        session.trust_env = False
+        flexmock(session).should_receive('head').and_raise(RuntimeError('no mock for HEAD'))
+        with RangeServer(self.content) as server:
+            result = download_url(server.url, str(tmp_path), session=session, segments=4)
+
+        assert server.requests == [('GET', None)]
+        with open(result, 'rb') as f:
+            assert f.read() == self.content
+
+    @pytest.mark.parametrize('accept_ranges, honor_ranges', [
+        (False, True),
+        # advertised, but the server sends the whole file anyway
+        (True, False),
+    ])
+    def test_fallback_to_one_stream(self, tmp_path, accept_ranges, honor_ranges):
+        with RangeServer(self.content, accept_ranges=accept_ranges,
+                         honor_ranges=honor_ranges) as server:
+            self.download(server, tmp_path)
+
+        assert server.requests[0] == ('HEAD', None)
+        assert server.requests[-1] == ('GET', None)
+
+
+class TestArtifactCache(object):
+    @pytest.fixture
+    def cache(self, tmp_path):
+        cache = ArtifactCache(tmp_path / 'cache')
+        set_artifact_cache(cache)
+        yield cache
+        set_artifact_cache(None)
+
+    @responses.activate
+    def test_download_url_uses_cache(self, cache, tmp_path):
+        url = 'https://example.com/path/file'
+        content = b'abc'
+        checksums = {'md5': hashlib.md5(content).hexdigest(),
+                     'sha256': hashlib.sha256(content).hexdigest()}
+        responses.add(responses.GET, url, body=content)
+
+        for build in ('build1', 'build2'):
+            (tmp_path / build).mkdir()
+            result = download_url(url, str(tmp_path / build), expected_checksums=checksums)
+            with open(result, 'rb') as f:
+                assert f.read() == content
+
+        assert len(responses.calls) == 1
+        assert (cache.path / 'sha256' / checksums['sha256']).read_bytes() == content
+        # looked up by any of the checksums but md5
+        (tmp_path / 'build3').mkdir()
+        download_url(url, str(tmp_path / 'build3'),
+                     expected_checksums={'sha256': checksums['sha256']})
+        assert len(responses.calls) == 1
+        assert not (cache.path / 'md5').exists()
+        (tmp_path / 'build4').mkdir()
+        download_url(url, str(tmp_path / 'build4'), expected_checksums={'md5': checksums['md5']})
+        assert len(responses.calls) == 2
+
+    @responses.activate
+    def test_download_url_does_not_share_files(self, cache, tmp_path):
+        url = 'https://example.com/path/file'
+        checksums = {'sha256': hashlib.sha256(b'abc').hexdigest()}
+        responses.add(responses.GET, url, body=b'abc')
+
+        result = download_url(url, str(tmp_path), expected_checksums=checksums)
+        cached = cache.fetch(checksums, str(tmp_path / 'fetched'))
+
+        assert cached == checksums
+        entry = cache.path / 'sha256' / checksums['sha256']
+        for path in (result, tmp_path / 'fetched'):
+            assert not os.path.samefile(path, entry)
+            assert os.stat(path).st_nlink == 1
+
+    def test_fetch_verifies_entry(self, cache, tmp_path):
+        artifact = tmp_path / 'artifact'
+        artifact.write_bytes(b'abc')
+        checksums = {'sha256': hashlib.sha256(b'abc').hexdigest(),
+                     'md5': hashlib.md5(b'abc').hexdigest()}
+        cache.store(str(artifact), checksums)
+        entry = cache.path / 'sha256' / checksums['sha256']
+        entry.write_bytes(b'corrupted')
+
+        assert cache.fetch(checksums, str(tmp_path / 'fetched')) is None
+        assert not (tmp_path / 'fetched').exists()
+        assert not entry.exists()
+
+    @responses.activate
+    def test_download_url_cache_errors(self, cache, tmp_path):
+        url = 'https://example.com/path/file'
+        checksums = {'sha256': hashlib.sha256(b'abc').hexdigest()}
+        responses.add(responses.GET, url, body=b'abc')
+        (tmp_path / 'build1').mkdir()
+        (tmp_path / 'build2').mkdir()
+
+        # e.g. a full disk
+        (flexmock(download)
+         .should_receive('_reflink_or_copy')
+         .and_raise(OSError(errno.ENOSPC, 'No space left on device')))
+        for build in ('build1', 'build2'):
+            result = download_url(url, str(tmp_path / build), expected_checksums=checksums)
+            assert open(result, 'rb').read() == b'abc'
+
+        assert len(responses.calls) == 2
+        assert not (cache.path / 'sha256' / checksums['sha256']).exists()
+        assert [p.name for p in cache.path.iterdir() if p.name.startswith('.tmp')] == []
+
+    def test_fetch_error_falls_through(self, cache, tmp_path):
+        artifact = tmp_path / 'artifact'
+        artifact.write_bytes(b'abc')
+        checksums = {'sha256': hashlib.sha256(b'abc').hexdigest()}
+        cache.store(str(artifact), checksums)
+        dest_dir = tmp_path / 'build'
+        dest_dir.mkdir()
+
+        flexmock(os).should_receive('replace').and_raise(PermissionError('denied'))
+        assert cache.fetch(checksums, str(dest_dir / 'fetched')) is None
+        assert list(dest_dir.iterdir()) == []
+
+    @responses.activate
+    def test_download_url_without_checksums(self, cache, tmp_path):
+        url = 'https://example.com/path/file'
+        responses.add(responses.GET, url, body=b'abc')
+
+        download_url(url, str(tmp_path))
+        download_url(url, str(tmp_path))
+
+        assert len(responses.calls) == 2
+
+    def test_store_twice(self, cache, tmp_path):
+        artifact = tmp_path / 'artifact'
+        artifact.write_bytes(b'abc')
+        checksums = {'sha256': hashlib.sha256(b'abc').hexdigest()}
+
+        # e.g. by two builds at the same time
+        cache.store(str(artifact), checksums)
+        cache.store(str(artifact), checksums)
+
+        assert cache.fetch(checksums, str(tmp_path / 'fetched')) == checksums
+        assert (tmp_path / 'fetched').read_bytes() == b'abc'
+        assert [p.name for p in cache.path.iterdir() if p.name.startswith('.tmp')] == []
+
+    def test_evict_least_recently_used(self, cache, tmp_path):
+        checksums = {}
+        for i, content in enumerate([b'first', b'second', b'third']):
+            artifact = tmp_path / f'artifact{i}'
+            artifact.write_bytes(content)
+            checksums[content] = {'sha256': hashlib.sha256(content).hexdigest(),
+                                  'sha1': hashlib.sha1(content).hexdigest()}
+            cache.store(str(artifact), checksums[content])
+            for path in (cache.path / 'sha256' / checksums[content]['sha256'],
+                         cache.path / 'sha1' / checksums[content]['sha1']):
+                os.utime(path, (i, i))
+
+        # 'first' was used most recently, 'second' and 'third' do not fit next to it
+        assert cache.fetch(checksums[b'first'], str(tmp_path / 'fetched'))
+        cache.max_size = 8
+        cache._evict()
+
+        assert cache.fetch(checksums[b'first'], str(tmp_path / 'fetched'))
+        for content in (b'second', b'third'):
+            assert not cache.fetch(checksums[content], str(tmp_path / 'fetched'))
+            assert not (cache.path / 'sha1' / checksums[content]['sha1']).exists()
+
+
+class TestDownloadManager(object):
+    @responses.activate
+    def test_download(self, tmp_path):
+        jobs = []
+        for i in range(5):
+            url = f'https://example.com/path/file{i}'
+            content = f'content {i}'.encode()
+            responses.add(responses.GET, url, body=content)
+            checksums = {'sha256': hashlib.sha256(content).hexdigest()}
+            jobs.append(DownloadJob(url, tmp_path, dest_filename=f'renamed{i}',
+                                    expected_checksums=checksums))
+        progress = []
+
+        paths = DownloadManager(progress=lambda *args: progress.append(args)).download(jobs)
+
+        assert paths == [str(tmp_path / f'renamed{i}') for i in range(5)]
+        for i, path in enumerate(paths):
+            with open(path, 'rb') as f:
+                assert f.read() == f'content {i}'.encode()
+        assert [done for done, _, _ in progress] == [1, 2, 3, 4, 5]
+        assert {job.url for _, _, job in progress} == {job.url for job in jobs}
+        assert DownloadManager().download([]) == []
+
+    def test_concurrency_limits(self, tmp_path):
+        running = Counter()
+        max_running = Counter()
+        lock = threading.Lock()
+
+        def fake_download_url(url, dest_dir, **kwargs):
+            host = url.split('/')[2]
+            with lock:
+                running[host] += 1
+                running['total'] += 1
+                for key in (host, 'total'):
+                    max_running[key] = max(max_running[key], running[key])
+            time.sleep(0.02)
+            with lock:
+                running[host] -= 1
+                running['total'] -= 1
+            return os.path.join(dest_dir, url.split('/')[-1])
+
+        flexmock(download).should_receive('download_url').replace_with(fake_download_url)
+        jobs = [DownloadJob(f'https://{host}.example.com/{host}-file{i}', tmp_path)
+                for host in ('a', 'b', 'c') for i in range(6)]
+
+        manager = DownloadManager(max_workers=5, max_per_host=2)
+        paths = manager.download(jobs)
+
+        assert paths == [os.path.join(tmp_path, job.url.split('/')[-1]) for job in jobs]
+        assert 2 < max_running['total'] <= 5
+        for host in ('a', 'b', 'c'):
+            assert max_running[f'{host}.example.com'] <= 2
+
+    def test_busy_host_does_not_block_workers(self, tmp_path):
+        started = []
+
+        def fake_download_url(url, dest_dir, **kwargs):
+            started.append(url)
+            time.sleep(0.02)
+            return os.path.join(dest_dir, url.split('/')[-1])
+
+        flexmock(download).should_receive('download_url').replace_with(fake_download_url)
+        jobs = [DownloadJob(f'https://a.example.com/file{i}', tmp_path) for i in range(3)]
+        jobs.append(DownloadJob('https://b.example.com/file', tmp_path))
+
+        DownloadManager(max_workers=2, max_per_host=1).download(jobs)
+
+        # the other worker is free for host b while host a is busy
+        assert set(started[:2]) == {'https://a.example.com/file0', 'https://b.example.com/file'}
+
+    def test_same_destination_serialized(self, tmp_path):
+        running = []
+        downloaded = []
+
+        def fake_download_url(url, dest_dir, dest_filename=None, **kwargs):
+            running.append(url)
+            assert len(running) == 1
+            time.sleep(0.02)
+            running.remove(url)
+            downloaded.append(url)
+            return os.path.join(dest_dir, dest_filename)
+
+        flexmock(download).should_receive('download_url').replace_with(fake_download_url)
+        # e.g. the same remote source file of an image and of its parent image
+        jobs = [DownloadJob(f'https://{host}.example.com/file', tmp_path, dest_filename='file')
+                for host in ('a', 'b', 'c')]
+
+        paths = DownloadManager(max_workers=3).download(jobs)
+
+        assert paths == [os.path.join(tmp_path, 'file')] * 3
+        assert downloaded == [job.url for job in jobs]
+
+    @responses.activate
+    def test_same_destination_downloaded(self, tmp_path):
+        for host in ('a', 'b'):
+            responses.add(responses.GET, f'https://{host}.example.com/file', body=host.encode())
+        jobs = [DownloadJob(f'https://{host}.example.com/file', tmp_path) for host in ('a', 'b')]
+
+        paths = DownloadManager().download(jobs)
+
+        assert paths == [str(tmp_path / 'file')] * 2
+        assert (tmp_path / 'file').read_bytes() == b'b'
+        assert os.listdir(tmp_path) == ['file']
+
+    @responses.activate
+    def test_failures_aggregated(self, tmp_path):
+        responses.add(responses.GET, 'https://example.com/missing', status=404)
+        responses.add(responses.GET, 'https://example.com/corrupted', body=b'corrupted')
+        responses.add(responses.GET, 'https://example.com/ok', body=b'ok')
+        jobs = [
+            DownloadJob('https://example.com/missing', tmp_path),
+            DownloadJob('https://example.com/ok', tmp_path),
+            DownloadJob('https://example.com/corrupted', tmp_path,
+                        expected_checksums={'md5': 'abcd'}),
+        ]
+
+        with pytest.raises(DownloadError) as exc_info:
+            DownloadManager(max_workers=1).download(jobs)
+
+        assert [job for job, _ in exc_info.value.failures] == [jobs[0], jobs[2]]
+        message = str(exc_info.value)
+        assert '2 download(s) failed' in message
+        assert 'https://example.com/missing: 404 Client Error' in message
+        assert 'https://example.com/corrupted: Computed md5 checksum' in message
+        assert (tmp_path / 'ok').read_bytes() == b'ok'
@@ -25,7 +25,8 @@ from osbs.utils import ImageName
 
 from atomic_reactor.inner import (BuildResults, BuildResultsEncoder,
                                   BuildResultsJSONDecoder, DockerBuildWorkflow,
-                                  FSWatcher, ImageBuildWorkflowData, TagConf)
+                                  FSWatcher, ImageBuildWorkflowData, SpilledResult, TagConf,
+                                  WorkflowDataJournal)
 from atomic_reactor.source import PathSource, DummySource
 from atomic_reactor.util import (
     DockerfileImages, validate_with_schema, graceful_chain_get
@@ -275,6 +276,22 @@ def test_good_plugins_conf(plugins_conf: List[Dict[str, Any]], workflow, caplog)
     assert all(record.levelno != logging.ERROR for record in caplog.records)
 
 
+def test_build_container_image_records_journal(workflow):
+    flexmock(DockerfileParser, content='df_content')
+    workflow.plugins_conf = [{'name': PushImagePlugin.key}]
+    workflow.plugin_files = [inspect.getfile(PushImagePlugin)]
+
+    workflow.build_container_image()
+
+    entries = [json.loads(line)
+               for line in workflow.context_dir.workflow_journal.read_text().splitlines()]
+    assert {"field": "plugins_results", "key": PushImagePlugin.key, "value": None} in entries
+    assert "plugins_durations" in {entry["field"] for entry in entries}
+
+    loaded = ImageBuildWorkflowData.load_from_dir(workflow.context_dir)
+    assert loaded.plugins_results == {PushImagePlugin.key: None}
+
+
 def test_parse_dockerfile_again_after_data_is_loaded(context_dir, build_dir, tmpdir):
     context_dir = ContextDir(Path(tmpdir.join("context_dir")))
     wf_data = ImageBuildWorkflowData.load_from_dir(context_dir)
@@ -648,3 +665,153 @@ class TestWorkflowData:
         assert wf_data.dockerfile_images == loaded_wf_data.dockerfile_images
         assert wf_data.tag_conf == loaded_wf_data.tag_conf
         assert wf_data.plugins_results == loaded_wf_data.plugins_results
+
+    def test_save_and_load_registry_metrics(self, tmpdir):
+        metrics = {
+            "binary_container_build": {
+                "registry.example.com": {
+                    "manifest": {"requests": 2, "errors": 0, "total_seconds": 0.5},
+                },
+            },
+        }
+        wf_data = ImageBuildWorkflowData(registry_metrics=metrics)
+
+        context_dir = ContextDir(Path(tmpdir.join("context_dir").mkdir()))
+        wf_data.save(context_dir)
+
+        loaded_wf_data = ImageBuildWorkflowData.load_from_dir(context_dir)
+        assert loaded_wf_data.registry_metrics == metrics
+
+    @pytest.mark.parametrize("saved_before", [True, False])
+    def test_load_with_journal(self, saved_before, tmpdir):
+        context_dir = ContextDir(Path(tmpdir.join("context_dir").mkdir()))
+        wf_data = ImageBuildWorkflowData()
+        wf_data.plugins_results["plugin_a"] = "result a"
+        if saved_before:
+            wf_data.save(context_dir)
+
+        journal = WorkflowDataJournal(context_dir, wf_data)
+        wf_data.plugins_results["plugin_b"] = [ImageName.parse("registry/image:1.0")]
+        wf_data.plugins_durations["plugin_b"] = 1.5
+        wf_data.tag_conf.add_floating_image("registry/image:latest")
+        journal.record_plugin("plugin_b")
+        # nothing has changed
+        journal.record_plugin("plugin_c")
+        # a crash while recording leaves an incomplete entry behind
+        with open(context_dir.workflow_journal, "a") as f:
+            f.write('{"field": "plugins_results", "key": "plugin_d", "val')
+
+        lines = context_dir.workflow_journal.read_text().splitlines()
+        assert len(lines) == 4
+
+        loaded = ImageBuildWorkflowData.load_from_dir(context_dir)
+        expected_results = {"plugin_b": [ImageName.parse("registry/image:1.0")]}
+        if saved_before:
+            expected_results["plugin_a"] = "result a"
+        assert loaded.plugins_results == expected_results
+        assert loaded.plugins_durations == {"plugin_b": 1.5}
+        assert loaded.tag_conf == wf_data.tag_conf
+
+        # entries recorded after the incomplete one are not lost
+        wf_data.plugins_results["plugin_e"] = "result e"
+        journal.record_plugin("plugin_e")
+        loaded = ImageBuildWorkflowData.load_from_dir(context_dir)
+        assert loaded.plugins_results["plugin_e"] == "result e"
+
+    def test_journal_checks_declared_writes(self, tmpdir):
+        context_dir = ContextDir(Path(tmpdir.join("context_dir").mkdir()))
+        wf_data = ImageBuildWorkflowData()
+        journal = WorkflowDataJournal(context_dir, wf_data)
+        flexmock(journal).should_call("_digest").with_args("buildargs").once()
+        flexmock(journal).should_call("_digest").with_args("annotations").never()
+
+        wf_data.buildargs["ARG"] = "value"
+        wf_data.annotations["key"] = "value"
+        journal.record_plugin("plugin_a", frozenset({"data/buildargs", "build_dir"}))
+
+        entries = [json.loads(line)
+                   for line in context_dir.workflow_journal.read_text().splitlines()]
+        assert [entry["field"] for entry in entries] == ["buildargs"]
+
+        # fields changed outside of the declared writes are caught up with by
+        # the next plugin which may have changed any field
+        flexmock(journal).should_call("_digest")
+        journal.record_plugin("plugin_b")
+        loaded = ImageBuildWorkflowData.load_from_dir(context_dir)
+        assert loaded.buildargs == {"ARG": "value"}
+        assert loaded.annotations == {"key": "value"}
+
+    def test_save_compacts_journal(self, tmpdir):
+        context_dir = ContextDir(Path(tmpdir.join("context_dir").mkdir()))
+        wf_data = ImageBuildWorkflowData()
+        journal = WorkflowDataJournal(context_dir, wf_data)
+        wf_data.plugins_results["plugin_a"] = "result a"
+        journal.record_plugin("plugin_a")
+        assert context_dir.workflow_journal.exists()
+
+        wf_data.save(context_dir)
+
+        assert not context_dir.workflow_journal.exists()
+        saved_data = json.loads(context_dir.workflow_json.read_bytes())
+        assert saved_data["plugins_results"] == {"plugin_a": "result a"}
+
+    def test_journal_compaction(self, tmpdir):
+        context_dir = ContextDir(Path(tmpdir.join("context_dir").mkdir()))
+        wf_data = ImageBuildWorkflowData()
+        journal = WorkflowDataJournal(context_dir, wf_data, compact_size=100)
+
+        wf_data.plugins_results["plugin_a"] = "a"
+        journal.record_plugin("plugin_a")
+        assert context_dir.workflow_journal.exists()
+        assert not context_dir.workflow_json.exists()
+
+        wf_data.plugins_results["plugin_b"] = "b" * 100
+        journal.record_plugin("plugin_b")
+        assert not context_dir.workflow_journal.exists()
+
+        loaded = ImageBuildWorkflowData.load_from_dir(context_dir)
+        assert loaded.plugins_results == {"plugin_a": "a", "plugin_b": "b" * 100}
+
+    def test_large_plugin_results_are_spilled(self, tmpdir, monkeypatch):
+        monkeypatch.setattr("atomic_reactor.inner.PLUGIN_RESULT_SPILL_SIZE", 100)
+        context_dir = ContextDir(Path(tmpdir.join("context_dir").mkdir()))
+        sbom = {"components": [{"name": f"pkg-{i}"} for i in range(20)],
+                "image": ImageName.parse("registry/image:1.0")}
+        wf_data = ImageBuildWorkflowData()
+        wf_data.plugins_results["generate_sbom"] = sbom
+        wf_data.plugins_results["small"] = "result"
+        wf_data.save(context_dir)
+
+        saved_results = json.loads(context_dir.workflow_json.read_bytes())["plugins_results"]
+        assert saved_results["small"] == "result"
+        digest = saved_results["generate_sbom"]["digest"]
+        assert saved_results["generate_sbom"] == {"__type__": "SpilledResult", "digest": digest}
+        assert context_dir.get_plugin_result_file(digest).exists()
+
+        loaded = ImageBuildWorkflowData.load_from_dir(context_dir)
+        # not loaded until accessed
+        assert isinstance(dict.__getitem__(loaded.plugins_results, "generate_sbom"),
+                          SpilledResult)
+        # results which were not accessed are saved as references again
+        loaded.save(context_dir)
+        assert json.loads(context_dir.workflow_json.read_bytes())["plugins_results"] == \
+            saved_results
+
+        loaded = ImageBuildWorkflowData.load_from_dir(context_dir)
+        assert loaded.plugins_results["generate_sbom"] == sbom
+        assert loaded.plugins_results == {"generate_sbom": sbom, "small": "result"}
+        assert loaded == wf_data
+
+    def test_large_plugin_results_are_spilled_from_journal(self, tmpdir, monkeypatch):
+        monkeypatch.setattr("atomic_reactor.inner.PLUGIN_RESULT_SPILL_SIZE", 100)
+        context_dir = ContextDir(Path(tmpdir.join("context_dir").mkdir()))
+        wf_data = ImageBuildWorkflowData()
+        journal = WorkflowDataJournal(context_dir, wf_data)
+        wf_data.plugins_results["fetch_maven_artifacts"] = ["artifact"] * 50
+        journal.record_plugin("fetch_maven_artifacts")
+
+        entry = json.loads(context_dir.workflow_journal.read_text())
+        assert entry["value"]["__type__"] == "SpilledResult"
+
+        loaded = ImageBuildWorkflowData.load_from_dir(context_dir)
+        assert loaded.plugins_results["fetch_maven_artifacts"] == ["artifact"] * 50
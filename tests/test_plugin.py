@@ -5,7 +5,10 @@ All rights reserved.
 This software may be modified and distributed under the terms
 of the BSD license. See the LICENSE file for details.
 """
+import asyncio
 import os.path
+import threading
+from pathlib import Path
 import time
 import inspect
 import sys
@@ -17,11 +20,19 @@ import pytest
 from atomic_reactor.inner import DockerBuildWorkflow
 from atomic_reactor.plugin import (
     Plugin,
+    PluginClasses,
     PluginExecutionInfo,
     PluginFailedException,
     PluginsRunner,
+    RESOURCE_DOCKERFILE,
     SleepPlugin,
+    build_dir_resource,
+    generate_plugin_index,
+    plugin_result_resource,
+    resources_overlap,
+    write_plugin_index,
 )
+from atomic_reactor.plugin_index import PLUGIN_INDEX
 from atomic_reactor.plugins.add_filesystem import AddFilesystemPlugin
 from atomic_reactor.plugins.tag_and_push import TagAndPushPlugin
 
@@ -63,6 +74,86 @@ class WriteRemoteLogsPlugin(Plugin):
         raise IOError("remote host is unavailable.")
 
 
+# Both plugins wait for each other, they only succeed when running concurrently
+CONCURRENT_BARRIER = threading.Barrier(2, timeout=10)
+
+
+class FetchArtifactsPlugin(Plugin):
+    key = "fetch_artifacts_concurrently"
+    reads = frozenset()
+    writes = frozenset({build_dir_resource("artifacts")})
+
+    def run(self):
+        CONCURRENT_BARRIER.wait()
+        return "artifacts"
+
+
+class FetchSourcesPlugin(Plugin):
+    key = "fetch_sources_concurrently"
+    reads = frozenset()
+    writes = frozenset({build_dir_resource("sources")})
+
+    def run(self):
+        CONCURRENT_BARRIER.wait()
+        return "sources"
+
+
+class UpdateDockerfilePlugin(Plugin):
+    key = "update_dockerfile"
+    reads = frozenset({plugin_result_resource(FetchArtifactsPlugin.key)})
+    writes = frozenset({RESOURCE_DOCKERFILE})
+
+    def run(self):
+        return self.workflow.data.plugins_results[FetchArtifactsPlugin.key] + " in Dockerfile"
+
+
+class FailingDockerfilePlugin(Plugin):
+    key = "fail_dockerfile"
+    is_allowed_to_fail = False
+    reads = frozenset({RESOURCE_DOCKERFILE})
+    writes = frozenset({RESOURCE_DOCKERFILE})
+
+    def run(self):
+        raise ValueError("broken Dockerfile")
+
+
+class DownloadArchivePlugin(Plugin):
+    key = "download_archive"
+    checkpoint = True
+    runs = 0
+
+    def run(self):
+        DownloadArchivePlugin.runs += 1
+        archive = self.workflow.build_dir.path / "archive.tar"
+        archive.write_text("archive")
+        return {"path": str(archive)}
+
+    def get_checkpoint_files(self, result):
+        return [Path(result["path"])]
+
+
+class AsyncFetchPlugin(Plugin):
+    key = "async_fetch"
+    reads = frozenset()
+    writes = frozenset()
+
+    async def run(self):
+        async def fetch(n):
+            await asyncio.sleep(0.01)
+            return n
+
+        results = await asyncio.gather(*(fetch(n) for n in range(10)))
+        return {"fetched": sum(results)}
+
+
+class AsyncFailingPlugin(Plugin):
+    key = "async_fail"
+    is_allowed_to_fail = False
+
+    async def run(self):
+        raise RuntimeError("async failure")
+
+
 def teardown_function(function):
     module_name, _, _ = os.path.basename(__file__).partition(".")
     if module_name in sys.modules:
@@ -143,6 +234,44 @@ def test_get_available_plugins(plugins_conf: List[Dict[str, Any]],
         assert "no such plugin" in err_msg
 
 
+def test_plugin_index_is_up_to_date():
+    assert PLUGIN_INDEX == generate_plugin_index(), "Run 'make plugin-index'"
+
+
+def test_write_plugin_index(tmp_path):
+    index_file = tmp_path / "plugin_index.py"
+    write_plugin_index(str(index_file))
+
+    namespace: Dict[str, Any] = {}
+    exec(index_file.read_text(), namespace)  # pylint: disable=exec-used
+    assert namespace["PLUGIN_INDEX"] == generate_plugin_index()
+
+
+def test_plugin_classes_are_imported_lazily(caplog):
+    plugin_classes = PluginClasses(
+        {
+            AddFilesystemPlugin.key: ("add_filesystem", "AddFilesystemPlugin"),
+            PushImagePlugin.key: ("add_filesystem", "AddFilesystemPlugin"),
+            "broken": ("no_such_module", "BrokenPlugin"),
+        },
+        {PushImagePlugin.key: PushImagePlugin},
+    )
+
+    assert len(plugin_classes) == 3
+    assert set(plugin_classes) == {AddFilesystemPlugin.key, PushImagePlugin.key, "broken"}
+    # available without importing the module
+    assert "broken" in plugin_classes
+    assert "cool_plugin" not in plugin_classes
+
+    assert plugin_classes[AddFilesystemPlugin.key] is AddFilesystemPlugin
+    # already loaded plugins take precedence over the index
+    assert plugin_classes[PushImagePlugin.key] is PushImagePlugin
+
+    with pytest.raises(KeyError):
+        plugin_classes["broken"]  # pylint: disable=pointless-statement
+    assert "can't load module 'no_such_module'" in caplog.text
+
+
 def test_check_no_reload(workflow):
     """
     test if plugins are not reloaded
@@ -253,6 +382,134 @@ def test_store_plugin_result(workflow: DockerBuildWorkflow):
     assert "pushed" == runner.plugins_results[PushImagePlugin.key]
 
 
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_run_async_plugins(max_workers: int, workflow: DockerBuildWorkflow):
+    plugins_conf = [
+        {"name": AsyncFetchPlugin.key},
+        {"name": PushImagePlugin.key},
+        {"name": AsyncFetchPlugin.key},
+    ]
+    runner = PluginsRunner(
+        workflow, plugins_conf, plugin_files=[THIS_FILE], max_workers=max_workers
+    )
+    runner.run()
+
+    assert runner.plugins_results[AsyncFetchPlugin.key]["fetched"] == 45
+    assert runner.plugins_results[PushImagePlugin.key] == "pushed"
+    assert AsyncFetchPlugin.key in workflow.data.plugins_durations
+    # the loop is stopped once all plugins have finished
+    assert not runner.event_loop.is_running
+
+
+def test_run_async_plugins_share_event_loop(workflow: DockerBuildWorkflow):
+    loops = []
+
+    class RememberLoopPlugin(AsyncFetchPlugin):
+        async def run(self):
+            loops.append(asyncio.get_running_loop())
+
+    runner = PluginsRunner(workflow, [])
+    for _ in range(2):
+        runner._call_run(RememberLoopPlugin(workflow))
+    runner.event_loop.close()
+
+    assert len(loops) == 2
+    assert loops[0] is loops[1]
+
+
+def test_run_async_plugin_failure(workflow: DockerBuildWorkflow):
+    runner = PluginsRunner(
+        workflow, [{"name": AsyncFailingPlugin.key}], plugin_files=[THIS_FILE]
+    )
+
+    with pytest.raises(PluginFailedException, match="async failure"):
+        runner.run()
+    assert "async failure" in workflow.data.plugins_errors[AsyncFailingPlugin.key]
+    assert not runner.event_loop.is_running
+
+
+def test_checkpoint_plugins(workflow: DockerBuildWorkflow):
+    def run_plugins():
+        runner = PluginsRunner(
+            workflow,
+            [{"name": PushImagePlugin.key}, {"name": DownloadArchivePlugin.key}],
+            plugin_files=[THIS_FILE],
+            checkpoints=True,
+        )
+        return runner.run()
+
+    DownloadArchivePlugin.runs = 0
+    results = run_plugins()
+    archive_path = workflow.build_dir.path / "archive.tar"
+    checkpoint_path = workflow.context_dir.get_plugin_checkpoint(DownloadArchivePlugin.key)
+    assert checkpoint_path.exists()
+    # plugins which do not support checkpoints do not get any
+    assert not workflow.context_dir.get_plugin_checkpoint(PushImagePlugin.key).exists()
+
+    # retried task with valid checkpoint
+    assert run_plugins() == results
+    assert DownloadArchivePlugin.runs == 1
+
+    # the produced file has changed
+    archive_path.write_text("modified archive")
+    assert run_plugins() == results
+    assert DownloadArchivePlugin.runs == 2
+
+    # inputs have changed
+    workflow.user_params["git_ref"] = "new-ref"
+    run_plugins()
+    assert DownloadArchivePlugin.runs == 3
+
+
+def test_checkpoint_plugins_disabled(workflow: DockerBuildWorkflow):
+    DownloadArchivePlugin.runs = 0
+    for _ in range(2):
+        PluginsRunner(workflow, [{"name": DownloadArchivePlugin.key}],
+                      plugin_files=[THIS_FILE]).run()
+
+    assert DownloadArchivePlugin.runs == 2
+    assert not workflow.context_dir.get_plugin_checkpoint(DownloadArchivePlugin.key).exists()
+
+
+@pytest.mark.parametrize("enabled,cprofile", [
+    [False, False],
+    [True, False],
+    [True, True],
+])
+def test_profile_plugins(enabled: bool, cprofile: bool, workflow: DockerBuildWorkflow):
+    workflow.conf.conf = {
+        "version": 1,
+        "plugin_profiling": {"enabled": enabled, "cprofile": cprofile},
+    }
+    runner = PluginsRunner(
+        workflow,
+        [{"name": CleanupPlugin.key}, {"name": WriteRemoteLogsPlugin.key}],
+        plugin_files=[THIS_FILE],
+    )
+    runner.run()
+
+    pstats_dir = workflow.context_dir.get_plugin_pstats(CleanupPlugin.key).parent
+    if not enabled:
+        assert workflow.data.plugins_profiles == {}
+        assert not list(pstats_dir.iterdir())
+        return
+
+    # failed plugins are profiled as well
+    assert set(workflow.data.plugins_profiles) == {CleanupPlugin.key, WriteRemoteLogsPlugin.key}
+    profile = workflow.data.plugins_profiles[CleanupPlugin.key]
+    assert profile["http_requests"] == 0
+    assert profile["cpu_user"] >= 0
+    assert "_lock" not in profile
+
+    pstats_files = {path.name for path in pstats_dir.iterdir()}
+    if cprofile:
+        assert pstats_files == {
+            f"{CleanupPlugin.key}.pstats", f"{WriteRemoteLogsPlugin.key}.pstats"
+        }
+    else:
+        assert pstats_files == set()
+
+
 @pytest.mark.parametrize("allow_plugin_fail", [True, False])
 def test_run_plugins_in_keep_going_mode(
         allow_plugin_fail: bool, workflow: DockerBuildWorkflow, caplog
@@ -283,3 +540,88 @@ def test_run_plugins_in_keep_going_mode(
     # The subsequent plug should get a chance to run after previous error.
     assert "continuing..." in caplog.text
     assert runner.plugins_results[CleanupPlugin.key] is None
+
+
+@pytest.mark.parametrize("left,right,expected", [
+    [{"build_dir"}, {"build_dir/Dockerfile"}, True],
+    [{"build_dir/Dockerfile"}, {"build_dir"}, True],
+    [{"data/buildargs"}, {"data/buildargs"}, True],
+    [{"build_dir/artifacts"}, {"build_dir/artifacts_list"}, False],
+    [{"data/buildargs"}, {"plugins_results/buildargs"}, False],
+    [set(), {"build_dir"}, False],
+    [{"build_dir/remote-source-*.tar.gz"}, {"build_dir/remote-source-foo.tar.gz"}, True],
+    [{"build_dir/remote-source-foo.tar.gz"}, {"build_dir/remote-source-*.tar.gz"}, True],
+    [{"build_dir"}, {"build_dir/remote-source-*.tar.gz"}, True],
+    [{"build_dir/remote-source-*.tar.gz"}, {"build_dir/remote-source.tar.gz"}, False],
+])
+def test_resources_overlap(left, right, expected):
+    assert resources_overlap(frozenset(left), frozenset(right)) == expected
+
+
+def test_get_plugin_dependencies(workflow: DockerBuildWorkflow):
+    plugins_conf = [
+        {"name": FetchArtifactsPlugin.key},
+        {"name": FetchSourcesPlugin.key},
+        {"name": UpdateDockerfilePlugin.key},
+        {"name": FailingDockerfilePlugin.key},
+        # does not declare resources
+        {"name": CleanupPlugin.key},
+        {"name": FetchSourcesPlugin.key},
+    ]
+    runner = PluginsRunner(workflow, plugins_conf, plugin_files=[THIS_FILE], max_workers=2)
+
+    assert runner.get_plugin_dependencies() == [
+        set(),
+        set(),
+        {0},
+        {2},
+        {0, 1, 2, 3},
+        {1, 4},
+    ]
+
+
+def test_run_plugins_concurrently(workflow: DockerBuildWorkflow):
+    plugins_conf = [
+        {"name": FetchArtifactsPlugin.key},
+        {"name": FetchSourcesPlugin.key},
+        {"name": UpdateDockerfilePlugin.key},
+    ]
+    runner = PluginsRunner(
+        workflow, plugins_conf, plugin_files=[THIS_FILE],
+        plugins_results=workflow.data.plugins_results, max_workers=2,
+    )
+    runner.run()
+
+    assert runner.plugins_results == {
+        FetchArtifactsPlugin.key: "artifacts",
+        FetchSourcesPlugin.key: "sources",
+        UpdateDockerfilePlugin.key: "artifacts in Dockerfile",
+    }
+    for key in runner.plugins_results:
+        assert key in workflow.data.plugins_timestamps
+        assert key in workflow.data.plugins_durations
+
+
+@pytest.mark.parametrize("keep_going", [True, False])
+def test_run_plugins_concurrently_failure(keep_going: bool, workflow: DockerBuildWorkflow):
+    plugins_conf = [
+        {"name": PushImagePlugin.key},
+        {"name": FailingDockerfilePlugin.key},
+        {"name": WriteRemoteLogsPlugin.key},
+        {"name": CleanupPlugin.key},
+    ]
+    runner = PluginsRunner(
+        workflow, plugins_conf, plugin_files=[THIS_FILE], keep_going=keep_going, max_workers=2
+    )
+
+    with pytest.raises(PluginFailedException, match="broken Dockerfile"):
+        runner.run()
+
+    assert "broken Dockerfile" in workflow.data.plugins_errors[FailingDockerfilePlugin.key]
+    # the allowed failure of write_logs is not recorded as a plugin error
+    assert WriteRemoteLogsPlugin.key not in workflow.data.plugins_errors
+    assert runner.plugins_results[PushImagePlugin.key] == "pushed"
+    if keep_going:
+        assert runner.plugins_results[CleanupPlugin.key] is None
+    else:
+        assert CleanupPlugin.key not in runner.plugins_results
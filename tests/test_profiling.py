@@ -0,0 +1,117 @@
+"""
+Copyright (c) 2023 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+"""
+import pstats
+import resource
+import subprocess
+import threading
+
+import pytest
+import requests
+import responses
+
+from atomic_reactor.profiling import RUSAGE_CPU, hook_record_http_response, profile_plugin
+from atomic_reactor.utils.retries import get_retrying_requests_session
+
+
+def test_profile_plugin_records_usage(tmp_path):
+    data_file = tmp_path / "data"
+
+    with profile_plugin("some_plugin") as profile:
+        sum(i * i for i in range(200000))
+        data_file.write_bytes(b"x" * 4096)
+        subprocess.run(["true"], check=True)
+
+    assert profile.cpu_user + profile.cpu_system > 0
+    assert profile.subprocess_cpu >= 0
+    assert profile.max_rss_delta_kb >= 0
+    assert profile.write_bytes >= 0
+    assert set(profile.as_dict()) == {
+        "cpu_user", "cpu_system", "subprocess_cpu", "max_rss_delta_kb",
+        "read_bytes", "write_bytes", "http_requests", "http_response_bytes", "overlapped",
+    }
+    assert not profile.overlapped
+
+
+def test_profile_plugin_overlapping_plugins():
+    first_started = threading.Event()
+    second_finished = threading.Event()
+    profiles = {}
+
+    def run_first():
+        with profile_plugin("first") as profile:
+            first_started.set()
+            second_finished.wait()
+        profiles["first"] = profile
+
+    thread = threading.Thread(target=run_first)
+    thread.start()
+    first_started.wait()
+    with profile_plugin("second") as profiles["second"]:
+        pass
+    second_finished.set()
+    thread.join()
+
+    for profile in profiles.values():
+        assert profile.overlapped
+        # process-wide, they would include the usage of the other plugin
+        assert profile.subprocess_cpu is None
+        assert profile.max_rss_delta_kb is None
+        assert profile.cpu_user is not None or RUSAGE_CPU == resource.RUSAGE_SELF
+
+    with profile_plugin("third") as profile:
+        pass
+    assert not profile.overlapped
+    assert profile.subprocess_cpu is not None
+
+
+def test_profile_plugin_records_usage_on_failure():
+    with pytest.raises(ValueError):
+        with profile_plugin("some_plugin") as profile:
+            hook_record_http_response(requests.Response())
+            raise ValueError("failed")
+
+    assert profile.http_requests == 1
+
+
+@responses.activate
+def test_profile_plugin_counts_http_responses():
+    url = "https://registry.example.com/v2/"
+    responses.add(responses.GET, url, body=b"x" * 100, headers={"Content-Length": "100"})
+    session = get_retrying_requests_session()
+
+    # not profiled
+    session.get(url)
+
+    with profile_plugin("some_plugin") as profile:
+        session.get(url)
+        session.get(url, stream=True).close()
+
+    assert profile.http_requests == 2
+    assert profile.http_response_bytes == 200
+
+
+def test_profile_plugin_ignores_other_threads():
+    def send_request():
+        hook_record_http_response(requests.Response())
+
+    with profile_plugin("some_plugin") as profile:
+        thread = threading.Thread(target=send_request)
+        thread.start()
+        thread.join()
+
+    assert profile.http_requests == 0
+
+
+def test_profile_plugin_cprofile(tmp_path):
+    pstats_path = tmp_path / "some_plugin.pstats"
+
+    with profile_plugin("some_plugin", pstats_path):
+        sorted(range(1000), key=lambda i: -i)
+
+    stats = pstats.Stats(str(pstats_path))
+    assert any("sorted" in func_name for _, _, func_name in stats.stats)
@@ -6,6 +6,7 @@ This software may be modified and distributed under the terms
 of the BSD license. See the LICENSE file for details.
 """
 
+import hashlib
 import io
 import json
 import logging
@@ -20,6 +21,8 @@ from requests.exceptions import HTTPError, RetryError
 import responses
 import inspect
 import signal
+import threading
+import time
 from base64 import b64encode
 from collections import namedtuple
 
@@ -32,14 +35,16 @@ import yaml
 
 from atomic_reactor.constants import (IMAGE_TYPE_DOCKER_ARCHIVE, IMAGE_TYPE_OCI, IMAGE_TYPE_OCI_TAR,
                                       MEDIA_TYPE_DOCKER_V2_SCHEMA1, MEDIA_TYPE_DOCKER_V2_SCHEMA2,
-                                      MEDIA_TYPE_DOCKER_V2_MANIFEST_LIST,
+                                      MEDIA_TYPE_DOCKER_V2_MANIFEST_LIST, MEDIA_TYPE_OCI_V1,
                                       DOCKERIGNORE, RELATIVE_REPOS_PATH)
 from atomic_reactor.util import (figure_out_build_file,
                                  render_yum_repo, process_substitutions,
-                                 get_checksums, print_version_of_tools,
+                                 get_checksums, ParallelHasher, print_version_of_tools,
+                                 ChecksumRegistry, set_checksum_registry,
                                  get_version_of_tools,
                                  human_size, CommandResult,
                                  registry_hostname, Dockercfg, RegistrySession,
+                                 RegistryCache, RegistryClient,
                                  get_manifest_digests, ManifestDigest,
                                  get_manifest_list, get_all_manifests,
                                  get_inspect_for_image, get_manifest,
@@ -55,7 +60,7 @@ from atomic_reactor.util import (figure_out_build_file,
                                  get_unique_images,
                                  get_image_upload_filename,
                                  read_yaml, read_yaml_from_file_path, read_yaml_from_url,
-                                 validate_with_schema,
+                                 validate_with_schema, SchemaRegistry,
                                  OSBSLogs,
                                  dump_stacktraces, setup_introspection_signal_handler,
                                  allow_path_in_dockerignore,
@@ -66,9 +71,10 @@ from atomic_reactor.util import (figure_out_build_file,
                                  create_tar_gz_archive,
                                  safe_extractall
                                  )
-from tests.constants import MOCK, REACTOR_CONFIG_MAP
+from tests.constants import BENCHMARK, MOCK, REACTOR_CONFIG_MAP
 import atomic_reactor.util
 from osbs.utils import ImageName
+from osbs.utils import yaml as osbs_yaml
 from osbs.exceptions import OsbsValidationException
 
 if MOCK:
@@ -209,6 +215,128 @@ def test_get_hexdigests(tmpdir, content, algorithms, expected, write_to_file, sh
         assert checksums == expected
 
 
+class ReadOnly(object):
+    """File-like object without readinto"""
+
+    def __init__(self, content):
+        self._f = io.BytesIO(content)
+
+    def read(self, size):
+        return self._f.read(size)
+
+
+@pytest.mark.parametrize('file_type', ['path', 'bytesio', 'read_only'])
+@pytest.mark.parametrize('size', [0, 1000, 4096, 100 * 1024 + 7])
+def test_get_checksums_in_blocks(tmp_path, file_type, size):
+    content = os.urandom(size)
+    if file_type == 'path':
+        path = tmp_path / 'file'
+        path.write_bytes(content)
+        f = str(path)
+    elif file_type == 'bytesio':
+        f = io.BytesIO(content)
+    else:
+        f = ReadOnly(content)
+
+    checksums = get_checksums(f, ['md5', 'sha256'], blocksize=4096)
+
+    assert checksums == {'md5sum': hashlib.md5(content).hexdigest(),
+                         'sha256sum': hashlib.sha256(content).hexdigest()}
+
+
+@pytest.fixture
+def checksum_registry(tmp_path):
+    registry = ChecksumRegistry(tmp_path / 'checksums.json')
+    set_checksum_registry(registry)
+    yield registry
+    set_checksum_registry(None)
+
+
+def test_get_checksums_registered(tmp_path, checksum_registry):
+    path = tmp_path / 'image.tar'
+    path.write_bytes(b'abc')
+    md5, sha256 = hashlib.md5(b'abc').hexdigest(), hashlib.sha256(b'abc').hexdigest()
+
+    assert get_checksums(str(path), ['md5']) == {'md5sum': md5}
+    computed = []
+    compute_checksums = atomic_reactor.util._compute_checksums
+
+    def _compute_checksums(fd, hash_objs, blocksize):
+        computed.extend(hash_obj.name for hash_obj in hash_objs)
+        compute_checksums(fd, hash_objs, blocksize)
+
+    flexmock(atomic_reactor.util).should_receive('_compute_checksums').replace_with(
+        _compute_checksums)
+    assert get_checksums(str(path), ['md5', 'sha256']) == {'md5sum': md5, 'sha256sum': sha256}
+    assert computed == ['sha256']
+
+    # known to other processes, e.g. the next task of the build, once saved
+    assert not checksum_registry.path.exists()
+    checksum_registry.save()
+    set_checksum_registry(ChecksumRegistry(checksum_registry.path))
+    flexmock(atomic_reactor.util).should_receive('_compute_checksums').never()
+    assert get_checksums(str(path), ['sha256', 'md5']) == {'sha256sum': sha256, 'md5sum': md5}
+
+
+def test_checksum_registry_save_merges(tmp_path, checksum_registry):
+    paths = [tmp_path / 'first', tmp_path / 'second']
+    for path in paths:
+        path.write_bytes(path.name.encode())
+    other = ChecksumRegistry(checksum_registry.path)
+
+    checksum_registry.put(str(paths[0]), {'md5': 'first-md5'})
+    other.put(str(paths[1]), {'md5': 'second-md5'})
+    other.save()
+    checksum_registry.save()
+    # nothing new to save
+    flexmock(atomic_reactor.util).should_receive('NamedTemporaryFile').never()
+    checksum_registry.save()
+
+    loaded = ChecksumRegistry(checksum_registry.path)
+    assert loaded.get(str(paths[0])) == {'md5': 'first-md5'}
+    assert loaded.get(str(paths[1])) == {'md5': 'second-md5'}
+
+
+def test_checksum_registry_file_changed(tmp_path, checksum_registry):
+    path = tmp_path / 'image.tar'
+    path.write_bytes(b'abc')
+    checksum_registry.put(str(path), {'md5': hashlib.md5(b'abc').hexdigest()})
+
+    path.write_bytes(b'abcd')
+
+    assert checksum_registry.get(str(path)) == {}
+    assert get_checksums(str(path), ['md5']) == {'md5sum': hashlib.md5(b'abcd').hexdigest()}
+
+
+def test_parallel_hasher():
+    hash_objs = [hashlib.md5(), hashlib.sha256()]
+    released = []
+    with ParallelHasher(hash_objs, depth=1) as hasher:
+        for i in range(10):
+            hasher.update(b'x' * i, done=lambda i=i: released.append(i))
+
+    content = b''.join(b'x' * i for i in range(10))
+    assert [h.hexdigest() for h in hash_objs] == [hashlib.md5(content).hexdigest(),
+                                                  hashlib.sha256(content).hexdigest()]
+    # released once both hash objects are done with the data
+    assert sorted(released) == list(range(10))
+
+
+def test_parallel_hasher_error():
+    class BrokenHash(object):
+        def update(self, data):
+            raise ValueError('broken')
+
+    released = []
+
+    with pytest.raises(ValueError, match='broken'):
+        with ParallelHasher([hashlib.md5(), BrokenHash()]) as hasher:
+            hasher.update(b'abc', done=lambda: released.append(True))
+            hasher.update(b'def', done=lambda: released.append(True))
+
+    assert released == [True, True]
+
+
 @pytest.mark.parametrize('image_type, expected', [
     (IMAGE_TYPE_DOCKER_ARCHIVE, 'docker-image-XXX.x86_64.tar.gz'),
     (IMAGE_TYPE_OCI_TAR, 'oci-image-XXX.x86_64.tar.gz'),
@@ -813,6 +941,56 @@ def test_get_manifest_digests_missing(tmpdir, has_content_type_header, has_conte
             assert actual_digests.oci_index is True
 
 
+@pytest.mark.parametrize('head_status, head_headers, get_headers, expected, requests_count', [
+    # HEAD answers everything
+    (200, {'Content-Type': MEDIA_TYPE_DOCKER_V2_SCHEMA2, 'Docker-Content-Digest': 'v2-digest'},
+     None, {'v2': 'v2-digest'}, 1),
+    # HEAD is not allowed, GET answers with a combined Accept header
+    (405, {}, {'Content-Type': MEDIA_TYPE_OCI_V1, 'Docker-Content-Digest': 'oci-digest'},
+     {'oci': 'oci-digest'}, 2),
+    # HEAD doesn't say what it would serve, media type is guessed from content
+    (200, {'Docker-Content-Digest': 'v2-digest'}, {'Docker-Content-Digest': 'v2-digest'},
+     {'v2': 'v2-digest'}, 2),
+    # schema 1 served although newer types were accepted, query one by one
+    (200, {'Content-Type': MEDIA_TYPE_DOCKER_V2_SCHEMA1, 'Docker-Content-Digest': 'v1-digest'},
+     None, {'v1': 'v1-digest', 'v2': 'v2-digest'}, 4),
+    # not found, query one by one to report it the usual way
+    (404, {}, None, None, 4),
+])
+@responses.activate
+def test_get_manifest_digests_single_request(head_status, head_headers, get_headers, expected,
+                                             requests_count):
+    image = ImageName.parse('example.com/spam:latest')
+    url = 'https://example.com/v2/spam/manifests/latest'
+    responses.add(responses.HEAD, url, status=head_status, headers=head_headers)
+
+    def get_callback(request):
+        accept = request.headers['Accept']
+        if ', ' in accept:
+            manifest = {'schemaVersion': 2, 'mediaType': MEDIA_TYPE_DOCKER_V2_SCHEMA2}
+            return (200, get_headers, json.dumps(manifest))
+        versions = {MEDIA_TYPE_DOCKER_V2_SCHEMA1: 'v1', MEDIA_TYPE_DOCKER_V2_SCHEMA2: 'v2'}
+        if head_status == 404 or accept not in versions:
+            return (404, {}, '')
+        digest = f'{versions[accept]}-digest'
+        return (200, {'Content-Type': accept, 'Docker-Content-Digest': digest}, '')
+
+    responses.add_callback(responses.GET, url, callback=get_callback, content_type=None)
+
+    kwargs = {
+        'image': image,
+        'registry': 'https://example.com',
+        'versions': ('v1', 'v2', 'oci'),
+        'single_request': True,
+    }
+    if expected is None:
+        with pytest.raises(HTTPError):
+            get_manifest_digests(**kwargs)
+    else:
+        assert get_manifest_digests(**kwargs) == expected
+    assert len(responses.calls) == requests_count
+
+
 @responses.activate
 def test_get_manifest_digests_connection_error(tmpdir):
     # Test that our code to handle falling back from https to http
@@ -859,6 +1037,233 @@ def test_get_manifest_non_existent_image_error(tmpdir):
         get_manifest(image, session, 'v2')
 
 
+def test_registry_sessions_share_requests_session(tmpdir):
+    session = RegistrySession('registry.example.com', access=('pull',))
+
+    assert RegistrySession('registry.example.com', access=('pull',)).session is session.session
+    assert RegistrySession('registry.example.com').session is not session.session
+    assert RegistrySession('registry.example.com', access=('pull',),
+                           insecure=True).session is not session.session
+    # the credentials are not shared, each session has its own auth
+    assert RegistrySession('registry.example.com', access=('pull',)).auth is not session.auth
+
+
+def sha256_digest(content):
+    return 'sha256:' + hashlib.sha256(content).hexdigest()
+
+
+def test_registry_cache_blobs(tmp_path):
+    cache = RegistryCache(tmp_path)
+    content = b'{"architecture": "amd64"}'
+    digest = sha256_digest(content)
+
+    assert cache.get_blob(digest) is None
+    cache.put_blob(digest, content)
+    assert cache.get_blob(digest) == content
+    # another process sharing the cache dir
+    assert RegistryCache(tmp_path).get_blob(digest) == content
+
+    # content not matching the digest and unsupported digests are never cached
+    cache.put_blob(sha256_digest(b'other'), content)
+    assert cache.get_blob(sha256_digest(b'other')) is None
+    cache.put_blob('md5:1234', content)
+    assert cache.get_blob('md5:1234') is None
+
+
+def test_registry_cache_manifests(tmp_path):
+    cache = RegistryCache(tmp_path)
+    # no mediaType in the content, it cannot be guessed
+    content = b'{"schemaVersion": 2}'
+    digest = sha256_digest(content)
+
+    cache.put_manifest(digest, content, MEDIA_TYPE_OCI_V1)
+    assert cache.get_manifest(digest, MEDIA_TYPE_OCI_V1) == content
+    assert cache.get_manifest(digest, MEDIA_TYPE_DOCKER_V2_SCHEMA2) is None
+
+    # blobs stored without a media type are not served as manifests
+    other = b'{"schemaVersion": 2, "config": {}}'
+    cache.put_blob(sha256_digest(other), other)
+    assert cache.get_manifest(sha256_digest(other), MEDIA_TYPE_OCI_V1) is None
+
+    cache.put_manifest(sha256_digest(b'other'), content, MEDIA_TYPE_OCI_V1)
+    assert cache.get_manifest(sha256_digest(b'other'), MEDIA_TYPE_OCI_V1) is None
+
+
+@responses.activate
+def test_registry_client_cached_manifest_media_type(tmp_path):
+    manifest = json.dumps({'schemaVersion': 2, 'config': {}}).encode()
+    digest = sha256_digest(manifest)
+    image = ImageName.parse(f'example.com/spam@{digest}')
+    responses.add(responses.GET, f'https://example.com/v2/spam/manifests/{digest}',
+                  body=manifest, headers={'Docker-Content-Digest': digest},
+                  content_type=MEDIA_TYPE_OCI_V1)
+
+    client = RegistryClient(RegistrySession('https://example.com'),
+                            cache=RegistryCache(tmp_path))
+    assert client.get_manifest(image, 'oci')[0].content == manifest
+    assert client.get_manifest(image, 'oci')[0].content == manifest
+    assert len(responses.calls) == 1
+
+    # the cached OCI manifest is not passed off as a docker v2 manifest
+    assert client.get_manifest(image, 'v2')[0] is None
+    assert len(responses.calls) == 2
+
+
+def test_registry_cache_evicts_least_recently_used(tmp_path):
+    cache = RegistryCache(tmp_path, max_size=25)
+    blobs = [f'blob-{i}'.encode() * 2 for i in range(3)]  # 12 bytes each
+    digests = [sha256_digest(blob) for blob in blobs]
+
+    cache.put_blob(digests[0], blobs[0])
+    cache.put_blob(digests[1], blobs[1])
+    # make the first blob the most recently used one
+    os.utime(tmp_path / 'blobs' / digests[1].split(':')[1], (0, 0))
+    assert cache.get_blob(digests[0]) == blobs[0]
+    cache.put_blob(digests[2], blobs[2])
+
+    assert cache.get_blob(digests[0]) == blobs[0]
+    assert cache.get_blob(digests[1]) is None
+    assert cache.get_blob(digests[2]) == blobs[2]
+
+
+def test_registry_cache_tags_expire(tmp_path):
+    cache = RegistryCache(tmp_path, tag_ttl=60)
+    image = ImageName.parse('example.com/spam:latest')
+    digest = sha256_digest(b'manifest')
+
+    cache.put_tag('https://example.com', image, MEDIA_TYPE_DOCKER_V2_SCHEMA2, digest)
+    assert cache.get_tag('https://example.com', image, MEDIA_TYPE_DOCKER_V2_SCHEMA2) == digest
+    assert cache.get_tag('https://example.com', image, MEDIA_TYPE_OCI_V1) is None
+    assert cache.get_tag('https://other.com', image, MEDIA_TYPE_DOCKER_V2_SCHEMA2) is None
+
+    later = time.time() + 61
+    flexmock(time).should_receive('time').and_return(later)
+    assert cache.get_tag('https://example.com', image, MEDIA_TYPE_DOCKER_V2_SCHEMA2) is None
+
+
+@responses.activate
+@pytest.mark.parametrize('resolve_tags_from_cache', [True, False])
+def test_registry_client_uses_cache(tmp_path, resolve_tags_from_cache):
+    image = ImageName.parse('example.com/spam:latest')
+    config = json.dumps({'architecture': 'amd64'}).encode()
+    config_digest = sha256_digest(config)
+    manifest = json.dumps({
+        'schemaVersion': 2,
+        'mediaType': MEDIA_TYPE_DOCKER_V2_SCHEMA2,
+        'config': {'digest': config_digest},
+    }).encode()
+    manifest_digest = sha256_digest(manifest)
+    headers = {'Docker-Content-Digest': manifest_digest}
+
+    for reference in ('latest', manifest_digest):
+        responses.add(responses.GET, f'https://example.com/v2/spam/manifests/{reference}',
+                      body=manifest, headers=headers, content_type=MEDIA_TYPE_DOCKER_V2_SCHEMA2)
+    responses.add(responses.GET, f'https://example.com/v2/spam/blobs/{config_digest}',
+                  body=config)
+
+    cache = RegistryCache(tmp_path)
+    for _ in range(2):
+        client = RegistryClient(RegistrySession('https://example.com'), cache=cache,
+                                resolve_tags_from_cache=resolve_tags_from_cache)
+        response, _ = client.get_manifest(image, 'v2')
+        assert response.json()['config']['digest'] == config_digest
+        assert response.headers['Docker-Content-Digest'] == manifest_digest
+        assert client.get_config_and_id_from_registry(image, manifest_digest) == (
+            {'architecture': 'amd64'}, config_digest
+        )
+
+    # the manifest by tag, the config blob; by digest, the manifest is already cached
+    expected_calls = 2 if resolve_tags_from_cache else 3
+    assert len(responses.calls) == expected_calls
+
+
+@responses.activate
+@pytest.mark.parametrize('tag_moved', [True, False])
+def test_registry_client_revalidates_tags(tmp_path, tag_moved):
+    image = ImageName.parse('example.com/spam:latest')
+    manifests = [
+        json.dumps({'schemaVersion': 2, 'mediaType': MEDIA_TYPE_DOCKER_V2_SCHEMA2,
+                    'config': {'digest': sha256_digest(config)}}).encode()
+        for config in (b'old config', b'new config')
+    ]
+    served = []
+
+    def manifest_callback(request):
+        manifest = manifests[1] if tag_moved and served else manifests[0]
+        digest = sha256_digest(manifest)
+        served.append(request.headers.get('If-None-Match'))
+        headers = {'Docker-Content-Digest': digest, 'ETag': f'"{digest}"'}
+        if request.headers.get('If-None-Match') == f'"{digest}"':
+            return 304, headers, ''
+        return 200, {**headers, 'Content-Type': MEDIA_TYPE_DOCKER_V2_SCHEMA2}, manifest
+
+    responses.add_callback(responses.GET, 'https://example.com/v2/spam/manifests/latest',
+                           callback=manifest_callback)
+
+    cache = RegistryCache(tmp_path)
+    client = RegistryClient(RegistrySession('https://example.com'), cache=cache)
+    first, _ = client.get_manifest(image, 'v2')
+    second, _ = client.get_manifest(image, 'v2')
+
+    assert first.content == manifests[0]
+    assert served == [None, f'"{sha256_digest(manifests[0])}"']
+    stats = cache.get_stats()
+    if tag_moved:
+        assert second.content == manifests[1]
+        assert (stats.get('tag_fetched'), stats.get('tag_revalidated')) == (2, None)
+        assert stats['tag_hit_ratio'] == 0
+    else:
+        assert second.content == manifests[0]
+        assert second.headers['Docker-Content-Digest'] == sha256_digest(manifests[0])
+        assert (stats['tag_fetched'], stats['tag_revalidated']) == (1, 1)
+        assert stats['tag_hit_ratio'] == 0.5
+
+
+@responses.activate
+@pytest.mark.parametrize('resolve_tags_from_cache', [True, False])
+def test_registry_client_caches_not_found(tmp_path, resolve_tags_from_cache):
+    image = ImageName.parse('example.com/spam:latest')
+    responses.add(responses.GET, 'https://example.com/v2/spam/manifests/latest', status=404)
+
+    cache = RegistryCache(tmp_path, not_found_ttl=15)
+    client = RegistryClient(RegistrySession('https://example.com'), cache=cache,
+                            resolve_tags_from_cache=resolve_tags_from_cache)
+    for _ in range(2):
+        response, not_found = client.get_manifest(image, 'v2')
+        assert response is None
+        assert not_found.response.status_code == 404
+    # other media types are looked up
+    assert client.get_manifest(image, 'v2_list')[0] is None
+
+    expected_calls = 2 if resolve_tags_from_cache else 3
+    assert len(responses.calls) == expected_calls
+    if resolve_tags_from_cache:
+        stats = cache.get_stats()
+        assert (stats['not_found'], stats['not_found_hits']) == (2, 1)
+
+    later = time.time() + 16
+    flexmock(time).should_receive('time').and_return(later)
+    client.get_manifest(image, 'v2')
+    assert len(responses.calls) == expected_calls + 1
+
+
+def test_registry_cache_stats(tmp_path):
+    cache = RegistryCache(tmp_path)
+    assert cache.get_stats() == {
+        'blob_hit_ratio': 0.0, 'tag_hit_ratio': 0.0, 'not_found_hit_ratio': 0.0,
+    }
+
+    content = b'manifest'
+    cache.get_blob(sha256_digest(content))
+    cache.put_blob(sha256_digest(content), content)
+    for _ in range(3):
+        cache.get_blob(sha256_digest(content))
+
+    stats = cache.get_stats()
+    assert (stats['blob_hits'], stats['blob_misses']) == (3, 1)
+    assert stats['blob_hit_ratio'] == 0.75
+
+
 @pytest.mark.parametrize('namespace,repo,explicit,expected', [
     ('foo', 'bar', False, 'foo/bar'),
     ('foo', 'bar', True, 'foo/bar'),
@@ -1072,6 +1477,80 @@ def test_validate_with_schema(data, schema, valid):
             validate_with_schema(data, schema)
 
 
+def test_schema_registry_loads_schema_once():
+    registry = SchemaRegistry()
+    flexmock(osbs_yaml).should_call("load_schema").once()
+
+    for _ in range(3):
+        registry.validate({"plugins_conf": [{"name": "foo"}]}, "schemas/plugins.json")
+    with pytest.raises(OsbsValidationException, match="'name' is a required property"):
+        registry.validate({"plugins_conf": [{}]}, "schemas/plugins.json")
+
+
+def test_schema_registry_validator_per_thread():
+    registry = SchemaRegistry()
+    validators = [registry.get_validator("atomic_reactor", "schemas/plugins.json")]
+
+    thread = threading.Thread(
+        target=lambda: validators.append(
+            registry.get_validator("atomic_reactor", "schemas/plugins.json")
+        )
+    )
+    thread.start()
+    thread.join()
+
+    assert validators[0] is registry.get_validator("atomic_reactor", "schemas/plugins.json")
+    assert validators[0] is not validators[1]
+    assert validators[0].schema is validators[1].schema
+
+
+def test_schema_registry_precompile():
+    registry = SchemaRegistry()
+    schemas_dir = os.path.join(os.path.dirname(atomic_reactor.util.__file__), "schemas")
+    expected = len([name for name in os.listdir(schemas_dir) if name.endswith(".json")])
+
+    assert registry.precompile() == expected
+
+    flexmock(osbs_yaml).should_receive("load_schema").never()
+    registry.validate({"plugins_conf": []}, "schemas/plugins.json")
+
+    registry.clear()
+    flexmock(osbs_yaml).should_call("load_schema").once()
+    registry.validate({"plugins_conf": []}, "schemas/plugins.json")
+
+
+@pytest.mark.skipif(not BENCHMARK, reason="set BENCHMARK to run benchmarks")
+def test_schema_registry_benchmark():
+    """Compare validation through osbs.utils.yaml with validation through the registry"""
+    from tests.test_schemas import CONTENT_MANIFEST_ALL_PROPERTIES
+
+    payloads = [
+        (yaml.safe_load(REACTOR_CONFIG_MAP), "schemas/config.json"),
+        (CONTENT_MANIFEST_ALL_PROPERTIES, "schemas/content_manifest.json"),
+        ({"plugins_conf": [{"name": f"plugin_{i}", "args": {"i": i}} for i in range(20)]},
+         "schemas/plugins.json"),
+    ]
+    rounds = 20
+
+    def benchmark(validate):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for data, schema in payloads:
+                validate(data, schema)
+        return time.perf_counter() - start
+
+    def validate_uncached(data, schema):
+        osbs_yaml.validate_with_schema(data, osbs_yaml.load_schema("atomic_reactor", schema))
+
+    registry = SchemaRegistry()
+    uncached = benchmark(validate_uncached)
+    cached = benchmark(registry.validate)
+
+    # shown with pytest -s
+    print(f"validating {len(payloads)} payloads {rounds} times: "
+          f"uncached {uncached:.3f}s, cached {cached:.3f}s")
+
+
 LogEntry = namedtuple('LogEntry', ['platform', 'line'])
 
 
@@ -1586,6 +2065,108 @@ def test_get_inspect_for_image_wrong_arch():
         get_inspect_for_image(image, image.registry, arch="s390x")
 
 
+def test_get_all_manifests_concurrently():
+    image = ImageName.parse("example.org/foo/bar:latest")
+    barrier = threading.Barrier(2, timeout=5)
+
+    def get_manifest(image, version):
+        if version in ('v2', 'v2_list'):
+            # both requests must be in flight at once
+            barrier.wait()
+            return flexmock(status_code=200, version=version), None
+        return None, None
+
+    flexmock(atomic_reactor.util.RegistryClient).should_receive('get_manifest').replace_with(
+        get_manifest
+    )
+    client = atomic_reactor.util.RegistryClient(RegistrySession(image.registry))
+
+    manifests = client.get_all_manifests(image, max_workers=4)
+    assert list(manifests) == ['v2', 'v2_list']
+    assert [response.version for response in manifests.values()] == ['v2', 'v2_list']
+
+
+@pytest.mark.parametrize('max_workers', [1, 5])
+def test_get_inspect_for_arches(max_workers):
+    image = ImageName.parse("example.org/foo/bar:latest")
+
+    def manifest_in_list(arch, digest):
+        return {
+            "mediaType": MEDIA_TYPE_DOCKER_V2_SCHEMA2,
+            "digest": digest,
+            "platform": {"architecture": arch},
+        }
+
+    manifest_list = {
+        "manifests": [
+            manifest_in_list("amd64", "sha256:amd64-manifest"),
+            manifest_in_list("s390x", "sha256:s390x-manifest"),
+            manifest_in_list("ppc64le", "sha256:ppc64le-manifest"),
+        ],
+    }
+    (flexmock(atomic_reactor.util.RegistryClient)
+     .should_receive("get_all_manifests")
+     .with_args(image, max_workers=max_workers)
+     .and_return({"v2_list": flexmock(json=lambda: manifest_list, status_code=200)})
+     .once())
+
+    blobs = {
+        "sha256:amd64-manifest": {"config": {"digest": "sha256:amd64-config"}},
+        "sha256:s390x-manifest": {"config": {"digest": "sha256:s390x-config"}},
+        "sha256:amd64-config": {**MOCK_INSPECT_DATA, "architecture": "amd64"},
+        "sha256:s390x-config": {**MOCK_INSPECT_DATA, "architecture": "s390x"},
+    }
+    queried = []
+    lock = threading.Lock()
+
+    def query_by_digest(image, digest, **query_kwargs):
+        with lock:
+            queried.append(digest)
+        return json.dumps(blobs[digest]).encode()
+
+    flexmock(atomic_reactor.util.RegistryClient).should_receive('_query_by_digest').replace_with(
+        query_by_digest
+    )
+    client = atomic_reactor.util.RegistryClient(RegistrySession(image.registry))
+
+    inspected = client.get_inspect_for_arches(image, ["amd64", "s390x", "amd64"],
+                                              max_workers=max_workers)
+
+    # each manifest and config is fetched once, ppc64le is not fetched at all
+    assert sorted(queried) == sorted(blobs)
+    assert inspected == {
+        "amd64": {**MOCK_EXPECT_INSPECT, "Architecture": "amd64", "Id": "sha256:amd64-config"},
+        "s390x": {**MOCK_EXPECT_INSPECT, "Architecture": "s390x", "Id": "sha256:s390x-config"},
+    }
+
+
+def test_get_inspect_for_arches_not_a_list():
+    image = ImageName.parse("example.org/foo/bar:latest")
+    all_manifests = {
+        "v2": flexmock(
+            json=lambda: {"config": {"digest": MOCK_CONFIG_DIGEST}},
+            status_code=200,
+        ),
+    }
+    (flexmock(atomic_reactor.util.RegistryClient)
+     .should_receive("get_all_manifests")
+     .and_return(all_manifests))
+    (flexmock(atomic_reactor.util.RegistryClient)
+     .should_receive('_blob_config_by_digest')
+     .with_args(image, MOCK_CONFIG_DIGEST)
+     .and_return({**MOCK_INSPECT_DATA, "architecture": "amd64"}))
+    client = atomic_reactor.util.RegistryClient(RegistrySession(image.registry))
+
+    assert client.get_inspect_for_arches(image, ["amd64"]) == {
+        "amd64": {**MOCK_EXPECT_INSPECT, "Architecture": "amd64"},
+    }
+    with pytest.raises(
+        RuntimeError,
+        match="Has architecture amd64, which does not match specified architecture s390x",
+    ):
+        client.get_inspect_for_arches(image, ["amd64", "s390x"])
+
+
 def test_dump_stacktraces(capfd):
     log_msg = '(most recent call first)'
     func_name = inspect.currentframe().f_code.co_name
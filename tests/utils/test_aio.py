@@ -0,0 +1,124 @@
+"""
+Copyright (c) 2023 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+"""
+import asyncio
+import contextvars
+import threading
+import time
+
+import pytest
+
+from atomic_reactor.utils.aio import EventLoopThread, gather_limited, poll, run_blocking
+
+current_request: contextvars.ContextVar = contextvars.ContextVar("current_request", default=None)
+
+
+def test_event_loop_thread_shared_by_callers():
+    event_loop = EventLoopThread()
+    loops = []
+
+    async def remember_loop():
+        loops.append(asyncio.get_running_loop())
+
+    try:
+        event_loop.run(remember_loop())
+        thread = threading.Thread(target=event_loop.run, args=(remember_loop(),))
+        thread.start()
+        thread.join()
+    finally:
+        event_loop.close()
+
+    assert len(loops) == 2
+    assert loops[0] is loops[1]
+    assert not event_loop.is_running
+
+
+def test_event_loop_thread_propagates_context_and_errors():
+    event_loop = EventLoopThread()
+
+    async def fail():
+        raise ValueError(f"failed {current_request.get()}")
+
+    token = current_request.set("request-1")
+    try:
+        with pytest.raises(ValueError, match="failed request-1"):
+            event_loop.run(fail())
+    finally:
+        current_request.reset(token)
+        event_loop.close()
+
+
+def test_event_loop_thread_cancels_leftover_tasks():
+    event_loop = EventLoopThread()
+    cancelled = []
+
+    async def sleep_forever():
+        try:
+            await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def start_background_task():
+        asyncio.ensure_future(sleep_forever())
+        await asyncio.sleep(0)
+
+    event_loop.run(start_background_task())
+    event_loop.close()
+
+    assert cancelled == [True]
+
+
+def test_close_unused_event_loop_thread():
+    event_loop = EventLoopThread()
+    event_loop.close()
+    assert not event_loop.is_running
+
+
+def test_run_blocking_and_gather_limited():
+    running = 0
+    max_running = 0
+    lock = threading.Lock()
+
+    def fetch(n):
+        nonlocal running, max_running
+        with lock:
+            running += 1
+            max_running = max(max_running, running)
+        time.sleep(0.05)
+        with lock:
+            running -= 1
+        return n * 2, current_request.get()
+
+    async def fetch_all():
+        current_request.set("fan-out")
+        return await gather_limited((run_blocking(fetch, n) for n in range(6)), limit=3)
+
+    results = asyncio.run(fetch_all())
+
+    assert results == [(n * 2, "fan-out") for n in range(6)]
+    assert 1 < max_running <= 3
+
+
+@pytest.mark.parametrize("ready_after,timeout,succeeds", [
+    (0, 1, True),
+    (2, 1, True),
+    (100, 0.05, False),
+])
+def test_poll(ready_after, timeout, succeeds):
+    calls = []
+
+    def check():
+        calls.append(1)
+        return "done" if len(calls) > ready_after else None
+
+    if succeeds:
+        assert asyncio.run(poll(check, interval=0.01, timeout=timeout)) == "done"
+        assert len(calls) == ready_after + 1
+    else:
+        with pytest.raises(TimeoutError):
+            asyncio.run(poll(check, interval=0.01, timeout=timeout))
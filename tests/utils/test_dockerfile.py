@@ -0,0 +1,127 @@
+"""
+Copyright (c) 2023 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+"""
+import time
+
+import pytest
+from dockerfile_parse import DockerfileParser
+from flexmock import flexmock
+
+from atomic_reactor.utils.dockerfile import CachedDockerfileParser
+from tests.constants import BENCHMARK
+
+
+def write_multistage_dockerfile(path, stages=20, labels=10):
+    lines = []
+    for i in range(stages):
+        lines.append(f"FROM registry.example.com/base:{i} AS stage{i}\n")
+        lines.append(f"ENV HOME=/home/stage{i} VERSION={i}\n")
+        for j in range(labels):
+            lines.append(f'LABEL label{j}="value {j}" \\\n    home{j}=$HOME\n')
+        lines.append("RUN echo hello && \\\n    echo world\n")
+    path.write_text("".join(lines))
+
+
+@pytest.fixture
+def dockerfile(tmp_path):
+    path = tmp_path / "Dockerfile"
+    write_multistage_dockerfile(path, stages=3, labels=3)
+    return str(path)
+
+
+@pytest.mark.parametrize("parent_env", [None, {"HOME": "/root"}])
+def test_cached_parser_matches_parser(dockerfile, parent_env):
+    for _ in range(2):
+        cached = CachedDockerfileParser(dockerfile, parent_env=parent_env)
+        parser = DockerfileParser(dockerfile, parent_env=parent_env)
+
+        assert cached.structure == parser.structure
+        assert cached.labels == parser.labels
+        assert cached.envs == parser.envs
+        assert cached.args == parser.args
+        assert cached.parent_images == parser.parent_images
+        assert cached.baseimage == parser.baseimage
+
+
+def test_cached_parser_parses_once(dockerfile):
+    CachedDockerfileParser(dockerfile).labels
+    flexmock(DockerfileParser).should_receive("_open_dockerfile").never()
+    flexmock(DockerfileParser).should_receive("_instruction_getter").never()
+
+    dfp = CachedDockerfileParser(dockerfile)
+    assert dfp.labels["label0"] == "value 0"
+    dfp.structure[0]["value"] = "modified"
+    assert CachedDockerfileParser(dockerfile).structure[0]["value"] != "modified"
+
+
+def test_cached_parser_writes_invalidate(dockerfile):
+    assert "new" not in CachedDockerfileParser(dockerfile).labels
+
+    CachedDockerfileParser(dockerfile).labels["new"] = "1"
+    assert CachedDockerfileParser(dockerfile).labels["new"] == "1"
+
+    dfp = CachedDockerfileParser(dockerfile)
+    dfp.parent_images = ["fedora:36", "fedora:37", "fedora:38"]
+    assert CachedDockerfileParser(dockerfile).parent_images == [
+        "fedora:36", "fedora:37", "fedora:38"
+    ]
+
+
+def test_cached_parser_external_writes_invalidate(dockerfile):
+    assert CachedDockerfileParser(dockerfile).baseimage == "registry.example.com/base:2"
+
+    with open(dockerfile, "a") as f:
+        f.write("FROM fedora:38\n")
+
+    assert CachedDockerfileParser(dockerfile).baseimage == "fedora:38"
+
+
+def test_cached_parser_reads_file_once(tmp_path, monkeypatch):
+    path = tmp_path / "Dockerfile"
+    write_multistage_dockerfile(path)
+    opened = []
+    open_dockerfile = DockerfileParser._open_dockerfile
+
+    def counting_open_dockerfile(self, mode):
+        opened.append(mode)
+        return open_dockerfile(self, mode)
+
+    monkeypatch.setattr(DockerfileParser, "_open_dockerfile", counting_open_dockerfile)
+
+    for _ in range(10):
+        dfp = CachedDockerfileParser(str(path))
+        assert dfp.labels["label0"] == "value 0"
+        assert dfp.envs["VERSION"] == "19"
+        assert len(dfp.parent_images) == 20
+        assert dfp.baseimage == "registry.example.com/base:19"
+
+    assert opened == ["rb"]
+
+
+@pytest.mark.skipif(not BENCHMARK, reason="set BENCHMARK to run benchmarks")
+def test_cached_parser_benchmark(tmp_path):
+    """Compare repeated reads of a large multistage Dockerfile with and without the cache"""
+    path = tmp_path / "Dockerfile"
+    write_multistage_dockerfile(path)
+    rounds = 10
+
+    def benchmark(parser_class):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            dfp = parser_class(str(path))
+            dfp.labels
+            dfp.envs
+            dfp.parent_images
+            dfp.baseimage
+        return time.perf_counter() - start
+
+    uncached = benchmark(DockerfileParser)
+    cached = benchmark(CachedDockerfileParser)
+
+    # shown with pytest -s
+    print(f"reading the Dockerfile {rounds} times: "
+          f"uncached {uncached:.3f}s, cached {cached:.3f}s")
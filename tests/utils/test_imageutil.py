@@ -132,6 +132,47 @@ class TestImageUtil:
         with pytest.raises(ValueError, match=r"ImageName\(.*\) is not inspectable"):
             image_util.get_inspect_for_image(custom_image)
 
+    def test_get_inspect_for_image_platforms(self, df_images):
+        """Test that only the platforms which are not cached yet are inspected at once."""
+        image_util = imageutil.ImageUtil(df_images, self.config)
+        image = ImageName.parse("registry.com/some-image:1")
+        s390x_inspect = {"some": "s390x inspect data"}
+
+        self.mock_get_registry_client(image, expect_arch="amd64")
+        assert image_util.get_inspect_for_image(image, "x86_64") == self.inspect_data
+
+        registry_client = flexmock()
+        (
+            registry_client
+            .should_receive("get_inspect_for_arches")
+            .with_args(image, ["s390x"])
+            .once()
+            .and_return({"s390x": s390x_inspect})
+        )
+        (
+            flexmock(imageutil.ImageUtil)
+            .should_receive("_get_registry_client")
+            .with_args(image.registry)
+            .once()
+            .and_return(registry_client)
+        )
+
+        platforms = ["x86_64", "s390x", "amd64"]
+        expected = {"x86_64": self.inspect_data, "s390x": s390x_inspect,
+                    "amd64": self.inspect_data}
+        assert image_util.get_inspect_for_image_platforms(image, platforms) == expected
+        # everything is cached now
+        assert image_util.get_inspect_for_image_platforms(image.to_str(), platforms) == expected
+        assert image_util.get_inspect_for_image(image, "s390x") == s390x_inspect
+
+    @pytest.mark.parametrize("base_image", ["scratch", "koji/image-build"])
+    def test_base_image_inspect_for_platforms_not_inspectable(self, base_image):
+        """Test that inspecting a non-inspectable base image returns empty dicts."""
+        image_util = imageutil.ImageUtil(util.DockerfileImages([base_image]), self.config)
+        assert image_util.base_image_inspect_for_platforms(["x86_64", "s390x"]) == {
+            "x86_64": {}, "s390x": {},
+        }
+
     @pytest.mark.parametrize("platform", [None, "x86_64"])
     def test_base_image_inspect(self, platform, df_images):
         """Test that base_image_inspect just calls get_inspect_for_image with the right args."""
@@ -167,7 +208,7 @@ class TestImageUtil:
         (
             flexmock(util.RegistryClient)
             .should_receive("__init__")
-            .with_args(registry_session)
+            .with_args(registry_session, resolve_tags_from_cache=True)
             .once()
         )
 
@@ -0,0 +1,103 @@
+"""
+Copyright (c) 2023 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+"""
+import contextlib
+
+import pytest
+import requests
+import responses
+from flexmock import flexmock
+
+from atomic_reactor.util import RegistrySession
+from atomic_reactor.utils import registry_metrics
+from atomic_reactor.utils.registry_metrics import (classify_registry_url, get_registry_metrics,
+                                                   instrumented_request, reset_registry_metrics)
+
+
+@pytest.fixture(autouse=True)
+def clear_metrics():
+    reset_registry_metrics()
+    yield
+    reset_registry_metrics()
+
+
+@pytest.mark.parametrize('url, expected', [
+    ('https://reg.io/v2/', ('ping', None)),
+    ('https://reg.io/v2/ns/repo/manifests/latest', ('manifest', 'ns/repo')),
+    ('https://reg.io/v2/repo/blobs/sha256:1234', ('blob', 'repo')),
+    ('https://reg.io/v2/repo/blobs/uploads/', ('upload', 'repo')),
+    ('https://reg.io/v2/repo/blobs/uploads/?mount=sha256:1234&from=other',
+     ('mount', 'repo')),
+    ('https://reg.io/v2/ns/repo/tags/list', ('tags', 'ns/repo')),
+    ('https://auth.reg.io/token', ('other', None)),
+])
+def test_classify_registry_url(url, expected):
+    assert classify_registry_url(url) == expected
+
+
+@responses.activate
+def test_registry_session_requests_recorded():
+    responses.add(responses.GET, 'https://reg.io/v2/ns/repo/manifests/latest',
+                  body='{}', headers={'Content-Length': '2'})
+    responses.add(responses.HEAD, 'https://reg.io/v2/ns/repo/manifests/missing', status=404)
+    responses.add(responses.GET, 'https://reg.io/v2/ns/repo/blobs/sha256:1234',
+                  body=requests.ConnectionError())
+
+    session = RegistrySession('reg.io')
+    for _ in range(2):
+        session.get('/v2/ns/repo/manifests/latest')
+    session.head('/v2/ns/repo/manifests/missing')
+    with pytest.raises(requests.ConnectionError):
+        session.get('/v2/ns/repo/blobs/sha256:1234')
+
+    metrics = get_registry_metrics()
+    assert list(metrics) == ['reg.io']
+    manifest = metrics['reg.io']['manifest']
+    assert manifest['requests'] == 3
+    assert manifest['errors'] == 0
+    assert manifest['response_bytes'] == 4
+    assert manifest['status_codes'] == {'200': 2, '404': 1}
+    assert sum(manifest['latency_histogram'].values()) == 3
+    assert list(manifest['latency_histogram'])[-1] == '+Inf'
+
+    blob = metrics['reg.io']['blob']
+    assert (blob['requests'], blob['errors'], blob['status_codes']) == (1, 1, {})
+
+
+def test_instrumented_request_span():
+    attributes = {}
+    span = flexmock(set_attribute=attributes.__setitem__)
+    span_names = []
+
+    @contextlib.contextmanager
+    def start_as_current_span(name):
+        span_names.append(name)
+        yield span
+
+    tracer = flexmock(start_as_current_span=start_as_current_span)
+    flexmock(registry_metrics).should_receive('get_tracer').and_return(tracer)
+
+    response = requests.Response()
+    response.status_code = 200
+    response.headers['Content-Length'] = '123'
+    response.raw = flexmock(retries=flexmock(history=('first try', 'second try')))
+
+    result = instrumented_request(lambda: response, 'GET', 'https://auth.reg.io/token?scope=x',
+                                  endpoint='token')
+
+    assert result is response
+    assert span_names == ['registry token']
+    assert attributes == {
+        'http.method': 'GET',
+        'registry.host': 'auth.reg.io',
+        'registry.endpoint': 'token',
+        'registry.retries': 2,
+        'http.status_code': 200,
+        'registry.response_bytes': 123,
+    }
+    token = get_registry_metrics()['auth.reg.io']['token']
+    assert (token['requests'], token['retries'], token['response_bytes']) == (1, 2, 123)
@@ -7,9 +7,12 @@ of the BSD license. See the LICENSE file for details.
 """
 
 import backoff
+import fcntl
 import pytest
 import re
+import subprocess
 import time
+from base64 import b64encode
 from flexmock import flexmock, Mock
 from functools import wraps
 from typing import Callable, Optional, Tuple
@@ -29,7 +32,7 @@ flexmock(backoff).should_receive("on_exception").and_return(_do_nothing_decorato
 
 
 from atomic_reactor.utils.remote_host import (  # noqa
-    SSHRetrySession, RemoteHost, RemoteHostsPool
+    SSHRetrySession, RemoteHost, RemoteHostsPool, SlotReadError
 )
 
 
@@ -94,6 +97,30 @@ def make_flock_ssh_result(
     return stdin, out, err
 
 
+def make_scan_output(*slots: str) -> str:
+    """ Produce the output of the slots scan script for the given slot file contents """
+    return "\n".join(f"{slot_id} 1644920553 0 {b64encode(content.encode()).decode()}"
+                     for slot_id, content in enumerate(slots))
+
+
+class FakeSSHTransport:
+    """ Run the commands sent over SSH locally, counting the round trips """
+
+    def __init__(self):
+        self.commands = []
+        (
+            flexmock(SSHRetrySession)
+            .should_receive("exec_command")
+            .replace_with(self.exec_command)
+        )
+
+    def exec_command(self, cmd, *args, **kwargs):
+        self.commands.append(cmd)
+        result = subprocess.run(cmd, shell=True, capture_output=True, text=True)  # nosec
+        return make_ssh_result(stdout=result.stdout.strip(), stderr=result.stderr.strip(),
+                               code=result.returncode)
+
+
 @pytest.mark.parametrize(("mkdir_stderr", "mkdir_code", "expected_result"), (
     ("", 0, True),
     ("mkdir: cannot create directory: ... permission denied", 1, False),
@@ -421,6 +448,9 @@ def test_pool_lock_resource(slot_content, expected_log, expected_result, failure
         if cmd == "mkdir -p /var/tmp/osbs_slots":
             return make_ssh_result()
 
+        if cmd.startswith("cd /var/tmp/osbs_slots || exit 1;"):
+            return make_ssh_result(stdout=make_scan_output(*[slot_content or ""] * 3))
+
         read_patt = re.compile(
             r"touch /var/tmp/osbs_slots/slot_.* && cat /var/tmp/osbs_slots/slot_.*"
         )
@@ -466,30 +496,65 @@ def test_pool_lock_resource(slot_content, expected_log, expected_result, failure
     ("pr123@2022-02-15T10:22:33.234234", "pr124@2022-02-15T10:22:33.234234",
      "pr124@2022-02-15T10:22:33.234234", set(), {0, 1, 2}),
 ))
-def test_available_and_occupied_slots(caplog, slot0, slot1, slot2, available, occupied):
+def test_available_and_occupied_slots(tmp_path, slot0, slot1, slot2, available, occupied):
     host = RemoteHost(hostname="remote-host-001", username="builder",
                       ssh_keyfile="/path/to/key", slots=3, socket_path=SOCKET_PATH)
+    flexmock(RemoteHost).should_receive("slots_dir").and_return(str(tmp_path))
+    for slot_id, content in enumerate((slot0, slot1, slot2)):
+        if content:
+            (tmp_path / f"slot_{slot_id}").write_text(content + "\n")
+    transport = FakeSSHTransport()
 
-    def mocked_command(cmd, *args, **kwargs):
-        if cmd == "touch /home/builder/osbs_slots/slot_0 && cat /home/builder/osbs_slots/slot_0":
-            return make_ssh_result(stdout=slot0)
-
-        if cmd == "touch /home/builder/osbs_slots/slot_1 && cat /home/builder/osbs_slots/slot_1":
-            return make_ssh_result(stdout=slot1)
-
-        if cmd == "touch /home/builder/osbs_slots/slot_2 && cat /home/builder/osbs_slots/slot_2":
-            return make_ssh_result(stdout=slot2)
+    assert set(host.available_slots()) == available
+    assert host.occupied_slots() == occupied
+    # one round trip each
+    assert len(transport.commands) == 2
 
-        assert False, f"Unexpected command: {cmd}"
 
+def test_scan_slots(tmp_path):
+    host = RemoteHost(hostname="remote-host-001", username="builder",
+                      ssh_keyfile="/path/to/key", slots=20, socket_path=SOCKET_PATH)
+    flexmock(RemoteHost).should_receive("slots_dir").and_return(str(tmp_path))
+    (tmp_path / "slot_1").write_text("pr123@2022-02-15T10:22:33.234234\n")
+    (tmp_path / "slot_2").write_text("corrupted\nslot @ content")
+    transport = FakeSSHTransport()
+
+    # a client locking slot 3 right now
+    with open(tmp_path / "slot_3.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        statuses = host.scan_slots()
+        available = host.available_slots()
+
+    assert len(transport.commands) == 2
+    assert [status.id for status in statuses] == list(range(20))
+    assert statuses[1].data.prid == "pr123"
+    assert not statuses[1].is_free
+    assert not statuses[2].data.is_valid
+    assert statuses[2].is_free
+    assert [status.id for status in statuses if status.locked] == [3]
+    assert all(status.mtime > 0 for status in statuses)
+    # slot files are created
+    assert (tmp_path / "slot_19").exists()
+    assert available == [0, 2] + list(range(4, 20))
+
+
+@pytest.mark.parametrize("stdout, code", [
+    ("", 1),
+    ("0 1644920553 0 \n2 1644920553 0 ", 0),
+    ("0 1644920553 0 \n1 never 0 ", 0),
+    ("0 1644920553 0 \n1 1644920553 0 !!!", 0),
+])
+def test_scan_slots_error(stdout, code):
+    host = RemoteHost(hostname="remote-host-001", username="builder",
+                      ssh_keyfile="/path/to/key", slots=2, socket_path=SOCKET_PATH)
     (
         flexmock(SSHRetrySession)
         .should_receive("exec_command")
-        .replace_with(mocked_command)
+        .and_return(make_ssh_result(stdout=stdout, stderr="cd: no such directory", code=code))
     )
 
-    assert set(host.available_slots()) == available
-    assert host.occupied_slots() == occupied
+    with pytest.raises(SlotReadError, match="remote-host-001: cannot read slots"):
+        host.scan_slots()
 
 
 @pytest.mark.parametrize(("slot0", "slot1", "slot2", "prid0", "prid1", "prid2"), (
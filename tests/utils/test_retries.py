@@ -8,7 +8,9 @@ of the BSD license. See the LICENSE file for details.
 
 import json
 import subprocess
+import threading
 import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 import requests
 from urllib3 import Retry
@@ -18,6 +20,7 @@ import responses
 from flexmock import flexmock
 
 from atomic_reactor.constants import (HTTP_MAX_RETRIES,
+                                      HTTP_POOL_MAXSIZE,
                                       HTTP_REQUEST_TIMEOUT,
                                       SUBPROCESS_MAX_RETRIES,
                                       SUBPROCESS_BACKOFF_FACTOR)
@@ -73,6 +76,72 @@ def test_get_retrying_requests_session(times):
     assert https.max_retries.total == expected_total
 
 
+def test_retrying_sessions_share_adapters():
+    session = retries.get_retrying_requests_session()
+    adapter = session.adapters['https://']
+
+    assert session.adapters['http://'] is adapter
+    assert retries.get_retrying_requests_session().adapters['https://'] is adapter
+    assert retries.get_retrying_requests_session(times=1).adapters['https://'] is not adapter
+    assert (retries.get_retrying_requests_session(allowed_methods=['GET']).adapters['https://']
+            is retries.get_retrying_requests_session(allowed_methods=('GET',)).adapters['https://'])
+    assert adapter._pool_maxsize == HTTP_POOL_MAXSIZE
+    assert retries.get_retrying_requests_session(pool_maxsize=1).adapters['https://'] is not adapter
+
+    adapter.poolmanager.connection_from_url('https://shared.example.com')
+    session.close()
+    assert len(adapter.poolmanager.pools) > 0
+
+
+def test_get_shared_requests_session():
+    session = retries.get_shared_requests_session('registry.example.com')
+
+    assert retries.get_shared_requests_session('registry.example.com') is session
+    assert retries.get_shared_requests_session('other.example.com') is not session
+    assert retries.get_shared_requests_session('registry.example.com', times=1) is not session
+
+    flexmock(retries).should_receive('_http_retries_disabled').and_return(True)
+    no_retries = retries.get_shared_requests_session('registry.example.com')
+    assert no_retries is not session
+    assert no_retries.adapters['https://'].max_retries.total == 0
+
+
+def test_connections_reused_across_sessions():
+    connections = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def setup(self):
+            super().setup()
+            connections.append(self.client_address)
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Length', '2')
+            self.end_headers()
+            self.wfile.write(b'ok')
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f'http://127.0.0.1:{server.server_port}'
+    try:
+        for _ in range(3):
+            session = retries.get_retrying_requests_session()
+            assert session.get(url).text == 'ok'
+            session.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert len(connections) == 1
+    assert retries.get_connection_stats()[url] == {'connections': 1, 'requests': 3}
+
+
 @responses.activate
 @pytest.mark.parametrize('http_code', [399, 400, 401, 500, 599])
 def test_log_error_response(http_code, caplog):